@@ -0,0 +1,296 @@
+# Jo Jo's doorman – token buckets per user and per IP, daily quotas, and a cap on questions in flight. 🚪
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from workers import run_io
+
+logger = logging.getLogger("uvicorn.error")
+
+class AdmissionRejected(Exception):
+    """A request turned away at the door. reason is "overloaded", "rate_limited" or "quota"."""
+
+    def __init__(self, reason: str, retry_after: float, detail: str):
+        super().__init__(detail)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.detail = detail
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+class TokenBucket:
+    """Holds up to capacity tokens, refilled at rate tokens per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, cost: float = 1.0) -> float:
+        """Seconds until cost tokens are available – 0 when they are now."""
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def take(self, now: float, cost: float = 1.0) -> None:
+        self._refill(now)
+        self.tokens -= cost
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+def seconds_until_midnight() -> float:
+    now = datetime.now(timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return (tomorrow - now).total_seconds()
+
+class AdmissionController:
+    """Decides, before any retrieval or Gemini work starts, whether a question gets in.
+
+    Checks run cheapest first and nothing is charged unless all of them pass:
+      1. Questions in flight (admitted, not yet answered) must be under max_in_flight. Past that,
+         extra requests would only queue behind the LLM and slow everyone down, so they're turned
+         away at once with a Retry-After based on how long recent questions took.
+      2. The client IP's bucket, and the user's bucket when the user is known, must have a token.
+         A rate of 0 turns that kind of bucket off.
+      3. The user's daily quota from the users table must not be used up. This is the only check
+         that can touch Supabase, so a request turned away by 1 or 2 never does.
+
+    Quota usage is counted in memory and written to the users table in batches every
+    sync_interval seconds – one read and an update per distinct total, however many questions came
+    in. Only existing rows are updated: the user id is just a header, so ids without a row are
+    counted in memory against the default quota and never create one. A user's row is read once
+    and re-read after quota_ttl seconds, and at most max_users of them are remembered. If Supabase
+    can't be reached the quota check fails open; it's a budget, not a lock.
+    """
+
+    def __init__(self, get_client: Callable, max_in_flight: int = 32, user_rate: float = 0.5, user_burst: float = 10,
+                 ip_rate: float = 0.0, ip_burst: float = 20, default_daily_quota: int = 100, sync_interval: float = 10.0,
+                 quota_ttl: float = 300.0, max_buckets: int = 10_000, max_users: int = 10_000, table: str = "users"):
+        self.get_client = get_client
+        self.max_in_flight = max(1, max_in_flight)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.default_daily_quota = default_daily_quota
+        self.sync_interval = sync_interval
+        self.quota_ttl = quota_ttl
+        self.max_buckets = max_buckets
+        self.max_users = max_users
+        self.table = table
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._quotas: "OrderedDict[str, dict]" = OrderedDict()
+        self._pending_users: Set[str] = set()  # Users with questions counted but not yet saved
+        self._task: Optional[asyncio.Task] = None
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = Counter()
+        self.syncs = 0
+        self.sync_failures = 0
+        self._seconds_per_question = 1.0  # Moving average of how long admitted questions are held
+
+    def _bucket(self, kind: str, key: str, rate: float, capacity: float, now: float) -> TokenBucket:
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            bucket = self._buckets[(kind, key)] = TokenBucket(rate, capacity, now)
+            while len(self._buckets) > self.max_buckets:
+                oldest_key, oldest = next(iter(self._buckets.items()))
+                if not oldest.full(now):
+                    break  # Never forget a client that's still paying off a burst
+                del self._buckets[oldest_key]
+        else:
+            self._buckets.move_to_end((kind, key))
+        return bucket
+
+    def _load_quota(self, user_id: str) -> dict:
+        """Read a user's quota row (blocking). Users without a row get the default quota."""
+        quota = {"daily_quota": self.default_daily_quota, "used": 0, "pending": 0, "day": _today(), "loaded_at": time.monotonic(),
+                 "has_row": False}
+        try:
+            rows = (self.get_client().table(self.table).select("id, daily_quota, questions_asked_today, last_quota_reset")
+                    .eq("id", user_id).limit(1).execute().data)
+        except Exception as oops:
+            logger.warning(f"(Jo Jo) Couldn't read the quota for user {user_id}; letting them in on the default: {oops}")
+            return quota
+        if rows:
+            row = rows[0]
+            quota["has_row"] = True
+            quota["daily_quota"] = row.get("daily_quota") if row.get("daily_quota") is not None else self.default_daily_quota
+            if str(row.get("last_quota_reset") or "")[:10] == quota["day"]:
+                quota["used"] = row.get("questions_asked_today") or 0
+        return quota
+
+    async def _quota_for(self, user_id: str) -> dict:
+        cached = self._quotas.get(user_id)
+        if cached is not None and time.monotonic() - cached["loaded_at"] < self.quota_ttl:
+            quota = cached
+            self._quotas.move_to_end(user_id)
+        else:
+            quota = await run_io(self._load_quota, user_id)
+            cached = self._quotas.pop(user_id, None)  # Looked up again: another request may have loaded it meanwhile
+            if cached is not None:
+                quota["pending"] = cached["pending"]  # Not synced yet – don't lose it
+                if not quota["has_row"]:
+                    quota["used"] = max(quota["used"], cached["used"])  # Counted only here
+            self._quotas[user_id] = quota
+            if len(self._quotas) > self.max_users:
+                # Least recently seen first, skipping users whose questions haven't been saved yet
+                excess = len(self._quotas) - self.max_users
+                victims = []
+                for oldest_id, oldest in self._quotas.items():
+                    if not oldest["pending"]:
+                        victims.append(oldest_id)
+                        if len(victims) == excess:
+                            break
+                for oldest_id in victims:
+                    del self._quotas[oldest_id]
+        if quota["day"] != _today():
+            quota.update(day=_today(), used=0, pending=0)  # Yesterday's unsaved count no longer matters
+            self._pending_users.discard(user_id)
+        return quota
+
+    def _reject(self, reason: str, retry_after: float, detail: str) -> None:
+        self.rejected[reason] += 1
+        raise AdmissionRejected(reason, retry_after, detail)
+
+    def _check_capacity(self, user_id: Optional[str], client_ip: str, now: float) -> List[TokenBucket]:
+        """Checks 1 and 2: raise AdmissionRejected, or return the buckets to charge."""
+        if self.in_flight >= self.max_in_flight:
+            self._reject("overloaded", self._seconds_per_question, "Jo Jo is answering lots of questions right now. Please try again in a moment!")
+        buckets = []
+        if self.ip_rate > 0:
+            buckets.append(self._bucket("ip", client_ip, self.ip_rate, self.ip_burst, now))
+        if user_id and self.user_rate > 0:
+            buckets.append(self._bucket("user", user_id, self.user_rate, self.user_burst, now))
+        wait = max((bucket.wait_time(now) for bucket in buckets), default=0)
+        if wait > 0:
+            self._reject("rate_limited", wait, "Whoa, slow down! Too many questions in a row.")
+        return buckets
+
+    async def admit(self, user_id: Optional[str], client_ip: str) -> dict:
+        """Let a question in or raise AdmissionRejected. Hand the returned ticket to release() when done."""
+        self._check_capacity(user_id, client_ip, time.monotonic())
+        quota = await self._quota_for(user_id) if user_id else None
+        # Everything from here on is synchronous, so no other request can slip in between check and charge.
+        # The quota read may have waited on Supabase, so the cheap checks run again first.
+        now = time.monotonic()
+        buckets = self._check_capacity(user_id, client_ip, now)
+        if quota is not None and quota["used"] + quota["pending"] >= quota["daily_quota"]:
+            self._reject("quota", seconds_until_midnight(), f"You've used all {quota['daily_quota']} of today's questions. See you tomorrow!")
+        for bucket in buckets:
+            bucket.take(now)
+        if quota is not None and quota["has_row"]:
+            quota["pending"] += 1
+            self._pending_users.add(user_id)
+        elif quota is not None:
+            quota["used"] += 1  # No row to save it to
+        self.in_flight += 1
+        self.admitted += 1
+        return {"started": now, "released": False}
+
+    def release(self, ticket: dict) -> None:
+        """The question is answered (or failed). Safe to call twice."""
+        if ticket["released"]:
+            return
+        ticket["released"] = True
+        self.in_flight -= 1
+        self._seconds_per_question = 0.9 * self._seconds_per_question + 0.1 * (time.monotonic() - ticket["started"])
+
+    def _write_usage(self, deltas: Dict[str, int], day: str) -> Dict[str, int]:
+        """Add each user's new questions to their existing row – one read, then one update per distinct total
+        (blocking). Returns the new totals; users whose row has gone are left out."""
+        client = self.get_client()
+        rows = client.table(self.table).select("id, questions_asked_today, last_quota_reset").in_("id", list(deltas)).execute().data or []
+        current = {row["id"]: (row.get("questions_asked_today") or 0) if str(row.get("last_quota_reset") or "")[:10] == day else 0
+                   for row in rows}
+        totals = {user_id: current[user_id] + delta for user_id, delta in deltas.items() if user_id in current}
+        by_total: Dict[int, List[str]] = defaultdict(list)
+        for user_id, total in totals.items():
+            by_total[total].append(user_id)
+        for total, user_ids in by_total.items():
+            client.table(self.table).update({"questions_asked_today": total, "last_quota_reset": day}).in_("id", user_ids).execute()
+        return totals
+
+    async def sync(self) -> None:
+        """Write counted-but-unsaved questions to the users table."""
+        day = _today()
+        deltas = {}
+        for user_id in list(self._pending_users):
+            quota = self._quotas.get(user_id)
+            if quota is not None and quota["pending"] and quota["day"] == day:
+                deltas[user_id] = quota["pending"]
+            else:
+                self._pending_users.discard(user_id)
+        if not deltas:
+            return
+        try:
+            totals = await run_io(self._write_usage, deltas, day)
+        except Exception as oops:
+            self.sync_failures += 1
+            logger.warning(f"(Jo Jo) Couldn't save question counts for {len(deltas)} user(s); will retry: {oops}")
+            return  # Still pending, so the next sync tries again
+        self.syncs += 1
+        for user_id, delta in deltas.items():
+            quota = self._quotas.get(user_id)
+            if quota is None or quota["day"] != day:
+                continue
+            # Questions admitted while the write was out stay pending for the next sync
+            quota["pending"] -= delta
+            if user_id in totals:
+                quota["used"] = totals[user_id]  # Includes questions other workers counted
+            else:
+                quota["used"] += delta  # The row went away; keep counting here
+                quota["has_row"] = False
+            if not quota["pending"]:
+                self._pending_users.discard(user_id)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the sync loop and save whatever is still pending."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.sync()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "buckets": len(self._buckets),
+            "users": len(self._quotas),
+            "pending_usage": sum(self._quotas[user_id]["pending"] for user_id in self._pending_users if user_id in self._quotas),
+            "syncs": self.syncs,
+            "sync_failures": self.sync_failures,
+            "seconds_per_question": round(self._seconds_per_question, 3),
+        }
@@ -0,0 +1,120 @@
+# Jo Jo's answer memory – repeated questions are answered from cache instead of asking Gemini again. 🗃️
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger("uvicorn.error")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    """Fold case, punctuation and whitespace so trivially different phrasings share a cache entry."""
+    folded = _PUNCTUATION.sub(" ", question.casefold())
+    return _WHITESPACE.sub(" ", folded).strip()
+
+class AnswerCache:
+    """An in-process LRU with TTL in front of the llm_cache table.
+
+    Entries are keyed on document id, normalised question, model name and prompt version, so
+    changing the model or the prompt template quietly starts a fresh cache instead of serving
+    answers produced by the old one.
+    """
+
+    def __init__(self, get_client: Callable, model: str, prompt_version: str,
+                 max_entries: int = 1024, ttl_seconds: float = 3600, table_ttl_seconds: float = 7 * 24 * 3600,
+                 table: str = "llm_cache"):
+        self.get_client = get_client
+        self.model = model
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.table_ttl_seconds = table_ttl_seconds
+        self.table = table
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.table_hits = 0
+        self.misses = 0
+
+    def key_for(self, document_id: int, question: str) -> str:
+        raw = f"{document_id}|{self.model}|{self.prompt_version}|{normalize_question(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_local(self, document_id: int, question: str) -> Optional[str]:
+        """Memory-only lookup – cheap enough to call straight from the event loop."""
+        key = self.key_for(document_id, question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, answer = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return answer
+                del self._entries[key]
+        return None
+
+    def get_remote(self, document_id: int, question: str) -> Optional[str]:
+        """Table lookup (blocking). A hit is promoted into memory; errors count as a miss."""
+        key = self.key_for(document_id, question)
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.table_ttl_seconds)).isoformat()
+        try:
+            response = (self.get_client().table(self.table).select("answer")
+                        .eq("cache_key", key).gte("created_at", cutoff)
+                        .order("created_at", desc=True).limit(1).execute())
+        except Exception as oops:
+            logger.warning(f"(Jo Jo) Answer cache lookup failed; asking Gemini instead: {oops}")
+            response = None
+        rows = response.data if response is not None else None
+        if rows:
+            answer = rows[0]["answer"]
+            self._remember(key, answer)
+            with self._lock:
+                self.table_hits += 1
+            return answer
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, document_id: int, question: str, answer: str) -> None:
+        """Remember an answer in memory and in the table (blocking). Table errors are logged, not raised."""
+        key = self.key_for(document_id, question)
+        self._remember(key, answer)
+        try:
+            self.get_client().table(self.table).insert({
+                "document_id": document_id,
+                "question": normalize_question(question),
+                "answer": answer,
+                "cache_key": key,
+            }).execute()
+        except Exception as oops:
+            logger.warning(f"(Jo Jo) Couldn't write answer to {self.table}: {oops}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.table_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "table_hits": self.table_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.table_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remember(self, key: str, answer: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,61 +1,182 @@
 # Hey there! This is Jo Jo's brain – the FastAPI backend for your PDF Q&A BFF. Here we handle uploads, chat, and all the magic. Enjoy reading and hacking! 💬🦜
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse
+import time
+_import_started = time.perf_counter()  # The startup report counts from here
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Depends, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
 import shutil
-from PyPDF2 import PdfReader
 import uuid
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List, Tuple
+from functools import partial
 import logging
+import asyncio
+import threading
 import traceback
-import google.generativeai as genai  # Gemini AI for local magic
-from config import supabase, supabase_admin, UPLOAD_DIR, TEXT_DIR, API_PORT, API_HOST, ALLOWED_ORIGINS, GOOGLE_API_KEY, GEMINI_MODEL
+from config import get_supabase, get_supabase_admin, SUPABASE_SERVICE_ROLE_KEY, UPLOAD_DIR, TEXT_DIR, API_PORT, API_HOST, ALLOWED_ORIGINS, GOOGLE_API_KEY, GEMINI_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, RETRIEVAL_TOP_K, RETRIEVAL_CANDIDATES, RETRIEVAL_RRF_K, RETRIEVAL_MMR_WEIGHT, CONTEXT_TOKEN_BUDGET, VECTOR_DB_DIR, VECTOR_STORE_MAX_OPEN, RETRIEVAL_MODE, EMBEDDER, EMBEDDING_MODEL, EXTRACTION_WORKERS, IO_WORKERS, PARALLEL_EXTRACTION, PAGES_PER_TASK, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE, PROMPT_VERSION, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_TABLE_TTL_SECONDS, LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT_SECONDS, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_SECONDS, WRITE_BEHIND_SPILL_PATH, DOCUMENT_CACHE_MAX_BYTES, DOCUMENT_CACHE_TTL_SECONDS, INGESTION_WORKERS, HEALTH_CHECK_INTERVAL_SECONDS, HEALTH_CHECK_TIMEOUT_SECONDS, MULTI_DOC_TOP_K, MULTI_DOC_MAX_DOCUMENTS, CONVERSATION_WINDOW_TURNS, CONVERSATION_SUMMARY_MAX_CHARS, CONVERSATION_TURN_MAX_CHARS, CONVERSATION_CACHE_SESSIONS, ADMISSION_MAX_IN_FLIGHT, ADMISSION_IP_RATE, ADMISSION_IP_BURST, ADMISSION_FORWARDED_HEADER, ADMISSION_TRUSTED_PROXIES, ADMISSION_USER_RATE, ADMISSION_USER_BURST, ADMISSION_USER_HEADER, ADMISSION_DEFAULT_DAILY_QUOTA, ADMISSION_QUOTA_SYNC_SECONDS, STORAGE_GC_INTERVAL_SECONDS, STORAGE_GC_MIN_ORPHAN_AGE_SECONDS, STORAGE_GC_BATCH_SIZE, RETENTION_MAX_AGE_DAYS, RETENTION_MAX_BYTES, PROGRESSIVE_INGESTION, PROGRESSIVE_MIN_PAGES, PROGRESSIVE_FIRST_PAGES, PROGRESSIVE_GROWTH
+from retrieval import BM25Index, StoredChunks, hybrid_rank, index_path_for, index_text_file, load_or_build_index, merge_hits, reciprocal_rank_fusion
+from page_store import PAGES_SUFFIX, open_text, partial_path_for, write_pages
+from context_prep import prepare_context, prepare_sources
+from extraction import extract_pdf_to_file, extract_text_from_pdf_file
+from uploads import UploadTooLarge, content_lock, spool_upload_to_disk
+from workers import configure_pools, run_cpu, run_io, shutdown_pools
+from vector_store import VectorStore, get_embedder, key_for_text_path
+from answer_cache import AnswerCache
+from streaming import sse_event, stream_llm_text
+from llm_gateway import LLMBusy, LLMGateway
+from pagination import decode_cursor, encode_cursor, group_messages_by_session, keyset_before
+from write_behind import WriteBehindWriter
+from document_cache import DocumentContextCache
+from jobs import IngestionJob, JobQueue
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, MetricsMiddleware, TimedSupabase, observe_stage, timed
+from health import HealthProber, StartupReport
+from conversation import ConversationMemory, Turn, extractive_summary, summary_prompt
+from admission import AdmissionController, AdmissionRejected
+from storage_gc import StorageCollector, remove_paths
+from progressive import ProgressivePublisher
 import json
-from io import BytesIO
+import hashlib
 from uuid import uuid4
+from contextlib import asynccontextmanager
 
 # Grab the logger so we can chat in the logs
 logger = logging.getLogger("uvicorn.error")
 
+startup_report = StartupReport(_import_started)
+startup_report.mark("imports")
+
+configure_pools(EXTRACTION_WORKERS, IO_WORKERS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown chores – start the background helpers; on the way out let ingestion finish, flush messages and wind the pools down."""
+    message_writer.start()
+    health_prober.start()
+    admission.start()
+    storage_gc.start()
+    # Warm Gemini up off the event loop, so the first question doesn't pay for the import
+    warmup = asyncio.ensure_future(run_io(get_llm))
+    startup_report.mark("lifespan")
+    logger.info(f"(Jo Jo) Startup timing: {startup_report.to_dict()}")
+    yield
+    warmup.cancel()
+    await health_prober.stop()
+    await storage_gc.stop()
+    await admission.close()
+    await ingestion_jobs.shutdown()
+    await message_writer.close()
+    llm_gateway.shutdown()
+    shutdown_pools(wait=True)
+
 # Let's get this party started!
-app = FastAPI(title="PDF Q&A API")
+app = FastAPI(title="PDF Q&A API", lifespan=lifespan)
+
+# Every Supabase call is timed per table and operation (see /api/metrics). Clients are created on first use.
+supabase = TimedSupabase(get_supabase)
+supabase_admin = TimedSupabase(get_supabase_admin) if SUPABASE_SERVICE_ROLE_KEY else None
 
 # Make sure our folders exist (so we don't trip over missing directories)
 for directory in [UPLOAD_DIR, TEXT_DIR]:
     os.makedirs(directory, exist_ok=True)
     logger.info(f"Ensured directory exists: {directory}")
 
-# Gemini/GPT configuration for local dev fun
-llm = None
-if GOOGLE_API_KEY:
-    try:
-        logger.info(f"(Jo Jo) Setting up Gemini with your API key.")
-        genai.configure(api_key=GOOGLE_API_KEY)
-        logger.info(f"(Jo Jo) Using Gemini model: {GEMINI_MODEL}")
-        llm = genai.GenerativeModel(GEMINI_MODEL)
-        logger.info("(Jo Jo) Gemini is ready to answer questions!")
-    except Exception as e:
-        logger.error(f"(Jo Jo) Oops, Gemini setup failed: {str(e)}")
-        llm = None
-else:
+# Gemini/GPT configuration for local dev fun. The model is created on first use – importing
+# google.generativeai alone takes most of a second, which serverless cold starts shouldn't pay.
+llm = None  # Set once Gemini is ready (tests and benchmarks drop a stand-in here)
+_llm_lock = threading.Lock()
+_llm_setup_failed = False
+if not GOOGLE_API_KEY:
     logger.warning("(Jo Jo) No Google API key found. Gemini Q&A is off.")
 
+def get_llm():
+    """The shared Gemini model, set up on first call. None when Gemini is off or couldn't be set up."""
+    global llm, _llm_setup_failed
+    if llm is not None or _llm_setup_failed or not GOOGLE_API_KEY:
+        return llm
+    with _llm_lock:
+        if llm is None and not _llm_setup_failed:
+            try:
+                import google.generativeai as genai  # Gemini AI for local magic
+                logger.info(f"(Jo Jo) Setting up Gemini with your API key.")
+                genai.configure(api_key=GOOGLE_API_KEY)
+                logger.info(f"(Jo Jo) Using Gemini model: {GEMINI_MODEL}")
+                llm = genai.GenerativeModel(GEMINI_MODEL)
+                logger.info("(Jo Jo) Gemini is ready to answer questions!")
+            except Exception as e:
+                logger.error(f"(Jo Jo) Oops, Gemini setup failed: {str(e)}")
+                _llm_setup_failed = True
+    return llm
+
+# Embeddings for semantic retrieval, stored per document under VECTOR_DB_DIR
+vector_store = VectorStore(VECTOR_DB_DIR, max_open=VECTOR_STORE_MAX_OPEN)
+embedder = get_embedder(EMBEDDER, EMBEDDING_MODEL, api_key=GOOGLE_API_KEY)
+logger.info(f"(Jo Jo) Retrieval mode: {RETRIEVAL_MODE}, embedder: {embedder.name}")
+
+# Every Gemini call goes through the gateway: off the event loop, capped, and coalesced
+llm_gateway = LLMGateway(get_llm, max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS)
+
+# Answers keyed on document, normalized question, model and prompt version
+answer_cache = AnswerCache(lambda: supabase, GEMINI_MODEL, PROMPT_VERSION, max_entries=ANSWER_CACHE_SIZE,
+                           ttl_seconds=ANSWER_CACHE_TTL_SECONDS, table_ttl_seconds=ANSWER_CACHE_TABLE_TTL_SECONDS)
+
+# Chat messages are written behind the answer, in batches, with a local spill file for outages
+message_writer = WriteBehindWriter(lambda: supabase, WRITE_BEHIND_SPILL_PATH, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                                   flush_interval=WRITE_BEHIND_FLUSH_SECONDS)
+
+# Hot documents keep their metadata and parsed index in memory, so repeat questions skip both lookups
+document_cache = DocumentContextCache(DOCUMENT_CACHE_MAX_BYTES, DOCUMENT_CACHE_TTL_SECONDS)
+
+# Follow-up questions see recent turns plus a running summary, so their prompts stay the same size
+conversations = ConversationMemory(lambda: supabase, window_turns=CONVERSATION_WINDOW_TURNS, summary_max_chars=CONVERSATION_SUMMARY_MAX_CHARS,
+                                   turn_max_chars=CONVERSATION_TURN_MAX_CHARS, max_sessions=CONVERSATION_CACHE_SESSIONS)
+
+# Questions are admitted (or turned away with a 429) before any retrieval or Gemini work starts
+admission = AdmissionController(lambda: supabase, max_in_flight=ADMISSION_MAX_IN_FLIGHT, user_rate=ADMISSION_USER_RATE,
+                                user_burst=ADMISSION_USER_BURST, ip_rate=ADMISSION_IP_RATE, ip_burst=ADMISSION_IP_BURST,
+                                default_daily_quota=ADMISSION_DEFAULT_DAILY_QUOTA, sync_interval=ADMISSION_QUOTA_SYNC_SECONDS)
+admission_rejections = REGISTRY.counter("jojo_admission_rejected_total", "Questions turned away before any work, by reason.", ("reason",))
+
+def forget_documents(document_ids: List[int]) -> None:
+    for document_id in document_ids:
+        document_cache.invalidate(document_id)
+
+# Deleted documents take their files with them; a background pass sweeps orphans and applies retention
+storage_gc = StorageCollector(lambda: supabase_admin if supabase_admin else supabase, UPLOAD_DIR, TEXT_DIR, vector_store,
+                              min_orphan_age=STORAGE_GC_MIN_ORPHAN_AGE_SECONDS, max_age_days=RETENTION_MAX_AGE_DAYS,
+                              max_bytes=RETENTION_MAX_BYTES, batch_size=STORAGE_GC_BATCH_SIZE, interval=STORAGE_GC_INTERVAL_SECONDS,
+                              on_deleted=forget_documents)
+
+# Uploads become background ingestion jobs, a few at a time
+ingestion_jobs = JobQueue(max_concurrency=INGESTION_WORKERS)
+
+# PostgREST caps rows per response (1000 by default), so big message and history fetches are paged at that size
+MESSAGES_PAGE_SIZE = 1000
+HISTORY_PAGE_SIZE = 100  # Documents per page when a cursor comes without a limit
+SESSIONS_PAGE_SIZE = 50  # Chat sessions per page, likewise
+SESSIONS_PER_QUERY = 200  # Session ids per messages query, so the in() filter keeps the URL short
+
 # --- Pydantic Models ---
 class QuestionRequest(BaseModel):
     document_id: int
     question: str
+    session_id: Optional[int] = None  # Continue this conversation; leave out to start a new one
+
+class MultiQuestionRequest(BaseModel):
+    question: str
+    document_ids: Optional[List[int]] = None  # Leave out to ask across every document
 
 class DocumentResponse(BaseModel):
+    # /api/history?fields= can leave any of these out except id and upload_date, which its cursor needs
     id: str
-    filename: str
-    file_path: str
-    text_path: str
+    filename: Optional[str] = None
+    file_path: Optional[str] = None
+    text_path: Optional[str] = None
     upload_date: str  # ISO format string
-    metadata: dict
+    metadata: Optional[dict] = None
     class Config:
         orm_mode = True
 
@@ -77,78 +198,286 @@ class ChatSessionResponse(BaseModel):
         from_attributes = True
 
 # --- Helper Functions ---
-def extract_text_from_pdf_bytes(pdf_bytes: bytes, original_filename: str) -> str:
-    """Pulls out all the readable text from a PDF file. If it's just images, we'll warn you!"""
-    logger.info(f"Extracting text from PDF bytes for: {original_filename}")
-    try:
-        reader = PdfReader(BytesIO(pdf_bytes))
-        all_text = ""
-        for i, page in enumerate(reader.pages):
-            page_text = page.extract_text()
-            if page_text:
-                all_text += page_text
-            else:
-                logger.warning(f"(Jo Jo) Page {i+1} of {original_filename} had no text.")
-        if not all_text:
-            logger.warning(f"(Jo Jo) No text found in {original_filename}. Maybe it's a scanned image?")
-        logger.info(f"(Jo Jo) Got {len(all_text)} characters from {original_filename}")
-        return all_text
-    except Exception as oops:
-        logger.error(f"(Jo Jo) Trouble reading {original_filename}", exc_info=oops)
-        raise ValueError(f"Couldn't read text from PDF: {original_filename}") from oops
-
-def save_text_to_file(text: str, filename_base: str) -> str:
-    """Save the extracted text to a .txt file, so we can chat with it later!"""
+def text_path_for(filename_base: str) -> str:
+    """Where the extracted text for an upload lives."""
     safe_filename_base = "".join(c if c.isalnum() or c in ('.', '-', '_') else '_' for c in filename_base)
-    text_filename = f"{safe_filename_base}.txt"
-    text_path = os.path.join(TEXT_DIR, text_filename)
+    return os.path.join(TEXT_DIR, f"{safe_filename_base}{PAGES_SUFFIX}")
+
+def save_text_to_path(text: str, text_path: str) -> str:
+    """Write extracted text (pages separated by form feeds) as a page file, renamed into place so readers never see half a file."""
     logger.info(f"Saving extracted text to: {text_path}")
     try:
-        with open(text_path, "w", encoding="utf-8") as note_file:
-            note_file.write(text)
-        logger.info(f"(Jo Jo) All done! Text saved to: {text_path}")
+        compressed_bytes = write_pages(text_path, text.split("\f"))
+        logger.info(f"(Jo Jo) All done! {len(text)} characters saved to: {text_path} ({compressed_bytes} bytes compressed)")
         return text_path
     except Exception as oops:
         logger.error(f"(Jo Jo) Trouble saving text to {text_path}", exc_info=oops)
         raise IOError(f"Couldn't save text to file: {text_path}") from oops
 
+def embed_chunks(chunks: List[str], text_path: str) -> None:
+    """Embed a document's chunks into the vector store. Failures only cost us semantic search, never the upload."""
+    if RETRIEVAL_MODE == "bm25" or not chunks:
+        return
+    try:
+        vectors = embedder.embed(chunks)
+        vector_store.save(key_for_text_path(text_path), vectors, embedder.name)
+        logger.info(f"(Jo Jo) Stored {len(chunks)} {embedder.name} embeddings for {text_path}")
+    except Exception as oops:
+        logger.warning(f"(Jo Jo) Couldn't embed chunks for {text_path}; falling back to keyword search", exc_info=oops)
+
+def vectors_usable(chunk_index, text_path: str) -> bool:
+    """True when this document has stored vectors from the current embedder that line up with its chunks."""
+    key = key_for_text_path(text_path)
+    if RETRIEVAL_MODE == "bm25" or not vector_store.exists(key):
+        return False
+    try:
+        _, meta = vector_store.open(key)
+    except Exception as oops:
+        logger.warning(f"Couldn't open vectors for {text_path}; using keyword search.", exc_info=oops)
+        return False
+    if meta.get("embedder") != embedder.name or meta.get("count") != len(chunk_index.chunks):
+        logger.warning(f"Vectors for {text_path} don't match the current embedder or chunks; using keyword search.")
+        return False
+    return True
+
+def semantic_ranking(chunk_index, text_path: str, question: str):
+    """(top chunk ids by embedding similarity, best first; the document's chunk vectors), or None when this
+    document has no usable vectors."""
+    if not vectors_usable(chunk_index, text_path):
+        return None
+    key = key_for_text_path(text_path)
+    try:
+        query_vector = embedder.embed([question], is_query=True)
+        hits = vector_store.search(key, query_vector, RETRIEVAL_CANDIDATES)[0]
+        chunk_vectors, _ = vector_store.open(key)
+    except Exception as oops:
+        logger.warning(f"Semantic search failed for {text_path}; using keyword search.", exc_info=oops)
+        return None
+    return [idx for idx, _ in hits], chunk_vectors
+
+def rank_for_question(chunk_index, text_path: str, question: str) -> List[int]:
+    """Chunk ids for the prompt, best first (blocking). RETRIEVAL_MODE picks the rankings hybrid_rank fuses –
+    BM25, embeddings or both – and, unless it's plain "bm25", the fused candidates are reranked for
+    diversity with MMR."""
+    semantic = semantic_ranking(chunk_index, text_path, question) if RETRIEVAL_MODE != "bm25" else None
+    ranked, chunk_vectors = semantic if semantic is not None else (None, None)
+    return hybrid_rank(chunk_index, question, RETRIEVAL_TOP_K, semantic=ranked, chunk_vectors=chunk_vectors,
+                       lexical=RETRIEVAL_MODE != "semantic" or semantic is None, candidates=RETRIEVAL_CANDIDATES,
+                       rrf_k=RETRIEVAL_RRF_K, mmr_weight=RETRIEVAL_MMR_WEIGHT if RETRIEVAL_MODE != "bm25" else 1.0)
+
+def artifacts_exist(pdf_path: str, text_path: str) -> bool:
+    """True when a PDF has already been fully ingested (text and index are only ever renamed into place)."""
+    return os.path.exists(pdf_path) and os.path.exists(text_path) and os.path.exists(index_path_for(text_path))
+
+async def ingest_pdf(pdf_file_path: str, text_file_path: str, display_name: str, on_stage: Callable[[str], None] = lambda stage: None,
+                     on_pages: Optional[ProgressivePublisher] = None) -> dict:
+    """Extract, index and embed a stored PDF. Returns extraction details for the document metadata.
+
+    on_pages is handed to the extractor when pages are extracted in parallel (see ProgressivePublisher).
+    """
+    extraction_info = {}
+    on_stage("extracting")
+    if PARALLEL_EXTRACTION:
+        # A short queue of ranges per PDF leaves room in the pool for indexing early pages and for other uploads
+        stats = await extract_pdf_to_file(pdf_file_path, text_file_path, display_name, PAGES_PER_TASK,
+                                          ranges_in_flight=2 * EXTRACTION_WORKERS, on_pages=on_pages)
+        has_text = len(stats["empty_pages"]) < stats["page_count"]
+        extraction_info = {
+            "page_count": stats["page_count"],
+            "extraction_seconds": round(stats["wall_seconds"], 3),
+            "slowest_page_seconds": round(max(stats["page_seconds"], default=0.0), 3),
+        }
+    else:
+        with timed("pdf_extraction"):
+            extracted_text = await run_cpu(extract_text_from_pdf_file, pdf_file_path, display_name)
+        has_text = bool(extracted_text.strip())
+        with timed("text_save"):
+            await run_io(save_text_to_path, extracted_text, text_file_path)
+    if not has_text:
+        logger.warning(f"Extracted text for '{display_name}' is empty or only whitespace. Document might be image-based or content is not extractable.")
+    on_stage("indexing")
+    with timed("indexing"):
+        chunks = await run_cpu(index_text_file, text_file_path, CHUNK_SIZE, CHUNK_OVERLAP)
+    logger.info(f"(Jo Jo) Indexed {len(chunks)} chunks for '{display_name}'")
+    on_stage("embedding")
+    with timed("embedding"):
+        await run_io(embed_chunks, chunks, text_file_path)
+    return extraction_info
+
+async def build_context(text_path: str, question: str, original_filename: str, chunk_index=None) -> str:
+    """Retrieve the chunks of a document most relevant to the question, cleaned up and joined into one context string."""
+    with timed("retrieval"):
+        if chunk_index is None:
+            chunk_index = await run_io(load_or_build_index, text_path, CHUNK_SIZE, CHUNK_OVERLAP)
+        ranked = await run_io(rank_for_question, chunk_index, text_path, question)
+    # Strip running headers/footers and extra whitespace, then fill the token budget best chunk first
+    with timed("context_prep"):
+        # Chunks are read from the page file as they're used, so this touches the disk
+        passages, prep = await run_io(prepare_context, chunk_index.chunks, ranked, CONTEXT_TOKEN_BUDGET, chunk_index.boilerplate)
+    context_text = "\n...\n".join(passages)
+    saved = prep["tokens_raw"] - prep["tokens_final"]
+    logger.info(f"(Jo Jo) Context for '{original_filename}': {prep['chunks_used']} of {prep['candidates']} candidate chunks "
+                f"({len(chunk_index.chunks)} total), ~{prep['tokens_raw']} -> ~{prep['tokens_final']} tokens "
+                f"(saved ~{saved}, budget {prep['token_budget']}) from '{text_path}'.")
+    if not context_text.strip():
+        logger.warning(f"Context text for document '{original_filename}' is empty. Question might not be answerable.")
+    return context_text
+
+def build_prompt(original_filename: str, context_text: str, question: str, history: str = "") -> str:
+    """The Q&A prompt. Bump PROMPT_VERSION in config.py whenever this wording changes, so cached answers roll over.
+
+    history is the conversation so far (see ConversationMemory.history_text); answers that used it are never cached.
+    """
+    with timed("prompt_build"):
+        conversation = f"Conversation so far (use it to understand the question, not as a source of facts):\n---\n{history}\n---\n\n" if history else ""
+        return f"Based *only* on the following excerpts from the document named '{original_filename}', please answer the question. If the answer is not found in the excerpts, state that clearly. Do not use any external knowledge.\n\nDocument Excerpts:\n---\n{context_text}\n---\n\n{conversation}Question: {question}\n\nAnswer:"
+
+def check_supabase() -> None:
+    supabase.table("documents").select("id").limit(1).execute()
+
+def check_directories() -> None:
+    missing = [d for d in (UPLOAD_DIR, TEXT_DIR) if not os.path.exists(d)]
+    if missing:
+        raise RuntimeError(f"Missing required directories: {', '.join(missing)}")
+
+# Dependencies are probed in the background, so health checks never wait on Supabase
+health_prober = HealthProber({"supabase": check_supabase, "directories": check_directories},
+                             interval=HEALTH_CHECK_INTERVAL_SECONDS, timeout=HEALTH_CHECK_TIMEOUT_SECONDS)
+
 @app.get("/api/health")
 async def health_check_endpoint(fastapi_req: Request):
-    """Quick health check – is Jo Jo awake and ready?"""
+    """Quick health check – is Jo Jo awake and ready? Reads the latest background probe results."""
     client_host = fastapi_req.client.host if fastapi_req.client else "unknown"
     logger.info(f"Health check requested from {client_host}")
-    # Check Supabase connection as part of health
-    try:
-        response = supabase.table("documents").select("id").limit(1).execute()
-        supabase_healthy = True
-        supabase_message = "Supabase connection successful."
-        logger.info("Supabase health check successful.")
-    except Exception as e:
-        logger.error("Supabase health check failed.", exc_info=e)
-        supabase_healthy = False
-        supabase_message = f"Supabase connection failed: {str(e)}"
-    # Check if required directories exist
-    dirs_healthy = all(os.path.exists(d) for d in [UPLOAD_DIR, TEXT_DIR])
-    dirs_message = "Required directories exist." if dirs_healthy else "Missing required directories."
+    components = health_prober.snapshot()
     # Check if Google API is configured
     google_api_healthy = bool(GOOGLE_API_KEY)
     google_api_message = "Google API key is configured." if google_api_healthy else "Google API key is missing."
+    probed = [component["healthy"] for component in components.values()]
+    if any(healthy is False for healthy in probed):
+        status = "degraded"
+    elif any(healthy is None for healthy in probed):
+        status = "starting"
+    else:
+        status = "ok"
+    components["google_api"] = {"healthy": google_api_healthy, "message": google_api_message}
     return {
-        "status": "ok" if all([supabase_healthy, dirs_healthy]) else "degraded",
+        "status": status,
         "message": "API is healthy",
-        "components": {
-            "supabase": {"healthy": supabase_healthy, "message": supabase_message},
-            "directories": {"healthy": dirs_healthy, "message": dirs_message},
-            "google_api": {"healthy": google_api_healthy, "message": google_api_message}
+        "components": components,
+        "startup": startup_report.to_dict(),
+    }
+
+def stored_page_count(text_path: str) -> int:
+    return open_text(text_path).page_count
+
+async def record_document(document_data: dict) -> int:
+    """Insert a documents row and return its id."""
+    filename = document_data["filename"]
+    logger.info(f"Storing document metadata in Supabase for '{filename}' with data: {document_data}")
+    response = await run_io(lambda: supabase.table("documents").insert(document_data).execute())
+    logger.info(f"Supabase insert response: {response}")
+    if not response.data:
+        logger.error(f"Failed to store document '{filename}' in Supabase. Error: {response.error}, Status: {response.status_code}, Count: {response.count}")
+        raise RuntimeError(f"Couldn't save your document info. Details: {response.error.message if response.error else 'Unknown error'}")
+    return response.data[0]['id']
+
+async def ingest_upload(job: IngestionJob, incoming_pdf_path: str, filename: str, content_type: Optional[str],
+                        size_bytes: int, content_sha256: str) -> dict:
+    """The background half of an upload: dedupe, extract, index, embed, then record the document.
+
+    Long PDFs are recorded early instead: once their first pages are extracted the documents row is
+    created with pages_ready counting what can be answered from so far (and job.progress carries its
+    id), and the row is brought up to date as more pages land and again when everything is done.
+    """
+    # Stored artifacts are named by content hash, so identical PDFs share one copy of everything
+    pdf_file_path = os.path.join(UPLOAD_DIR, f"{content_sha256}.pdf")
+    text_file_path = text_path_for(content_sha256)
+    document_id = None
+
+    def document_data(page_count: int, pages_ready: int, /, **details) -> dict:
+        now = datetime.utcnow().isoformat()
+        return {
+            "filename": filename,
+            "file_path": pdf_file_path,
+            "text_path": text_file_path,
+            "upload_date": now,
+            "updated_at": now,
+            "page_count": page_count,
+            "pages_ready": pages_ready,
+            "metadata": json.dumps({
+                "original_filename": filename,
+                "content_type": content_type,
+                "size_bytes": size_bytes,
+                "sha256": content_sha256,
+                **details
+            })
         }
+
+    async def publish(pages_ready: int, page_count: int) -> None:
+        nonlocal document_id
+        if document_id is None:
+            document_id = await record_document(document_data(page_count, pages_ready, deduplicated=False, progressive=True))
+            logger.info(f"(Jo Jo) '{filename}' is answerable already (document {document_id}, {pages_ready} of {page_count} pages)")
+        else:
+            await run_io(lambda: supabase.table("documents").update({"pages_ready": pages_ready, "updated_at": datetime.utcnow().isoformat()}).eq("id", document_id).execute())
+        job.progress = {"document_id": document_id, "pages_ready": pages_ready, "page_count": page_count}
+
+    publisher = None
+    job.set_stage("deduplicating")
+    try:
+        async with content_lock(content_sha256):
+            deduplicated = await run_io(artifacts_exist, pdf_file_path, text_file_path)
+            if deduplicated:
+                logger.info(f"(Jo Jo) Seen '{filename}' before (sha256: {content_sha256}) – reusing its text and index.")
+                await run_io(os.remove, incoming_pdf_path)
+                extraction_info = {}
+            else:
+                await run_io(os.replace, incoming_pdf_path, pdf_file_path)
+                logger.info(f"File '{filename}' (size: {size_bytes} bytes) saved as {pdf_file_path}")
+                if PROGRESSIVE_INGESTION:
+                    publisher = ProgressivePublisher(text_file_path, CHUNK_SIZE, CHUNK_OVERLAP, publish, first_pages=PROGRESSIVE_FIRST_PAGES,
+                                                     growth=PROGRESSIVE_GROWTH, min_pages=PROGRESSIVE_MIN_PAGES)
+                extraction_info = await ingest_pdf(pdf_file_path, text_file_path, filename, on_stage=job.set_stage, on_pages=publisher)
+            # Recorded before the lock is released, so storage GC never sees these files without their row
+            job.set_stage("saving")
+            page_count = await run_io(stored_page_count, text_file_path)
+            data = document_data(page_count, page_count, deduplicated=deduplicated, progressive=document_id is not None, **extraction_info)
+            if document_id is None:
+                document_id = await record_document(data)
+            else:
+                del data["upload_date"]  # Keeps its place in the history from when it was first answerable
+                await run_io(lambda: supabase.table("documents").update(data).eq("id", document_id).execute())
+                job.progress = {"document_id": document_id, "pages_ready": page_count, "page_count": page_count}
+            if publisher is not None and publisher.published:
+                await publisher.discard()
+    except Exception:
+        if document_id is not None:
+            # The row went out early, but the rest of its pages never will – take it back with what it left behind
+            logger.warning(f"(Jo Jo) Ingestion of '{filename}' failed after it was published as document {document_id}; deleting it.")
+            await publisher.discard()
+            await storage_gc.delete_documents([{"id": document_id, "file_path": pdf_file_path, "text_path": text_file_path}])
+        raise
+    logger.info(f"Document '{filename}' stored successfully. Supabase ID: {document_id}")
+    return {
+        "document_id": document_id,
+        "filename": filename,
+        "text_path": text_file_path,
+        "message": "File uploaded and processed successfully! 🎉"
     }
 
 @app.post("/api/upload")
-async def upload_pdf_endpoint(fastapi_req: Request, files: List[UploadFile] = File(...)):
-    """Handles PDF uploads. We'll save your file, extract the text, and remember it for Q&A!"""
+async def upload_pdf_endpoint(fastapi_req: Request, files: List[UploadFile] = File(...),
+                              wait: bool = Query(False, description="Hold the response until every file is processed")):
+    """Handles PDF uploads. We'll save your files, then extract and remember them in the background!
+
+    Each accepted file becomes an ingestion job; poll /api/jobs/{job_id} (or /api/jobs?ids=...) to
+    follow it. With wait=true the response instead carries the finished results, like it used to.
+    """
     client_host = fastapi_req.client.host if fastapi_req.client else "unknown_client"
     logger.info(f"Received multi-upload request for {len(files)} files from {client_host}")
     results = []
+    jobs = []
     for file in files:
         logger.info(f"Processing file: {file.filename}, content_type: {file.content_type}")
         try:
@@ -156,51 +485,25 @@ async def upload_pdf_endpoint(fastapi_req: Request, files: List[UploadFile] = Fi
                 logger.warning(f"Invalid file type or missing filename: '{file.filename}' from {client_host}")
                 results.append({"filename": file.filename, "error": "Oops! Only PDF files with a .pdf extension are allowed."})
                 continue
-            unique_id = uuid.uuid4()
-            original_filename_base = os.path.splitext(file.filename)[0]
-            safe_original_filename_base = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in original_filename_base)
-            saved_pdf_filename = f"{safe_original_filename_base}_{unique_id}.pdf"
-            pdf_file_path = os.path.join(UPLOAD_DIR, saved_pdf_filename)
-            logger.info(f"Attempting to save uploaded PDF '{file.filename}' to: {pdf_file_path}")
-            pdf_bytes = await file.read()
-            logger.info(f"Read {len(pdf_bytes)} bytes from uploaded file '{file.filename}'")
-            if not pdf_bytes:
+            incoming_pdf_path = os.path.join(UPLOAD_DIR, f".incoming_{uuid.uuid4()}.pdf")
+            logger.info(f"Attempting to save uploaded PDF '{file.filename}' to: {incoming_pdf_path}")
+            try:
+                size_bytes, content_sha256 = await spool_upload_to_disk(file, incoming_pdf_path, UPLOAD_CHUNK_SIZE, MAX_UPLOAD_BYTES)
+            except UploadTooLarge as too_big:
+                logger.warning(f"Uploaded file '{file.filename}' rejected: {too_big}")
+                results.append({"filename": file.filename, "error": f"Whoa, that PDF is too big! {too_big}"})
+                continue
+            logger.info(f"Streamed {size_bytes} bytes from uploaded file '{file.filename}' (sha256: {content_sha256})")
+            if not size_bytes:
                 logger.error(f"Uploaded file '{file.filename}' is empty.")
+                await run_io(os.remove, incoming_pdf_path)
                 results.append({"filename": file.filename, "error": "Looks like your file was empty! Try again?"})
                 continue
-            with open(pdf_file_path, "wb") as buffer:
-                buffer.write(pdf_bytes)
-            logger.info(f"File '{file.filename}' (size: {len(pdf_bytes)} bytes) saved as {saved_pdf_filename}")
-            extracted_text = extract_text_from_pdf_bytes(pdf_bytes, file.filename)
-            if not extracted_text.strip():
-                logger.warning(f"Extracted text for '{file.filename}' is empty or only whitespace. Document might be image-based or content is not extractable.")
-            text_file_path = save_text_to_file(extracted_text, f"{safe_original_filename_base}_{unique_id}")
-            document_data = {
-                "filename": file.filename,
-                "file_path": pdf_file_path,
-                "text_path": text_file_path,
-                "upload_date": datetime.utcnow().isoformat(),
-                "metadata": json.dumps({
-                    "original_filename": file.filename,
-                    "content_type": file.content_type,
-                    "size_bytes": len(pdf_bytes)
-                })
-            }
-            logger.info(f"Storing document metadata in Supabase for '{file.filename}' with data: {document_data}")
-            response = supabase.table("documents").insert(document_data).execute()
-            logger.info(f"Supabase insert response: {response}")
-            if response.data and len(response.data) > 0:
-                document_id = response.data[0]['id']
-                logger.info(f"Document '{file.filename}' stored successfully. Supabase ID: {document_id}")
-                results.append({
-                    "document_id": document_id,
-                    "filename": file.filename,
-                    "text_path": text_file_path,
-                    "message": "File uploaded and processed successfully! 🎉"
-                })
-            else:
-                logger.error(f"Failed to store document '{file.filename}' in Supabase. Error: {response.error}, Status: {response.status_code}, Count: {response.count}")
-                results.append({"filename": file.filename, "error": f"Couldn't save your document info. Details: {response.error.message if response.error else 'Unknown error'}"})
+            job = ingestion_jobs.submit(file.filename, partial(ingest_upload, incoming_pdf_path=incoming_pdf_path, filename=file.filename,
+                                                               content_type=file.content_type, size_bytes=size_bytes, content_sha256=content_sha256))
+            logger.info(f"(Jo Jo) Queued ingestion job {job.id} for '{file.filename}'")
+            jobs.append(job)
+            results.append(job)
         except Exception as e:
             logger.error(f"Unexpected error during upload of '{file.filename}'", exc_info=True)
             results.append({"filename": file.filename, "error": f"Yikes! Something went wrong: {str(e)}"})
@@ -210,135 +513,724 @@ async def upload_pdf_endpoint(fastapi_req: Request, files: List[UploadFile] = Fi
                     await file.close()
                 except Exception as close_err:
                     logger.warning(f"Error closing file '{file.filename}': {close_err}")
+    if wait:
+        await ingestion_jobs.wait(jobs)
+        results = [upload_result(entry) for entry in results]
+    else:
+        results = [entry.to_dict() if isinstance(entry, IngestionJob) else entry for entry in results]
     logger.info(f"Upload results: {results}")
     return results
 
+def upload_result(entry) -> dict:
+    """A finished job in the original /api/upload result shape."""
+    if not isinstance(entry, IngestionJob):
+        return entry
+    if entry.error:
+        return {"filename": entry.filename, "error": f"Yikes! Something went wrong: {entry.error}", "job_id": entry.id}
+    return {**entry.result, "job_id": entry.id}
+
+@app.get("/api/jobs")
+async def list_jobs_endpoint(ids: str = Query(..., description="Comma-separated job ids")):
+    """Status for a batch of ingestion jobs in one call. Unknown ids are simply left out."""
+    job_ids = [job_id.strip() for job_id in ids.split(",") if job_id.strip()]
+    return [job.to_dict() for job in ingestion_jobs.many(job_ids)]
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_endpoint(job_id: str):
+    """Where is my upload at? Current stage, per-stage timings, and the result or error once it's done."""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sorry, I don't know that job (it may have finished a while ago).")
+    return job.to_dict()
+
+GEMINI_DISABLED_ANSWER = "[Gemini AI is disabled in this deployment. Please run locally for full functionality.]"
+
+def readable_text(row: dict) -> Tuple[Optional[str], dict]:
+    """The text file a question about this documents row should read, and how much of the document it covers.
+
+    While a long PDF is still being ingested that's the partial snapshot of its ready pages; as soon as
+    the full text and its index are in place, the full text – even before the row catches up.
+    """
+    text_path = row.get("text_path")
+    pages_ready, page_count = row.get("pages_ready"), row.get("page_count")
+    if (text_path and pages_ready is not None and page_count is not None and pages_ready < page_count
+            and not os.path.exists(index_path_for(text_path))):
+        return partial_path_for(text_path), {"pages_ready": pages_ready, "page_count": page_count, "complete": False}
+    return text_path, {"pages_ready": page_count, "page_count": page_count, "complete": True}
+
+def fetch_document_for_question(document_id: int, question: str) -> dict:
+    """Look up the text file, filename and coverage for a document, or raise the HTTP error the client should see."""
+    logger.info(f"Fetching document (id: {document_id}) text_path from Supabase.")
+    doc_response = supabase.table("documents").select("text_path, filename, pages_ready, page_count").eq("id", document_id).maybe_single().execute()
+    if not doc_response or not doc_response.data:
+        logger.warning(f"Document id {document_id} not found for '{question}'.")
+        raise HTTPException(status_code=404, detail=f"Sorry, I couldn't find that document!")
+    text_path, coverage = readable_text(doc_response.data)
+    original_filename = doc_response.data.get("filename", f"DocumentID_{document_id}")
+    logger.info(f"Found text_path: '{text_path}' for document '{original_filename}'.")
+    if not text_path or not (os.path.exists(text_path) or os.path.exists(doc_response.data["text_path"])):
+        logger.error(f"Text file '{text_path}' for document '{original_filename}' (id: {document_id}) not found or inaccessible.")
+        raise HTTPException(status_code=500, detail=f"Oops! The extracted text for '{original_filename}' is missing or inaccessible.")
+    return {"text_path": text_path, "full_text_path": doc_response.data["text_path"], "filename": original_filename, "coverage": coverage}
+
+def load_readable_index(document: dict) -> BM25Index:
+    """Load the index for a document from fetch_document_for_question or fetch_documents_for_questions (blocking).
+
+    A partial snapshot is read into memory straight away, since ingestion removes it as soon as the full
+    text is in place. If it's already gone, the full text is there to read instead, and the document
+    is switched over to it.
+    """
+    if not document["coverage"]["complete"]:
+        try:
+            index = BM25Index.load(index_path_for(document["text_path"]), document["text_path"])
+            index.chunks.reader.pin()
+            return index
+        except FileNotFoundError:
+            logger.info(f"(Jo Jo) The partial text for '{document['filename']}' was replaced by the full text mid-load; reading that instead.")
+            page_count = document["coverage"]["page_count"]
+            document["text_path"] = document["full_text_path"]
+            document["coverage"] = {"pages_ready": page_count, "page_count": page_count, "complete": True}
+    return load_or_build_index(document["text_path"], CHUNK_SIZE, CHUNK_OVERLAP)
+
+async def load_document(document_id: int, question: str) -> dict:
+    """Metadata and parsed index for a document – from the document cache when it's hot, else Supabase and disk.
+    Documents still being ingested aren't cached: their next load should see more pages."""
+    document = document_cache.get(document_id)
+    if document is not None:
+        return document
+    with timed("document_load"):
+        document = await run_io(fetch_document_for_question, document_id, question)
+        document["index"] = await run_io(load_readable_index, document)
+    if document["coverage"]["complete"]:
+        document_cache.put(document_id, document, document["index"].memory_footprint())
+    return document
+
+async def lookup_cached_answer(document_id: int, question: str, history: str = "") -> Optional[str]:
+    """Repeated questions come straight from the answer cache – no retrieval, no Gemini call.
+    Follow-ups depend on the conversation before them, so they never do."""
+    if not get_llm() or history:
+        return None
+    with timed("answer_cache_lookup"):
+        cached_answer = answer_cache.get_local(document_id, question)
+        if cached_answer is None:
+            cached_answer = await run_io(answer_cache.get_remote, document_id, question)
+    return cached_answer
+
+def create_chat_session(document_id: int, original_filename: str) -> int:
+    logger.info(f"Creating chat session for document '{original_filename}' (id: {document_id}).")
+    session_response = supabase.table("chat_sessions").insert({"document_id": document_id}).execute()
+    if not session_response.data or len(session_response.data) == 0:
+        logger.error(f"Failed to create chat session for document '{original_filename}'. Supabase error: {session_response.error}")
+        raise HTTPException(status_code=500, detail="Could not create chat session. Please try again!")
+    session_id = session_response.data[0]['id']
+    logger.info(f"Chat session created (id: {session_id}) for '{original_filename}'.")
+    return session_id
+
+def start_chat_session(document_id: int, original_filename: str) -> "asyncio.Future":
+    """Kick off the session insert in the background so it overlaps with retrieval and Gemini."""
+    return asyncio.ensure_future(run_io(create_chat_session, document_id, original_filename))
+
+def requesting_user(fastapi_req: Request) -> Optional[str]:
+    """The users.id a request is made for, from ADMISSION_USER_HEADER – ignored unless it's a uuid."""
+    raw = fastapi_req.headers.get(ADMISSION_USER_HEADER)
+    try:
+        return str(uuid.UUID(raw)) if raw else None
+    except ValueError:
+        return None
+
+def client_address(fastapi_req: Request) -> str:
+    """The address per-IP limits are keyed on. With ADMISSION_FORWARDED_HEADER set, it's the entry our
+    trusted proxies appended (counting ADMISSION_TRUSTED_PROXIES from the right) – anything further left
+    came from the client and could say anything."""
+    peer = fastapi_req.client.host if fastapi_req.client else "unknown_client"
+    if not ADMISSION_FORWARDED_HEADER:
+        return peer
+    hops = [hop.strip() for hop in fastapi_req.headers.get(ADMISSION_FORWARDED_HEADER, "").split(",") if hop.strip()]
+    return hops[-ADMISSION_TRUSTED_PROXIES] if len(hops) >= ADMISSION_TRUSTED_PROXIES >= 1 else peer
+
+async def admit_question(fastapi_req: Request) -> dict:
+    """Admission control for the question endpoints: a quick 429 with Retry-After beats a slow answer for everyone."""
+    client_host = client_address(fastapi_req)
+    try:
+        return await admission.admit(requesting_user(fastapi_req), client_host)
+    except AdmissionRejected as rejected:
+        admission_rejections.inc(rejected.reason)
+        logger.warning(f"(Jo Jo) Turned away a question from {client_host} ({rejected.reason}); retry in {rejected.retry_after_header}s")
+        raise HTTPException(status_code=429, detail=rejected.detail, headers={"Retry-After": rejected.retry_after_header})
+
+async def release_after(ticket: dict, events):
+    """Pass a stream through, releasing its admission ticket once the stream ends – however it ends."""
+    try:
+        async for event in events:
+            yield event
+    finally:
+        admission.release(ticket)
+        await events.aclose()  # Run the stream's own cleanup now, even if the client walked away midway
+
+async def load_conversation(question_request: QuestionRequest) -> Optional[dict]:
+    """The conversation a question continues, or None when it starts a new one."""
+    session_id = question_request.session_id
+    if session_id is None:
+        return None
+    conversation = await run_io(conversations.load, session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Sorry, I couldn't find that chat session!")
+    if conversation["document_id"] != question_request.document_id:
+        raise HTTPException(status_code=400, detail=f"Chat session {session_id} is about a different document.")
+    return conversation
+
+def open_chat_session(document_id: int, original_filename: str, conversation: Optional[dict]) -> "asyncio.Future":
+    """A new session row for a new conversation; a continued one already has its id, so no row is added."""
+    if conversation is None:
+        return start_chat_session(document_id, original_filename)
+    existing = asyncio.get_running_loop().create_future()
+    existing.set_result(conversation["session_id"])
+    return existing
+
+async def summarize_turns(summary: str, turns: List[Turn]) -> str:
+    """Fold turns that left the conversation window into its summary – with Gemini, or a plain digest when it's off."""
+    if not get_llm():
+        return extractive_summary(summary, turns, CONVERSATION_SUMMARY_MAX_CHARS)
+    with timed("conversation_summary"):
+        return await llm_gateway.generate(summary_prompt(summary, turns, CONVERSATION_SUMMARY_MAX_CHARS))
+
+background_tasks = set()  # Strong references, so fire-and-forget work isn't garbage collected midway
+
+def remember_turn(session_id: Optional[int], document_id: int, question: str, answer: str) -> None:
+    """Add the finished turn to the session's memory in the background – the answer never waits on a summary."""
+    if session_id is None:
+        return
+    task = asyncio.ensure_future(conversations.remember(session_id, document_id, question, answer, summarize_turns))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def discard_chat_session(session_task: Optional["asyncio.Future"], conversation: Optional[dict]) -> None:
+    """No answer after all, so a session opened for it would stay empty – delete its row once the insert lands,
+    in the background. A continued conversation's session has earlier turns and is left alone."""
+    if session_task is None or conversation is not None:
+        return
+
+    async def discard() -> None:
+        try:
+            session_id = await session_task
+        except Exception:
+            return  # Never created, nothing to undo
+        try:
+            await run_io(lambda: supabase.table("chat_sessions").delete().eq("id", session_id).execute())
+        except Exception as e:
+            logger.warning(f"(Jo Jo) Couldn't remove empty chat session {session_id}: {e}")
+
+    task = asyncio.ensure_future(discard())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def resolve_chat_session(session_task: "asyncio.Future", original_filename: str) -> Optional[int]:
+    """Wait for the session id. If Supabase failed we still have an answer to give, just no history for it."""
+    try:
+        return await session_task
+    except Exception as e:
+        logger.error(f"Chat session for '{original_filename}' couldn't be created; this answer won't be saved: {e}")
+        return None
+
+def store_messages(session_id: Optional[int], question: str, answer: str, original_filename: str) -> None:
+    """Queue the question and answer for the write-behind writer – no Supabase round trip here."""
+    if session_id is None:
+        return
+    messages_to_store = [
+        {
+            "session_id": session_id,
+            "role": "user",
+            "content": question,
+            "created_at": datetime.utcnow().isoformat()
+        },
+        {
+            "session_id": session_id,
+            "role": "assistant",
+            "content": answer,
+            "created_at": datetime.utcnow().isoformat()
+        }
+    ]
+    logger.info(f"Queueing {len(messages_to_store)} messages for session {session_id} ('{original_filename}').")
+    message_writer.enqueue("messages", messages_to_store)
+
+async def generate_answer(document_id: int, question: str, document: dict, conversation: Optional[dict] = None) -> str:
+    """Retrieve context, ask Gemini and cache the answer. Identical questions in flight share one run.
+
+    Follow-ups in a conversation get its history in the prompt and aren't cached – the same words
+    can mean something else in another conversation. Neither are answers from a partly ingested document.
+    """
+    history = conversations.history_text(conversation)
+
+    async def produce() -> str:
+        original_filename = document["filename"]
+        context_text = await build_context(document["text_path"], conversations.retrieval_query(conversation, question),
+                                           original_filename, document["index"])
+        prompt = build_prompt(original_filename, context_text, question, history)
+        logger.info(f"Sending prompt to Gemini for '{original_filename}'. Prompt length: {len(prompt)} chars.")
+        answer = await llm_gateway.generate(prompt)
+        if not history and document["coverage"]["complete"]:
+            await run_io(answer_cache.put, document_id, question, answer)
+        return answer
+    return await llm_gateway.coalesce(answer_cache.key_for(document_id, f"{history}\n{question}" if history else question), produce)
+
 @app.post("/api/ask")
 async def ask_question_endpoint(fastapi_req: Request, question_request: QuestionRequest):
-    """Ask Jo Jo anything about your PDF! We'll do our best to answer based on the text."""
+    """Ask Jo Jo anything about your PDF! We'll do our best to answer based on the text.
+
+    Send back the session_id from an answer to ask a follow-up in the same conversation.
+    """
     client_host = fastapi_req.client.host if fastapi_req.client else "unknown_client"
     logger.info(f"Received question for document {question_request.document_id} from {client_host}: '{question_request.question}'")
+    ticket = await admit_question(fastapi_req)
+    session_task = conversation = None
+    answered = False
     try:
-        logger.info(f"Fetching document (id: {question_request.document_id}) text_path from Supabase.")
-        doc_response = supabase.table("documents").select("text_path, filename").eq("id", question_request.document_id).maybe_single().execute()
-        if not doc_response.data:
-            logger.warning(f"Document id {question_request.document_id} not found for '{question_request.question}'.")
-            raise HTTPException(status_code=404, detail=f"Sorry, I couldn't find that document!")
-        text_path = doc_response.data.get("text_path")
-        original_filename = doc_response.data.get("filename", f"DocumentID_{question_request.document_id}")
-        logger.info(f"Found text_path: '{text_path}' for document '{original_filename}'.")
-        if not text_path or not os.path.exists(text_path):
-            logger.error(f"Text file '{text_path}' for document '{original_filename}' (id: {question_request.document_id}) not found or inaccessible.")
-            raise HTTPException(status_code=500, detail=f"Oops! The extracted text for '{original_filename}' is missing or inaccessible.")
-        with open(text_path, "r", encoding="utf-8") as f:
-            context_text = f.read()
-        logger.info(f"Successfully read {len(context_text)} characters from '{text_path}' for '{original_filename}'.")
-        if not context_text.strip():
-            logger.warning(f"Context text for document '{original_filename}' is empty. Question might not be answerable.")
-        logger.info(f"Creating chat session for document '{original_filename}' (id: {question_request.document_id}).")
-        session_data = {"document_id": question_request.document_id}
-        session_response = supabase.table("chat_sessions").insert(session_data).execute()
-        if not session_response.data or len(session_response.data) == 0:
-            logger.error(f"Failed to create chat session for document '{original_filename}'. Supabase error: {session_response.error}")
-            raise HTTPException(status_code=500, detail="Could not create chat session. Please try again!")
-        session_id = session_response.data[0]['id']
-        logger.info(f"Chat session created (id: {session_id}) for '{original_filename}'.")
+        document = await load_document(question_request.document_id, question_request.question)
+        original_filename = document["filename"]
+        conversation = await load_conversation(question_request)
+        session_task = open_chat_session(question_request.document_id, original_filename, conversation)
+        cached_answer = await lookup_cached_answer(question_request.document_id, question_request.question,
+                                                   conversations.history_text(conversation))
         # Use Gemini if available
-        if llm:
-            prompt = f"Based *only* on the following text from the document named '{original_filename}', please answer the question. If the answer is not found in the text, state that clearly. Do not use any external knowledge.\n\nDocument Text:\n---\n{context_text}\n---\n\nQuestion: {question_request.question}\n\nAnswer:"
-            logger.info(f"Sending prompt to Gemini for '{original_filename}' (session: {session_id}). Prompt length: {len(prompt)} chars.")
-            gemini_response = llm.generate_content(prompt)
-            answer = gemini_response.text  # Using .text attribute for the answer
-            logger.info(f"Received answer from Gemini for '{original_filename}' (session: {session_id}). Answer length: {len(answer)} chars.")
+        if cached_answer is not None:
+            answer = cached_answer
+            logger.info(f"Answered from cache for '{original_filename}'.")
+        elif get_llm():
+            answer = await generate_answer(question_request.document_id, question_request.question, document, conversation)
+            logger.info(f"Received answer from Gemini for '{original_filename}'. Answer length: {len(answer)} chars.")
             logger.debug(f"Gemini Answer for '{original_filename}': {answer[:200]}...")
         else:
-            answer = "[Gemini AI is disabled in this deployment. Please run locally for full functionality.]"
-        messages_to_store = [
-            {
-                "session_id": session_id,
-                "role": "user",
-                "content": question_request.question,
-                "created_at": datetime.utcnow().isoformat()
-            },
-            {
-                "session_id": session_id,
-                "role": "assistant",
-                "content": answer,
-                "created_at": datetime.utcnow().isoformat()
-            }
-        ]
-        logger.info(f"Storing {len(messages_to_store)} messages in Supabase for session {session_id} ('{original_filename}').")
-        message_response = supabase.table("messages").insert(messages_to_store).execute()
-        if not message_response.data:
-            logger.warning(f"Failed to store messages for session {session_id} ('{original_filename}'). Supabase error: {message_response.error.message if message_response.error else 'Unknown'}")
+            answer = GEMINI_DISABLED_ANSWER
+        answered = True
+        session_id = await resolve_chat_session(session_task, original_filename)
+        store_messages(session_id, question_request.question, answer, original_filename)
+        remember_turn(session_id, question_request.document_id, question_request.question, answer)
         return {
             "answer": answer,
             "document_id": question_request.document_id,
-            "session_id": session_id
+            "session_id": session_id,
+            "cached": cached_answer is not None,
+            "coverage": document["coverage"]
         }
     except HTTPException as http_exc:
         logger.warning(f"HTTPException while asking question for doc {question_request.document_id}: {http_exc.detail}", exc_info=True)
         raise http_exc
+    except LLMBusy as busy:
+        logger.warning(f"Gemini is saturated; turning away question for doc {question_request.document_id}: {busy}")
+        raise HTTPException(status_code=503, detail="Jo Jo is answering lots of questions right now. Please try again in a moment!",
+                            headers={"Retry-After": str(max(1, int(LLM_QUEUE_TIMEOUT_SECONDS)))})
     except Exception as e:
         logger.error(f"Unexpected error while asking question for doc {question_request.document_id}: '{question_request.question}'", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Yikes! Something went wrong: {str(e)}")
+    finally:
+        admission.release(ticket)
+        if not answered:
+            discard_chat_session(session_task, conversation)
+
+@app.post("/api/ask/stream")
+async def ask_question_stream_endpoint(fastapi_req: Request, question_request: QuestionRequest):
+    """Like /api/ask, but the answer arrives as server-sent events while Gemini is still writing it.
+
+    Events: `start`, any number of `token` events, then `done` (with the session id) – or `error`
+    if generation fails midway. The session is created alongside generation, so it never delays
+    the first token, and the messages are queued for the write-behind writer once the stream completes.
+    A stream that ends in an error, or that the client walks away from, removes the session it opened.
+    """
+    client_host = fastapi_req.client.host if fastapi_req.client else "unknown_client"
+    logger.info(f"Received streaming question for document {question_request.document_id} from {client_host}: '{question_request.question}'")
+    ticket = await admit_question(fastapi_req)
+    session_task = conversation = None
+    # Lookup failures happen before the stream starts, so they still come back as normal HTTP errors
+    try:
+        document = await load_document(question_request.document_id, question_request.question)
+        original_filename = document["filename"]
+        conversation = await load_conversation(question_request)
+        history = conversations.history_text(conversation)
+        session_task = open_chat_session(question_request.document_id, original_filename, conversation)
+        cached_answer = await lookup_cached_answer(question_request.document_id, question_request.question, history)
+    except BaseException:
+        admission.release(ticket)
+        discard_chat_session(session_task, conversation)
+        raise
+
+    async def event_stream():
+        started = time.perf_counter()
+        first_token_ms = None
+        pieces = []
+        saved = False
+        try:
+            yield sse_event({"document_id": question_request.document_id, "coverage": document["coverage"]}, event="start")
+            try:
+                if cached_answer is not None:
+                    pieces.append(cached_answer)
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                    yield sse_event({"text": cached_answer}, event="token")
+                elif get_llm():
+                    context_text = await build_context(document["text_path"], conversations.retrieval_query(conversation, question_request.question),
+                                                       original_filename, document["index"])
+                    prompt = build_prompt(original_filename, context_text, question_request.question, history)
+                    logger.info(f"Streaming prompt to Gemini for '{original_filename}'. Prompt length: {len(prompt)} chars.")
+                    async with llm_gateway.slot():
+                        llm_started = time.perf_counter()
+                        async for text in stream_llm_text(get_llm(), prompt):
+                            if first_token_ms is None:
+                                first_token_ms = (time.perf_counter() - started) * 1000
+                                observe_stage("llm_first_token", time.perf_counter() - llm_started)
+                                logger.info(f"(Jo Jo) First token for '{original_filename}' after {first_token_ms:.0f}ms")
+                            pieces.append(text)
+                            yield sse_event({"text": text}, event="token")
+                        observe_stage("llm_stream", time.perf_counter() - llm_started)
+                else:
+                    pieces.append(GEMINI_DISABLED_ANSWER)
+                    yield sse_event({"text": GEMINI_DISABLED_ANSWER}, event="token")
+            except Exception as e:
+                logger.error(f"Streaming answer failed for doc {question_request.document_id}", exc_info=True)
+                yield sse_event({"detail": f"Yikes! Something went wrong: {str(e)}"}, event="error")
+                return
+            answer = "".join(pieces)
+            if get_llm() and cached_answer is None and not history and document["coverage"]["complete"]:
+                await run_io(answer_cache.put, question_request.document_id, question_request.question, answer)
+            session_id = await resolve_chat_session(session_task, original_filename)
+            store_messages(session_id, question_request.question, answer, original_filename)
+            saved = True
+            remember_turn(session_id, question_request.document_id, question_request.question, answer)
+            yield sse_event({
+                "session_id": session_id,
+                "document_id": question_request.document_id,
+                "answer_length": len(answer),
+                "cached": cached_answer is not None,
+                "time_to_first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            }, event="done")
+        finally:
+            if not saved:
+                discard_chat_session(session_task, conversation)
+
+    return StreamingResponse(release_after(ticket, event_stream()), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def fetch_documents_for_questions(document_ids: Optional[List[int]]) -> List[dict]:
+    """Look up many documents in one query – the given ids, or the newest MULTI_DOC_MAX_DOCUMENTS when None.
+
+    Documents whose extracted text has gone missing are skipped rather than failing the whole question.
+    """
+    query = supabase.table("documents").select("id, filename, text_path, pages_ready, page_count")
+    if document_ids is None:
+        query = query.order("upload_date", desc=True).limit(MULTI_DOC_MAX_DOCUMENTS)
+    else:
+        query = query.in_("id", document_ids)
+    rows = query.execute().data or []
+    documents = []
+    for row in rows:
+        text_path, coverage = readable_text(row)
+        if not text_path or not (os.path.exists(text_path) or os.path.exists(row["text_path"])):
+            logger.warning(f"Skipping document {row.get('id')} ('{row.get('filename')}'): its extracted text is missing.")
+            continue
+        documents.append({"id": row["id"], "text_path": text_path, "full_text_path": row["text_path"],
+                          "filename": row.get("filename") or f"DocumentID_{row['id']}", "coverage": coverage})
+    return documents
+
+async def load_documents(document_ids: Optional[List[int]]) -> List[Tuple[int, dict]]:
+    """(id, document) pairs for a multi-document question. Hot documents come from the document cache;
+    the rest are looked up in one Supabase query and their indexes loaded in parallel."""
+    with timed("document_load"):
+        if document_ids is not None:
+            document_ids = list(dict.fromkeys(document_ids))[:MULTI_DOC_MAX_DOCUMENTS]
+            cached = {document_id: document_cache.get(document_id) for document_id in document_ids}
+            missing = [document_id for document_id, document in cached.items() if document is None]
+            fetched = await run_io(fetch_documents_for_questions, missing) if missing else []
+        else:
+            fetched = await run_io(fetch_documents_for_questions, None)
+            cached = {row["id"]: document_cache.get(row["id"]) for row in fetched}
+            fetched = [row for row in fetched if cached[row["id"]] is None]
+        indexes = await asyncio.gather(*(run_io(load_readable_index, row) for row in fetched))
+    for row, index in zip(fetched, indexes):
+        document = {"text_path": row["text_path"], "filename": row["filename"], "coverage": row["coverage"], "index": index}
+        if row["coverage"]["complete"]:
+            document_cache.put(row["id"], document, index.memory_footprint())
+        cached[row["id"]] = document
+    return [(document_id, document) for document_id, document in cached.items() if document is not None]
+
+def search_shard(shard: List[Tuple[int, dict]], question: str, query_vector, lexical: bool, depth: int) -> Tuple[list, list]:
+    """Search one shard of documents (blocking): each document's best depth chunks by BM25 when lexical, and by
+    embedding similarity across the shard's vectors when a query vector is given."""
+    semantic = []
+    if query_vector is not None:
+        keys = [key_for_text_path(document["text_path"]) for _, document in shard]
+        hits = vector_store.search_together(keys, query_vector, depth)
+        semantic = [(document_id, document_hits) for (document_id, _), document_hits in zip(shard, hits)]
+    keyword = [(document_id, document["index"].search(question, depth)) for document_id, document in shard] if lexical else []
+    return keyword, semantic
+
+def shard_vectors_usable(shard: List[Tuple[int, dict]]) -> bool:
+    return all(vectors_usable(document["index"], document["text_path"]) for _, document in shard)
+
+async def retrieve_across_documents(documents: List[Tuple[int, dict]], question: str) -> Tuple[List[Tuple[int, int, float]], str]:
+    """The best chunks across many documents, as (document id, chunk id, score) best first, plus the mode used.
+
+    Documents are split into one shard per I/O worker and the shards are searched in parallel; each
+    document contributes its own top hits and a heap merge keeps the overall best. The query is
+    embedded once for all of them. Semantic scores are only comparable when every document has
+    vectors from the same embedder, so anything less falls back to BM25 everywhere. In hybrid mode
+    the merged BM25 and embedding rankings are fused by reciprocal rank (scores are then RRF scores).
+    """
+    shards = [documents[start::IO_WORKERS] for start in range(min(IO_WORKERS, len(documents)))]
+    query_vector = None
+    if RETRIEVAL_MODE != "bm25" and all(await asyncio.gather(*(run_io(shard_vectors_usable, shard) for shard in shards))):
+        try:
+            query_vector = await run_io(embedder.embed, [question], is_query=True)
+        except Exception as oops:
+            logger.warning("Couldn't embed the question; searching every document by keyword instead.", exc_info=oops)
+    lexical = RETRIEVAL_MODE != "semantic" or query_vector is None
+    fusing = lexical and query_vector is not None
+    depth = max(MULTI_DOC_TOP_K, RETRIEVAL_CANDIDATES) if fusing else MULTI_DOC_TOP_K
+    per_shard = await asyncio.gather(*(run_io(search_shard, shard, question, query_vector, lexical, depth) for shard in shards))
+    keyword, semantic = (merge_hits((result for results in per_shard for result in results[which]), depth) for which in (0, 1))
+    if not fusing:
+        return (keyword, "bm25") if lexical else (semantic, "semantic")
+    fused = reciprocal_rank_fusion([[(document_id, idx) for document_id, idx, _ in hits] for hits in (keyword, semantic)], RETRIEVAL_RRF_K)
+    return [(document_id, idx, score) for (document_id, idx), score in fused[:MULTI_DOC_TOP_K]], "hybrid"
+
+def chunk_pages(chunks, idx: int) -> List[int]:
+    """1-based pages a chunk was cut from, when its index knows where the chunk sits in the text."""
+    return chunks.pages(idx) if isinstance(chunks, StoredChunks) else []
+
+def build_multi_prompt(sections: List[Tuple[str, str]], question: str) -> str:
+    """The cross-document Q&A prompt: excerpts grouped under their filename, which the answer cites."""
+    with timed("prompt_build"):
+        excerpts = "\n\n".join(f"From '{filename}':\n---\n{context_text}\n---" for filename, context_text in sections)
+        return f"Based *only* on the following excerpts from {len(sections)} documents, please answer the question. After each fact, cite the document it came from by name in square brackets, like ['report.pdf']. If the answer is not found in the excerpts, state that clearly. Do not use any external knowledge.\n\n{excerpts}\n\nQuestion: {question}\n\nAnswer:"
+
+@app.post("/api/ask/multi")
+async def ask_across_documents_endpoint(fastapi_req: Request, question_request: MultiQuestionRequest):
+    """Ask one question across several documents – or all of them – and get an answer that cites its sources.
+
+    Multi-document answers aren't saved to chat history (sessions belong to a single document) or to
+    the answer cache, but identical questions in flight still share one Gemini call.
+    """
+    client_host = fastapi_req.client.host if fastapi_req.client else "unknown_client"
+    scope = "all documents" if question_request.document_ids is None else f"documents {question_request.document_ids}"
+    logger.info(f"Received question across {scope} from {client_host}: '{question_request.question}'")
+    ticket = await admit_question(fastapi_req)
+    try:
+        documents = await load_documents(question_request.document_ids)
+        if not documents:
+            raise HTTPException(status_code=404, detail="Sorry, I couldn't find any of those documents!")
+        with timed("retrieval"):
+            hits, mode = await retrieve_across_documents(documents, question_request.question)
+        by_id = dict(documents)
+        with timed("context_prep"):
+            sources = {document_id: (document["index"].chunks, document["index"].boilerplate) for document_id, document in documents}
+            sections, prep = await run_io(prepare_sources, sources, [(document_id, idx) for document_id, idx, _ in hits], CONTEXT_TOKEN_BUDGET)
+        logger.info(f"(Jo Jo) Context across {len(documents)} documents ({mode}): {prep['chunks_used']} of {prep['candidates']} "
+                    f"candidate chunks from {len(sections)} documents, ~{prep['tokens_raw']} -> ~{prep['tokens_final']} tokens.")
+        if not sections:
+            answer = "I couldn't find anything about that in these documents."
+        elif get_llm():
+            prompt = build_multi_prompt([(by_id[document_id]["filename"], "\n...\n".join(passages)) for document_id, passages in sections.items()],
+                                        question_request.question)
+            coalesce_key = answer_cache.key_for("multi:" + ",".join(str(document_id) for document_id, _ in documents), question_request.question)
+            answer = await llm_gateway.coalesce(coalesce_key, lambda: llm_gateway.generate(prompt))
+            logger.info(f"Received cross-document answer from Gemini. Answer length: {len(answer)} chars.")
+        else:
+            answer = GEMINI_DISABLED_ANSWER
+        used = set(prep["chunks"])
+        return {
+            "answer": answer,
+            "document_ids": [document_id for document_id, _ in documents],
+            "retrieval_mode": mode,
+            "coverage": [{"document_id": document_id, **document["coverage"]} for document_id, document in documents],
+            "sources": [
+                {"document_id": document_id, "filename": by_id[document_id]["filename"], "chunk": idx, "score": round(score, 4),
+                 "pages": chunk_pages(by_id[document_id]["index"].chunks, idx)}
+                for document_id, idx, score in hits if (document_id, idx) in used
+            ],
+        }
+    except HTTPException as http_exc:
+        logger.warning(f"HTTPException while asking across {scope}: {http_exc.detail}")
+        raise http_exc
+    except LLMBusy as busy:
+        logger.warning(f"Gemini is saturated; turning away question across {scope}: {busy}")
+        raise HTTPException(status_code=503, detail="Jo Jo is answering lots of questions right now. Please try again in a moment!",
+                            headers={"Retry-After": str(max(1, int(LLM_QUEUE_TIMEOUT_SECONDS)))})
+    except Exception as e:
+        logger.error(f"Unexpected error while asking across {scope}: '{question_request.question}'", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Yikes! Something went wrong: {str(e)}")
+    finally:
+        admission.release(ticket)
+
+HISTORY_FIELDS = ("id", "filename", "file_path", "text_path", "upload_date", "metadata")
+
+def history_etag(newest: Optional[dict], total: Optional[int], *variant) -> str:
+    """A weak ETag for the history list: newest is the most recently written row, so adding, updating
+    (pages_ready, metadata) or removing a document all change it."""
+    newest_key = f"{newest['id']}@{newest.get('updated_at') or newest['upload_date']}" if newest else "empty"
+    raw = "|".join([newest_key, str(total)] + [str(part) for part in variant])
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+def fetch_all_documents(columns: str) -> List[dict]:
+    """Every documents row, newest first, a PostgREST-sized page at a time."""
+    documents: List[dict] = []
+    while True:
+        page = (supabase.table("documents").select(columns).order("upload_date", desc=True).order("id", desc=True)
+                .range(len(documents), len(documents) + MESSAGES_PAGE_SIZE - 1).execute())
+        rows = page.data or []
+        documents.extend(rows)
+        if len(rows) < MESSAGES_PAGE_SIZE:
+            return documents
 
 @app.get("/api/history", response_model=List[DocumentResponse])
-async def get_history_endpoint(fastapi_req: Request):
-    """Show me all the PDFs we've seen so far!"""
+async def get_history_endpoint(
+    fastapi_req: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Documents per page, newest first (default: all of them)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields to return"),
+):
+    """Show me all the PDFs we've seen so far!
+
+    Without limit or cursor you get the whole list. With them, pages are keyed on (upload_date, id)
+    and the next cursor comes back in X-Next-Cursor. Send the ETag back as If-None-Match and an
+    unchanged history costs one tiny query and a 304.
+    """
     client_host = fastapi_req.client.host if fastapi_req.client else "unknown_client"
     logger.info(f"Received request for document history from {client_host}")
+    selected = list(HISTORY_FIELDS)
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in HISTORY_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown history fields: {', '.join(unknown)}")
+        # id and upload_date are always included – the cursor is built from them
+        selected = [field for field in HISTORY_FIELDS if field in requested or field in ("id", "upload_date")]
     try:
-        response = supabase.table("documents").select("id, filename, file_path, text_path, upload_date, metadata").order("upload_date", desc=True).execute()
-        if response.data:
-            logger.info(f"Fetched {len(response.data)} documents from history.")
-            # Parse metadata from JSON string to dict for each document
-            for doc in response.data:
-                if isinstance(doc.get("metadata"), str):
-                    try:
-                        doc["metadata"] = json.loads(doc["metadata"])
-                    except Exception:
-                        doc["metadata"] = {}
-                # Patch: ensure id is always a string for Pydantic
-                if "id" in doc:
-                    doc["id"] = str(doc["id"])
-            return response.data
+        after = decode_cursor(cursor, ("upload_date", "id")) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="That history cursor doesn't look right.")
+    try:
+        newest_response = supabase.table("documents").select("id, upload_date, updated_at", count="exact").order("updated_at", desc=True, nullsfirst=False).order("id", desc=True).limit(1).execute()
+        newest = newest_response.data[0] if newest_response.data else None
+        etag = history_etag(newest, newest_response.count, limit, cursor, ",".join(selected))
+        cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if fastapi_req.headers.get("if-none-match") == etag:
+            logger.info("Document history unchanged; answering 304.")
+            return Response(status_code=304, headers=cache_headers)
+        if limit is None and after is None:
+            documents = fetch_all_documents(", ".join(selected))
         else:
-            logger.info("No documents found in history. Supabase response indicates no data.")
-            return [] # Return empty list if no documents
+            limit = limit or HISTORY_PAGE_SIZE
+            query = supabase.table("documents").select(", ".join(selected))
+            if after:
+                query = query.or_(keyset_before("upload_date", after["upload_date"], after["id"]))
+            documents = query.order("upload_date", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+        if limit is not None and len(documents) > limit:
+            documents = documents[:limit]
+            cache_headers["X-Next-Cursor"] = encode_cursor({"upload_date": documents[-1]["upload_date"], "id": documents[-1]["id"]})
+        logger.info(f"Fetched {len(documents)} documents from history.")
+        for doc in documents:
+            # Parse metadata from JSON string to dict for each document
+            if isinstance(doc.get("metadata"), str):
+                try:
+                    doc["metadata"] = json.loads(doc["metadata"])
+                except Exception:
+                    doc["metadata"] = {}
+            # Patch: ensure id is always a string for Pydantic
+            if "id" in doc:
+                doc["id"] = str(doc["id"])
+        return JSONResponse(content=documents, headers=cache_headers)
     except Exception as e:
         logger.error("Error fetching document history from Supabase", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Couldn't get your document history: {str(e)}")
 
+def fetch_messages_for_sessions(session_ids: List[int]) -> List[dict]:
+    """All messages for a set of sessions in one round trip per SESSIONS_PER_QUERY sessions (more only if
+    PostgREST's row cap kicks in)."""
+    messages: List[dict] = []
+    for start in range(0, len(session_ids), SESSIONS_PER_QUERY):
+        batch = session_ids[start:start + SESSIONS_PER_QUERY]
+        fetched = 0
+        while True:
+            page = (supabase.table("messages").select("id, session_id, role, content, created_at")
+                    .in_("session_id", batch).order("session_id").order("created_at").order("id")
+                    .range(fetched, fetched + MESSAGES_PAGE_SIZE - 1).execute())
+            rows = page.data or []
+            messages.extend(rows)
+            fetched += len(rows)
+            if len(rows) < MESSAGES_PAGE_SIZE:
+                break
+    return messages
+
+def fetch_all_sessions(document_id: int) -> List[dict]:
+    """Every chat session of a document, newest first, a PostgREST-sized page at a time."""
+    sessions: List[dict] = []
+    while True:
+        page = (supabase.table("chat_sessions").select("id, created_at, document_id").eq("document_id", document_id)
+                .order("created_at", desc=True).order("id", desc=True)
+                .range(len(sessions), len(sessions) + MESSAGES_PAGE_SIZE - 1).execute())
+        rows = page.data or []
+        sessions.extend(rows)
+        if len(rows) < MESSAGES_PAGE_SIZE:
+            return sessions
+
+def fetch_session_page(document_id: int, limit: int, after: Optional[dict]) -> List[dict]:
+    """Up to limit + 1 chat sessions of a document after a decoded cursor, newest first – the extra one says more remain."""
+    query = supabase.table("chat_sessions").select("id, created_at, document_id").eq("document_id", document_id)
+    if after:
+        query = query.or_(keyset_before("created_at", after["created_at"], after["id"]))
+    return query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+
 @app.get("/api/history/{document_id}", response_model=List[ChatSessionResponse])
-async def get_document_specific_history_endpoint(document_id: int, fastapi_req: Request):
-    """Show me all the chats we've had about a specific PDF!"""
+async def get_document_specific_history_endpoint(
+    document_id: int,
+    fastapi_req: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Sessions per page, newest first (default: all of them)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    messages_per_session: Optional[int] = Query(None, ge=1, description="Only return the newest N messages of each session"),
+):
+    """Show me all the chats we've had about a specific PDF!
+
+    Without limit or cursor you get every session (newest first). With them, sessions come a page at
+    a time and, when more remain, the X-Next-Cursor header holds the cursor for the next page. All of
+    a page's messages come back in one query per SESSIONS_PER_QUERY sessions; messages_per_session
+    then keeps only each session's newest N.
+    """
     client_host = fastapi_req.client.host if fastapi_req.client else "unknown_client"
     logger.info(f"Received request for history of document_id: {document_id} from {client_host}")
     try:
-        doc_check = supabase.table("documents").select("id, filename").eq("id", document_id).maybe_single().execute()
-        if not doc_check.data:
+        after = decode_cursor(cursor, ("created_at", "id")) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="That history cursor doesn't look right.")
+    try:
+        doc_check = await run_io(lambda: supabase.table("documents").select("id, filename").eq("id", document_id).maybe_single().execute())
+        if not doc_check or not doc_check.data:
             logger.warning(f"Document with id {document_id} not found for history retrieval.")
             raise HTTPException(status_code=404, detail=f"Sorry, I couldn't find that document!")
         original_filename = doc_check.data.get("filename", f"DocumentID_{document_id}")
         logger.info(f"Found document '{original_filename}' for history retrieval.")
-        sessions_response = supabase.table("chat_sessions").select("id, created_at, document_id").eq("document_id", document_id).order("created_at", desc=True).execute()
-        if not sessions_response.data:
+        if limit is None and after is None:
+            sessions = await run_io(fetch_all_sessions, document_id)
+        else:
+            limit = limit or SESSIONS_PAGE_SIZE
+            sessions = await run_io(fetch_session_page, document_id, limit, after)
+        if not sessions:
             logger.info(f"No chat sessions found for document '{original_filename}' (id: {document_id}).")
             return []
-        chat_sessions_with_messages = []
-        for session in sessions_response.data:
-            logger.debug(f"Fetching messages for session {session['id']} of document '{original_filename}'.")
-            messages_response = supabase.table("messages").select("id, session_id, role, content, created_at").eq("session_id", session['id']).order("created_at", desc=False).execute()
-            messages_data = messages_response.data if messages_response.data else []
-            logger.debug(f"Fetched {len(messages_data)} messages for session {session['id']}.")
-            session_data = ChatSessionResponse(
+        if limit is not None and len(sessions) > limit:
+            sessions = sessions[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor({"created_at": sessions[-1]["created_at"], "id": sessions[-1]["id"]})
+        # Answers given moments ago may still be sitting in the write-behind buffer
+        await message_writer.flush()
+        messages = await run_io(fetch_messages_for_sessions, [session["id"] for session in sessions])
+        messages_by_session = group_messages_by_session(messages, messages_per_session)
+        chat_sessions_with_messages = [
+            ChatSessionResponse(
                 id=session['id'],
                 document_id=session['document_id'],
                 created_at=session['created_at'],
-                messages=messages_data
+                messages=messages_by_session.get(session['id'], [])
             )
-            chat_sessions_with_messages.append(session_data)
+            for session in sessions
+        ]
         logger.info(f"Fetched {len(chat_sessions_with_messages)} chat sessions with messages for document '{original_filename}' (id: {document_id}).")
         return chat_sessions_with_messages
     except HTTPException as http_exc:
@@ -355,27 +1247,84 @@ async def clear_all_data_endpoint(secret: str = "admin123"):  # Simple secret fo
         raise HTTPException(status_code=403, detail="Forbidden")
     # Use supabase_admin for full delete rights
     admin = supabase_admin if supabase_admin else supabase
+    # Land any queued messages now, so they don't try to point at deleted sessions later
+    await message_writer.flush()
+    # Delete cached answers first – they reference documents
+    admin.table("llm_cache").delete().neq("id", -1).execute()
+    answer_cache.clear()
+    document_cache.clear()
+    conversations.clear()
     # Delete all messages
     admin.table("messages").delete().neq("id", -1).execute()
     # Delete all chat sessions
     admin.table("chat_sessions").delete().neq("id", -1).execute()
     # Delete all documents
     admin.table("documents").delete().neq("id", -1).execute()
-    # Remove all files from uploads and texts
-    for folder in [UPLOAD_DIR, TEXT_DIR]:
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass
-    return {"status": "success", "message": "All data cleared. Fresh start!"}
+    # Remove all files from uploads and texts, then every vector folder
+    paths = [os.path.join(folder, filename) for folder in (UPLOAD_DIR, TEXT_DIR) for filename in os.listdir(folder)]
+    files_removed, bytes_freed, failed = await run_io(remove_paths, paths)
+    for key in vector_store.keys():
+        vector_store.delete(key)
+    if failed:
+        logger.warning(f"(Jo Jo) clear-all left {len(failed)} file(s) behind; storage GC will retry them: {failed[:10]}")
+    return {"status": "success", "message": "All data cleared. Fresh start!", "files_removed": files_removed,
+            "bytes_freed": bytes_freed, "failed": len(failed)}
+
+@app.delete("/api/documents/{document_id}")
+async def delete_document_endpoint(document_id: int, secret: str = Query(..., description="The admin secret")):
+    """Forget one PDF: its chats, cached answers and – unless another upload shares them – its PDF, text, index and vectors."""
+    if secret != "admin123":
+        raise HTTPException(status_code=403, detail="Forbidden")
+    rows = await run_io(lambda: supabase.table("documents").select("id, file_path, text_path").eq("id", document_id).limit(1).execute().data)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Sorry, I couldn't find that document!")
+    # Land any queued messages now, so they don't try to point at deleted sessions later
+    await message_writer.flush()
+    try:
+        result = await storage_gc.delete_documents(rows)
+    except Exception as e:
+        logger.error(f"Error deleting document {document_id}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Couldn't delete this document: {str(e)}")
+    logger.info(f"(Jo Jo) Deleted document {document_id}: {result['files_removed']} file(s), {result['bytes_freed']} bytes freed.")
+    return {"status": "success", "document_id": document_id, "files_removed": result["files_removed"],
+            "bytes_freed": result["bytes_freed"], "failed": len(result["failed"])}
+
+@app.post("/api/admin/gc")
+async def storage_gc_endpoint(secret: str = "admin123"):
+    """Run a storage GC pass now instead of waiting for the next one."""
+    if secret != "admin123":
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await storage_gc.run_once()
+
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    """How much work our caches are saving us."""
+    return {"answers": answer_cache.stats(), "llm": llm_gateway.stats(), "write_behind": message_writer.stats(),
+            "documents": document_cache.stats(),
+            "ingestion": ingestion_jobs.stats(), "conversations": conversations.stats(),
+            "admission": admission.stats(), "storage": storage_gc.stats()}
 
 @app.get("/api/health")
 def health():
     """Legacy health check. Just says 'ok'."""
     return {"status": "ok"}
 
+@app.get("/api/metrics")
+async def metrics_endpoint():
+    """Where the time goes: per-stage histograms, request counters and gauges in Prometheus text format."""
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+# Live gauges, read at scrape time
+REGISTRY.gauge("jojo_llm_in_flight", "Gemini calls running right now.", read=lambda: llm_gateway.active)
+REGISTRY.gauge("jojo_llm_waiting", "Requests queued for a Gemini slot.", read=lambda: llm_gateway.waiting)
+REGISTRY.gauge("jojo_admission_in_flight", "Questions admitted and not yet answered.", read=lambda: admission.in_flight)
+REGISTRY.gauge("jojo_ingestion_jobs_running", "Ingestion jobs running right now.", read=lambda: ingestion_jobs.stats()["running"])
+REGISTRY.gauge("jojo_ingestion_jobs_queued", "Ingestion jobs waiting for a slot.", read=lambda: ingestion_jobs.stats()["queued"])
+REGISTRY.gauge("jojo_write_behind_buffered", "Chat messages waiting to be written.", read=lambda: message_writer.stats()["buffered"])
+REGISTRY.gauge("jojo_document_cache_bytes", "Bytes held by the document cache.", read=lambda: document_cache.bytes)
+
+app.add_middleware(MetricsMiddleware)
+
 # CORS setup – let the frontend talk to us!
 app.add_middleware(
     CORSMiddleware,
@@ -383,4 +1332,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Retry-After"],  # Paging, caching and back-off headers the frontend needs to read
 )
+
+startup_report.mark("setup")
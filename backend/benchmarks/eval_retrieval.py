@@ -0,0 +1,240 @@
+# Jo Jo's exam hall – offline retrieval evaluation: recall@k next to query latency for each ranking pipeline. 📝
+#
+# Usage (from backend/):
+#   python benchmarks/eval_retrieval.py
+#   python benchmarks/eval_retrieval.py --k 3,6,10 --mmr-weights 0.5,0.7,0.9 --candidates 50
+#   python benchmarks/eval_retrieval.py --dataset questions.jsonl --embedder gemini
+#
+# Without --dataset a synthetic field manual is generated: settings planted on random pages among
+# look-alike sentences, asked about directly, in other words, and two at a time. A dataset is JSON
+# lines of {"document": "path/to.pdf", "question": "...", "answers": ["text a chunk must contain", ...]}
+# (.pdf, .pages and .txt documents work). Recall@k is the share of a question's answers found in its
+# top k chunks, averaged over questions. Latency covers everything a question costs at query time:
+# embedding it, both rankings, fusion and the rerank. Chunking and the fusion/rerank defaults come
+# from config.py. Results are written as JSON so runs can be compared.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+# config.py insists on Supabase settings; nothing here talks to Supabase, so placeholders will do
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "retrieval-eval")
+
+from benchmarks.run_benchmarks import git_commit, percentile
+
+PIPELINES = ("bm25", "semantic", "hybrid", "bm25_mmr", "hybrid_mmr")
+SITES = ["Harbor", "Quarry", "Summit", "Delta", "Prairie", "Canyon", "Glacier", "Lagoon", "Mesa", "Orchard", "Tundra", "Willow"]
+COMPONENTS = ["intake valve", "relief valve", "coolant pump", "drive belt", "pressure gauge", "air filter", "fuel line",
+              "backup battery", "exhaust fan", "water heater", "signal relay", "brake caliper"]
+UNITS = ["kPa", "rpm", "volts", "litres", "degrees", "amps"]
+FILLER = [
+    "Crews at the {site} station inspect the {component} before every shift.",
+    "The {site} logbook records every visit to the station and who signed it out.",
+    "Report any noise from the {component} to the supervisor on duty.",
+    "Spare parts for the {component} are stocked in the central depot.",
+    "Safety glasses are required at all stations, including {site}.",
+    "The {component} manual lists the tools needed for routine service.",
+    "Access roads to {site} close during heavy snow.",
+    "Replace the gasket whenever the {component} cover is opened.",
+]
+GENERIC = [
+    "Wear gloves and eye protection when working on pressurised equipment.",
+    "Log the time and your initials after every inspection.",
+    "Isolate electrical supplies before removing any cover.",
+    "Check torque values against the table at the back of this manual.",
+    "Dispose of used fluids in the marked containers only.",
+    "Two people must be present for any work at height.",
+    "Keep walkways clear of hoses, cables and tools.",
+    "Calibrate hand tools every six months.",
+]
+
+def recall_at(ranked_texts: Sequence[str], answers: Sequence[str], k: int) -> float:
+    """Share of the answers that appear in at least one of the first k texts (case-insensitive)."""
+    if not answers:
+        return 0.0
+    top = [text.lower() for text in ranked_texts[:k]]
+    return sum(any(answer.lower() in text for text in top) for answer in answers) / len(answers)
+
+def synthetic_dataset(pages: int, questions: int, seed: int) -> tuple:
+    """(document text, questions) for a made-up field manual. Each question is {"question", "answers"}."""
+    rng = random.Random(seed)
+    facts = {}
+    for site in SITES:
+        for component in COMPONENTS:
+            facts[(site, component)] = f"{rng.randint(100, 999)}.{rng.randint(0, 9)} {rng.choice(UNITS)}"
+    page_lines = []
+    for page in range(pages):
+        lines = ["Northwind Field Manual - Revision 7", f"Section {page + 1}"]
+        for _ in range(14):
+            template = rng.choice(FILLER) if rng.random() < 0.35 else rng.choice(GENERIC)
+            lines.append(template.format(site=rng.choice(SITES), component=rng.choice(COMPONENTS)))
+        page_lines.append(lines)
+    planted = rng.sample(sorted(facts), min(len(facts), questions * 2))
+    for site, component in planted:
+        lines = page_lines[rng.randrange(pages)]
+        lines.insert(rng.randrange(2, len(lines) + 1), f"At the {site} station the {component} is set to {facts[(site, component)]}.")
+    text = "\f".join("\n".join(lines) for lines in page_lines)
+    asked = []
+    for n in range(questions):
+        site, component = planted[n]
+        kind = n % 3
+        if kind == 0:
+            asked.append({"question": f"What is the {component} set to at the {site} station?", "answers": [facts[(site, component)]]})
+        elif kind == 1:
+            asked.append({"question": f"Which value does {site} use for its {component}?", "answers": [facts[(site, component)]]})
+        else:
+            other = next(((s, c) for s, c in planted if s == site and c != component), None) or planted[-1 - n]
+            where = site if other[0] == site else f"{site} and {other[0]}"
+            asked.append({"question": f"What are the {component} and {other[1]} settings at {where}?",
+                          "answers": [facts[(site, component)], facts[other]]})
+    return text, asked
+
+def load_document_text(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        from extraction import extract_text_from_pdf_file
+        return extract_text_from_pdf_file(path, os.path.basename(path))
+    from page_store import open_text
+    return open_text(path).text()
+
+def load_dataset(path: str) -> Dict[str, List[dict]]:
+    """Questions from a JSON lines file, grouped by document path (relative paths are from the file's folder)."""
+    grouped: Dict[str, List[dict]] = {}
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8") as dataset_file:
+        for line in dataset_file:
+            if line.strip():
+                row = json.loads(line)
+                document = row["document"] if os.path.isabs(row["document"]) else os.path.join(base, row["document"])
+                grouped.setdefault(document, []).append({"question": row["question"], "answers": list(row["answers"])})
+    return grouped
+
+def evaluate(documents: Dict[str, tuple], embedder, args) -> List[dict]:
+    """Run every pipeline over every question. documents maps a name to (text, questions)."""
+    from retrieval import build_index, hybrid_rank
+    from vector_store import top_k_cosine
+    prepared = []
+    for name, (text, questions) in documents.items():
+        started = time.perf_counter()
+        index = build_index(text, args.chunk_size, args.chunk_overlap)
+        index_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        vectors = embedder.embed(list(index.chunks))
+        embed_seconds = time.perf_counter() - started
+        print(f"  {name}: {len(index.chunks)} chunks, indexed in {index_seconds:.2f}s, embedded in {embed_seconds:.2f}s, {len(questions)} questions")
+        prepared.append((index, vectors, questions))
+
+    def rank(pipeline: str, weight: float, index, vectors, question: str) -> List[int]:
+        semantic = None
+        if pipeline.startswith(("semantic", "hybrid")):
+            query_vector = embedder.embed([question], is_query=True)
+            semantic = [idx for idx, _ in top_k_cosine(vectors, query_vector, args.candidates)[0]]
+        return hybrid_rank(index, question, max(args.k), semantic=semantic,
+                           chunk_vectors=vectors if pipeline.startswith("hybrid") else None, lexical=pipeline != "semantic",
+                           candidates=args.candidates, rrf_k=args.rrf_k, mmr_weight=weight if pipeline.endswith("_mmr") else 1.0)
+
+    runs = [(pipeline, weight) for pipeline in args.pipelines for weight in (args.mmr_weights if pipeline.endswith("_mmr") else [1.0])]
+    results = []
+    for pipeline, weight in runs:
+        recalls = {k: [] for k in args.k}
+        latencies = []
+        for index, vectors, questions in prepared:
+            for question in questions[:3]:
+                rank(pipeline, weight, index, vectors, question["question"])  # Warm up term arrays and caches
+            for question in questions:
+                started = time.perf_counter()
+                ranked = rank(pipeline, weight, index, vectors, question["question"])
+                latencies.append(time.perf_counter() - started)
+                texts = [index.chunks[idx] for idx in ranked]
+                for k in args.k:
+                    recalls[k].append(recall_at(texts, question["answers"], k))
+        ordered = sorted(latencies)
+        row = {
+            "pipeline": pipeline if weight >= 1.0 else f"{pipeline}@{weight:g}",
+            "questions": len(latencies),
+            **{f"recall@{k}": round(sum(values) / len(values), 4) if values else 0.0 for k, values in recalls.items()},
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        }
+        results.append(row)
+        print(f"  {row['pipeline']:<16} " + " ".join(f"recall@{k}={row[f'recall@{k}']:.3f}" for k in args.k)
+              + f" p50={row['p50_ms']}ms p95={row['p95_ms']}ms")
+    return results
+
+def print_table(results: List[dict], ks: List[int]) -> None:
+    print(f"\n{'pipeline':<16} " + " ".join(f"{f'R@{k}':>7}" for k in ks) + f" {'p50 ms':>9} {'p95 ms':>9}")
+    for row in results:
+        print(f"{row['pipeline']:<16} " + " ".join(f"{row[f'recall@{k}']:>7.3f}" for k in ks) + f" {row['p50_ms']:>9} {row['p95_ms']:>9}")
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+def float_list(value: str) -> List[float]:
+    return [float(part) for part in value.split(",") if part.strip()]
+
+def parse_args(argv=None):
+    import config
+    parser = argparse.ArgumentParser(description="Offline recall@k and query latency for Jo Jo's retrieval pipelines.")
+    parser.add_argument("--pipelines", type=lambda v: [s.strip() for s in v.split(",") if s.strip()], default=list(PIPELINES),
+                        help=f"Comma-separated subset of: {', '.join(PIPELINES)}")
+    parser.add_argument("--k", type=int_list, default=[1, 3, config.RETRIEVAL_TOP_K], help="Comma-separated cutoffs for recall@k")
+    parser.add_argument("--dataset", default=None, help="JSON lines of questions about your own documents (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=150, help="Pages in the synthetic manual")
+    parser.add_argument("--questions", type=int, default=60, help="Questions about the synthetic manual")
+    parser.add_argument("--embedder", default="hashing", help="Embedder for the semantic side: hashing (offline) or gemini")
+    parser.add_argument("--chunk-size", type=int, default=config.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=config.CHUNK_OVERLAP)
+    parser.add_argument("--candidates", type=int, default=config.RETRIEVAL_CANDIDATES, help="Chunks each ranking contributes to fusion")
+    parser.add_argument("--rrf-k", type=int, default=config.RETRIEVAL_RRF_K)
+    parser.add_argument("--mmr-weights", type=float_list, default=[config.RETRIEVAL_MMR_WEIGHT], help="Comma-separated MMR weights to try")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Where to write the JSON results (default: benchmarks/results/retrieval-<timestamp>.json)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.pipelines if name not in PIPELINES]
+    if unknown:
+        parser.error(f"Unknown pipelines: {', '.join(unknown)}")
+    args.k = sorted(set(args.k))
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
+    import config
+    from vector_store import get_embedder
+    started_at = datetime.now(timezone.utc)
+    embedder = get_embedder(args.embedder, config.EMBEDDING_MODEL, api_key=config.GOOGLE_API_KEY)
+    if args.dataset:
+        documents = {path: (load_document_text(path), questions) for path, questions in load_dataset(args.dataset).items()}
+    else:
+        documents = {"synthetic manual": synthetic_dataset(args.pages, args.questions, args.seed)}
+    print(f"(Jo Jo) Evaluating {', '.join(args.pipelines)} with the {embedder.name} embedder")
+    results = evaluate(documents, embedder, args)
+    print_table(results, args.k)
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"retrieval-{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    report = {
+        "started_at": started_at.isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "embedder": embedder.name,
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"\nResults written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
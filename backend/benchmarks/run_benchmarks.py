@@ -0,0 +1,285 @@
+# Jo Jo's racetrack – drives the real FastAPI app against in-memory Supabase and Gemini stand-ins. 🏁
+#
+# Usage (from backend/):
+#   python benchmarks/run_benchmarks.py --concurrency 1,8,32 --requests 200 --llm-latency 0.5
+#   python benchmarks/run_benchmarks.py --scenarios ask --compare benchmarks/results/previous.json
+#
+# Nothing here talks to the network: Supabase is tests/fake_supabase.py (with optional per-call
+# latency) and Gemini is tests/fake_llm.py. Results are written as JSON so runs can be compared.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCENARIOS = ("upload", "ask", "ask_cached", "ask_multi", "history", "history_document")
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list (pct between 0 and 100)."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def summarize(scenario: str, concurrency: int, latencies: List[float], errors: int, wall_seconds: float) -> dict:
+    ordered = sorted(latencies)
+    completed = len(ordered)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": completed + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / completed * 1000, 2) if completed else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "throughput_rps": round(completed / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+    }
+
+async def drive(total: int, concurrency: int, send: Callable[[int], Awaitable[bool]]) -> tuple:
+    """Fire `total` requests from `concurrency` workers; returns (latencies, errors, wall seconds)."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for n in counter:
+            started = time.perf_counter()
+            ok = await send(n)
+            elapsed = time.perf_counter() - started
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return latencies, errors, time.perf_counter() - began
+
+def synthetic_pages(page_count: int, seed: str) -> List[str]:
+    """Plausible-looking manual pages; `seed` makes every generated document unique."""
+    topics = ["warranty", "battery", "reset", "shipping", "returns", "firmware", "cleaning", "safety"]
+    pages = []
+    for page in range(page_count):
+        topic = topics[page % len(topics)]
+        lines = [f"Document {seed} - section {page + 1}: {topic}"]
+        lines += [f"The {topic} policy line {line} explains step {line} for model {seed}-{page}." for line in range(30)]
+        pages.append("\n".join(lines))
+    return pages
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(results: List[dict], baseline_path: str) -> None:
+    """Print how p50, p95 and throughput moved against an earlier results file."""
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        baseline = {(row["scenario"], row["concurrency"]): row for row in json.load(baseline_file)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for row in results:
+        old = baseline.get((row["scenario"], row["concurrency"]))
+        if old is None:
+            continue
+        def change(key):
+            return f"{(row[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        print(f"  {row['scenario']:<18} c={row['concurrency']:<4} p50 {change('p50_ms'):>8}  p95 {change('p95_ms'):>8}  throughput {change('throughput_rps'):>8}")
+
+def print_table(results: List[dict]) -> None:
+    print(f"\n{'scenario':<18} {'conc':>5} {'reqs':>6} {'errs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>9}")
+    for row in results:
+        print(f"{row['scenario']:<18} {row['concurrency']:>5} {row['requests']:>6} {row['errors']:>5} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['throughput_rps']:>9}")
+
+def prepare_environment(workdir: str) -> None:
+    """Point every setting at throwaway folders and make sure nothing reaches a real service."""
+    os.environ["SUPABASE_URL"] = "http://fake-supabase.local"
+    os.environ["SUPABASE_ANON_KEY"] = "benchmark"
+    os.environ["SUPABASE_SERVICE_ROLE_KEY"] = ""
+    os.environ["GOOGLE_API_KEY"] = ""  # Set (even if empty) so .env can't switch real Gemini on
+    os.environ["EMBEDDER"] = "hashing"
+    for name in ("UPLOAD_DIR", "TEXT_DIR", "VECTOR_DB_DIR"):
+        os.environ[name] = os.path.join(workdir, name.lower())
+    os.environ["WRITE_BEHIND_SPILL_PATH"] = os.path.join(workdir, "write_behind.spill.db")
+    # Every simulated client shares 127.0.0.1 – measure the pipeline, not the rate limits
+    os.environ["ADMISSION_IP_RATE"] = "0"
+    os.environ["ADMISSION_USER_RATE"] = "0"
+    os.environ["ADMISSION_MAX_IN_FLIGHT"] = "1000000"
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, os.path.join(BACKEND_DIR, "tests"))
+
+async def run(args) -> List[dict]:
+    import httpx
+    import supabase as supabase_package
+    from fake_llm import FakeLLM
+    from fake_supabase import FakeSupabase
+    from pdf_factory import make_pdf
+
+    fake_db = FakeSupabase(latency=args.supabase_latency)
+    supabase_package.create_client = lambda *unused, **also_unused: fake_db
+    import api.index as app_module
+    if not args.verbose:
+        for name in ("uvicorn.error", "httpx", ""):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    app_module.llm = FakeLLM(latency=args.llm_latency)
+    app = app_module.app
+    results: List[dict] = []
+    rng = random.Random(args.seed)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+
+            async def upload(name: str, pdf: bytes) -> Optional[dict]:
+                response = await client.post("/api/upload?wait=true", files=[("files", (name, pdf, "application/pdf"))])
+                body = response.json() if response.status_code == 200 else None
+                return body[0] if body and "document_id" in body[0] else None
+
+            async def record(scenario: str, concurrency: int, total: int, send) -> None:
+                latencies, errors, wall = await drive(total, concurrency, send)
+                row = summarize(scenario, concurrency, latencies, errors, wall)
+                results.append(row)
+                print(f"  {scenario:<18} c={concurrency:<4} p50={row['p50_ms']}ms p95={row['p95_ms']}ms rps={row['throughput_rps']} errors={errors}")
+
+            wanted = args.scenarios
+            if "upload" in wanted:
+                for pages in args.pages:
+                    for concurrency in args.concurrency:
+                        total = max(concurrency, args.upload_requests)
+                        pdfs = [make_pdf(synthetic_pages(pages, f"u{pages}-{concurrency}-{n}")) for n in range(total)]
+
+                        async def send_upload(n, pdfs=pdfs, pages=pages):
+                            return await upload(f"bench-{pages}p-{n}.pdf", pdfs[n]) is not None
+                        await record(f"upload_{pages}p", concurrency, total, send_upload)
+
+            documents = []
+            if {"ask", "ask_cached", "ask_multi", "history_document"} & set(wanted):
+                for n in range(args.documents):
+                    uploaded = await upload(f"ask-{n}.pdf", make_pdf(synthetic_pages(args.ask_pages, f"ask{n}")))
+                    if uploaded:
+                        documents.append(uploaded["document_id"])
+
+            if "ask" in wanted and documents:
+                for concurrency in args.concurrency:
+                    async def send_ask(n, concurrency=concurrency):
+                        question = f"What does the warranty policy say about step {n} (run c{concurrency})?"
+                        response = await client.post("/api/ask", json={"document_id": rng.choice(documents), "question": question})
+                        return response.status_code == 200
+                    await record("ask", concurrency, args.requests, send_ask)
+
+            if "ask_cached" in wanted and documents:
+                await client.post("/api/ask", json={"document_id": documents[0], "question": "How do I reset it?"})
+                for concurrency in args.concurrency:
+                    async def send_cached(n):
+                        response = await client.post("/api/ask", json={"document_id": documents[0], "question": "How do I reset it?"})
+                        return response.status_code == 200 and response.json().get("cached")
+                    await record("ask_cached", concurrency, args.requests, send_cached)
+
+            if "ask_multi" in wanted and documents:
+                # Across every uploaded document – rerun with a bigger --documents to check latency stays flat
+                for concurrency in args.concurrency:
+                    async def send_multi(n, concurrency=concurrency):
+                        question = f"Which documents cover battery safety for step {n} (run c{concurrency})?"
+                        response = await client.post("/api/ask/multi", json={"question": question})
+                        return response.status_code == 200 and bool(response.json().get("sources"))
+                    await record("ask_multi", concurrency, args.requests, send_multi)
+
+            if "history" in wanted:
+                stamp = datetime.now(timezone.utc)
+                fake_db.tables["documents"].extend({
+                    "id": 1_000_000 + n, "filename": f"seeded-{n}.pdf", "file_path": "", "text_path": "",
+                    "upload_date": stamp.replace(microsecond=n % 1_000_000).isoformat(), "metadata": "{}",
+                } for n in range(args.history_documents))
+                for concurrency in args.concurrency:
+                    async def send_history(n):
+                        response = await client.get("/api/history", params={"limit": 100})
+                        return response.status_code == 200
+                    await record("history", concurrency, args.requests, send_history)
+
+            if "history_document" in wanted and documents:
+                target = documents[0]
+                for session in range(args.sessions):
+                    session_id = fake_db.table("chat_sessions").insert({"document_id": target}).execute().data[0]["id"]
+                    fake_db.table("messages").insert([
+                        {"session_id": session_id, "role": "user" if m % 2 == 0 else "assistant", "content": f"message {m}"}
+                        for m in range(args.messages_per_session)
+                    ]).execute()
+                for concurrency in args.concurrency:
+                    async def send_document_history(n):
+                        response = await client.get(f"/api/history/{target}", params={"limit": 20})
+                        return response.status_code == 200
+                    await record("history_document", concurrency, args.requests, send_document_history)
+    return results
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline latency and throughput benchmarks for the Jo Jo backend.")
+    parser.add_argument("--scenarios", type=lambda v: [s.strip() for s in v.split(",") if s.strip()], default=list(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32], help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per ask/history run")
+    parser.add_argument("--upload-requests", type=int, default=16, help="Uploads per upload run")
+    parser.add_argument("--pages", type=int_list, default=[1, 10, 50], help="Comma-separated page counts for upload runs")
+    parser.add_argument("--documents", type=int, default=5, help="Documents uploaded for the ask scenarios")
+    parser.add_argument("--ask-pages", type=int, default=20, help="Pages per document for the ask scenarios")
+    parser.add_argument("--history-documents", type=int, default=500, help="Documents seeded for /api/history")
+    parser.add_argument("--sessions", type=int, default=50, help="Chat sessions seeded for /api/history/{id}")
+    parser.add_argument("--messages-per-session", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds the fake Gemini takes per answer")
+    parser.add_argument("--supabase-latency", type=float, default=0.0, help="Seconds added to every fake Supabase call")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Where to write the JSON results (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="An earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    started_at = datetime.now(timezone.utc)
+    with tempfile.TemporaryDirectory(prefix="jojo-bench-") as workdir:
+        prepare_environment(workdir)
+        print(f"(Jo Jo) Benchmarking {', '.join(args.scenarios)} at concurrency {args.concurrency}")
+        results = asyncio.run(run(args))
+    print_table(results)
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    report = {
+        "started_at": started_at.isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "verbose")},
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
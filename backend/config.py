@@ -1,8 +1,12 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import logging
 import sys
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Configure logging
 logging.basicConfig(
@@ -30,23 +34,34 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
     logger.error("CRITICAL: Missing Supabase URL or Anon Key. Application cannot start.")
     raise ValueError("Missing Supabase environment variables. Check .env file and loading.")
 
-try:
-    # Initialize Supabase client (anon)
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    # Initialize Supabase admin client (service role)
-    supabase_admin: Client = None
-    if SUPABASE_SERVICE_ROLE_KEY:
-        supabase_admin = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-    # Test connection
-    response = supabase.table("documents").select("id").limit(1).execute()
-    logger.info("Supabase client initialized and connection tested successfully.")
-    if supabase_admin:
-        logger.info("Supabase admin client initialized successfully.")
-    else:
-        logger.warning("Supabase admin client not initialized. Admin endpoints may not work.")
-except Exception as e:
-    logger.error(f"Failed to initialize Supabase client: {str(e)}", exc_info=True)
-    raise
+# Supabase clients are created on first use and shared. Nothing here touches the network, so cold
+# starts stay quick and a Supabase outage can't break the import – the health prober checks
+# connectivity in the background instead.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _client(kind: str, key: str):
+    with _clients_lock:
+        client = _clients.get(kind)
+        if client is None:
+            from supabase import create_client  # Deferred: the package is slow to import
+            client = create_client(SUPABASE_URL, key)
+            _clients[kind] = client
+            logger.info(f"Supabase {kind} client initialized.")
+        return client
+
+def get_supabase() -> "Client":
+    """The shared Supabase client (anon key)."""
+    return _client("anon", SUPABASE_ANON_KEY)
+
+def get_supabase_admin() -> Optional["Client"]:
+    """The shared service-role client, or None when no service key is configured."""
+    if not SUPABASE_SERVICE_ROLE_KEY:
+        return None
+    return _client("admin", SUPABASE_SERVICE_ROLE_KEY)
+
+if not SUPABASE_SERVICE_ROLE_KEY:
+    logger.warning("Supabase service role key not set. Admin endpoints will use the anon client.")
 
 # Google API Configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -60,10 +75,49 @@ API_HOST = os.getenv("API_HOST", "0.0.0.0")
 # Model Configuration
 GEMINI_MODEL = "gemini-1.5-flash"
 MODEL_TEMPERATURE = 0.7
+# Bump whenever the Q&A prompt or retrieval changes, so cached answers from the old one stop being served
+PROMPT_VERSION = "3"
+
+# LLM Call Limits (concurrent Gemini calls per worker, and how long a request may wait for a slot)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Answer Cache Configuration (in-process LRU in front of the llm_cache table)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_TABLE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TABLE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Document Cache Configuration (per-worker metadata and retrieval indexes for hot documents)
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+DOCUMENT_CACHE_TTL_SECONDS = int(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "300"))
+
+# Write-Behind Configuration (chat messages are batched and saved after the answer goes out)
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "0.5"))
+# Rows Supabase refused even after retries wait here and are replayed later
+WRITE_BEHIND_SPILL_PATH = os.getenv("WRITE_BEHIND_SPILL_PATH", os.path.join(os.path.dirname(__file__), "write_behind.spill.db"))
+
+# Worker Pool Configuration (PDF extraction runs in processes, file I/O in threads)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+# Files ingested at once per worker (each one still fans its pages out to the extraction pool)
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "4"))
+# Split big PDFs into page ranges extracted in parallel and streamed to disk in order
+PARALLEL_EXTRACTION = os.getenv("PARALLEL_EXTRACTION", "true").lower() == "true"
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", "8"))
+# Long PDFs become answerable from their first pages while the rest are extracted (needs PARALLEL_EXTRACTION)
+PROGRESSIVE_INGESTION = os.getenv("PROGRESSIVE_INGESTION", "true").lower() == "true"
+PROGRESSIVE_MIN_PAGES = int(os.getenv("PROGRESSIVE_MIN_PAGES", "32"))
+PROGRESSIVE_FIRST_PAGES = int(os.getenv("PROGRESSIVE_FIRST_PAGES", str(PAGES_PER_TASK)))
+PROGRESSIVE_GROWTH = float(os.getenv("PROGRESSIVE_GROWTH", "2.0"))
+
+# Upload Configuration (uploads are streamed to disk in chunks and rejected once past the limit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
 
 # Directory Configuration
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
-TEXT_DIR = os.path.join(os.path.dirname(__file__), "texts")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "uploads"))
+TEXT_DIR = os.getenv("TEXT_DIR", os.path.join(os.path.dirname(__file__), "texts"))
 
 # Ensure directories exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -89,4 +143,61 @@ logger.info(f"Text directory: {TEXT_DIR}")
 
 # Chunk Configuration
 CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
\ No newline at end of file
+CHUNK_OVERLAP = 200
+
+# Retrieval Configuration (how much of the document we hand to Gemini per question)
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Candidates each ranking contributes, the reciprocal-rank-fusion constant, and the MMR relevance weight
+# (1.0 turns the diversity rerank off; "bm25" mode never reranks). Tune with benchmarks/eval_retrieval.py
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "30"))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+RETRIEVAL_MMR_WEIGHT = float(os.getenv("RETRIEVAL_MMR_WEIGHT", "0.85"))
+
+# Vector Store Configuration ("hybrid" fuses BM25 with embeddings when a document has them, "semantic" uses
+# embeddings alone when it can, "bm25" never uses them). The offline hashing embedder ranks below BM25 in
+# benchmarks/eval_retrieval.py, so without Gemini embeddings the default is plain BM25
+VECTOR_DB_DIR = os.getenv("VECTOR_DB_DIR", os.path.join(os.path.dirname(__file__), "vector_db"))
+# Documents whose vectors stay memory-mapped at once; cross-document questions touch every one of them
+VECTOR_STORE_MAX_OPEN = int(os.getenv("VECTOR_STORE_MAX_OPEN", "1024"))
+EMBEDDER = os.getenv("EMBEDDER", "gemini" if GOOGLE_API_KEY else "hashing")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "bm25" if EMBEDDER == "hashing" else "hybrid")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+
+# Cross-document Questions (/api/ask/multi: chunks kept across all documents, and how many documents "all" covers)
+MULTI_DOC_TOP_K = int(os.getenv("MULTI_DOC_TOP_K", "8"))
+MULTI_DOC_MAX_DOCUMENTS = int(os.getenv("MULTI_DOC_MAX_DOCUMENTS", "500"))
+
+# Admission Control (checked before any work: questions in flight, per-IP and per-user token buckets, daily quotas)
+# Past this many questions in flight, new ones get a 429 instead of queueing behind Gemini
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(4 * LLM_MAX_CONCURRENCY)))
+# Per-IP limits are off at 0. Behind a proxy or load balancer every request comes from its address, so
+# name the header it puts the client's address in (e.g. X-Forwarded-For) and how many proxies append to it
+ADMISSION_IP_RATE = float(os.getenv("ADMISSION_IP_RATE", "0"))  # Questions per second, refilled
+ADMISSION_IP_BURST = float(os.getenv("ADMISSION_IP_BURST", "20"))
+ADMISSION_FORWARDED_HEADER = os.getenv("ADMISSION_FORWARDED_HEADER", "")
+ADMISSION_TRUSTED_PROXIES = int(os.getenv("ADMISSION_TRUSTED_PROXIES", "1"))
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "0.5"))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "10"))
+# Users are identified by this header (a users.id uuid); without it only the IP limits apply
+ADMISSION_USER_HEADER = os.getenv("ADMISSION_USER_HEADER", "X-User-Id")
+ADMISSION_DEFAULT_DAILY_QUOTA = int(os.getenv("ADMISSION_DEFAULT_DAILY_QUOTA", "100"))
+ADMISSION_QUOTA_SYNC_SECONDS = float(os.getenv("ADMISSION_QUOTA_SYNC_SECONDS", "10"))
+
+# Storage GC (orphaned files are swept in batches; retention by age or total bytes is off at 0)
+STORAGE_GC_INTERVAL_SECONDS = float(os.getenv("STORAGE_GC_INTERVAL_SECONDS", "3600"))
+# Unreferenced files younger than this may belong to an upload that's still being ingested
+STORAGE_GC_MIN_ORPHAN_AGE_SECONDS = float(os.getenv("STORAGE_GC_MIN_ORPHAN_AGE_SECONDS", "3600"))
+STORAGE_GC_BATCH_SIZE = int(os.getenv("STORAGE_GC_BATCH_SIZE", "100"))
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MAX_BYTES = int(os.getenv("RETENTION_MAX_BYTES", "0"))  # Uploads, texts and vectors together
+
+# Conversations (follow-up questions carry this many recent turns word for word, plus a bounded summary of older ones)
+CONVERSATION_WINDOW_TURNS = int(os.getenv("CONVERSATION_WINDOW_TURNS", "4"))
+CONVERSATION_SUMMARY_MAX_CHARS = int(os.getenv("CONVERSATION_SUMMARY_MAX_CHARS", "1500"))
+CONVERSATION_TURN_MAX_CHARS = int(os.getenv("CONVERSATION_TURN_MAX_CHARS", "800"))
+CONVERSATION_CACHE_SESSIONS = int(os.getenv("CONVERSATION_CACHE_SESSIONS", "1024"))
+
+# Health Check Configuration (dependencies are probed in the background; /api/health reads the results)
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "30"))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
@@ -0,0 +1,139 @@
+# Jo Jo's context tidy-up – running headers, footers and page numbers out, whitespace squeezed, budget kept. ✂️
+
+import re
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+PAGE_SEPARATOR = "\f"  # Same convention as extraction.py
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"[ \t\r\v\f\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_WORDS = re.compile(r"[^\W\d_]+")
+# Numbers are only ignored in lines with a few words at most – "Page 3 of 40", "Chapter 3", not body sentences
+MAX_NUMBERED_LINE_WORDS = 3
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count – Gemini averages about four characters per token for English."""
+    return (len(text) + 3) // 4
+
+def line_key(line: str) -> str:
+    """Normalise a line so 'Page 3 of 40' and 'Page 4 of 40' count as the same boilerplate."""
+    key = _SPACES.sub(" ", line.strip().lower())
+    return _DIGITS.sub("#", key) if len(_WORDS.findall(key)) <= MAX_NUMBERED_LINE_WORDS else key
+
+def find_boilerplate(text: str, edge_lines: int = 3, min_pages: int = 3, min_share: float = 0.5) -> List[str]:
+    """Line keys that show up at the top or bottom of most pages – running headers, footers and page numbers.
+
+    Only the first and last edge_lines non-empty lines of each page are considered, so a phrase that
+    merely repeats in the body is left alone. A key must appear on at least min_pages pages and on
+    at least min_share of them.
+    """
+    pages = text.split(PAGE_SEPARATOR)
+    if len(pages) < min_pages:
+        return []
+    seen = Counter()
+    for page in pages:
+        lines = [line for line in page.splitlines() if line.strip()]
+        edges = lines[:edge_lines] + lines[-edge_lines:] if len(lines) > 2 * edge_lines else lines
+        seen.update({line_key(line) for line in edges})
+    threshold = max(min_pages, min_share * len(pages))
+    return sorted(key for key, count in seen.items() if count >= threshold and key)
+
+def collapse_whitespace(text: str) -> str:
+    """Squeeze runs of spaces into one, trim every line and keep at most one blank line in a row."""
+    lines = [_SPACES.sub(" ", line).strip() for line in text.replace(PAGE_SEPARATOR, "\n").split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def clean_chunk(chunk: str, boilerplate: Iterable[str] = ()) -> str:
+    """Drop boilerplate lines from a chunk, then collapse its whitespace."""
+    boilerplate = boilerplate if isinstance(boilerplate, (set, frozenset)) else frozenset(boilerplate)
+    if boilerplate:
+        chunk = "\n".join(line for line in chunk.replace(PAGE_SEPARATOR, "\n").split("\n") if line_key(line) not in boilerplate)
+    return collapse_whitespace(chunk)
+
+def _overlap(previous: str, following: str, min_overlap: int = 20) -> int:
+    """Length of the longest suffix of previous that starts following (neighbouring chunks overlap)."""
+    probe = following[:min_overlap]
+    if len(probe) < min_overlap:
+        return 0
+    start = max(0, len(previous) - len(following))
+    position = previous.find(probe, start)
+    while position != -1:
+        if following.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(probe, position + 1)
+    return 0
+
+def _truncate(text: str, token_budget: int) -> str:
+    cut = text[:max(0, token_budget) * 4]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    while cut and estimate_tokens(cut) > token_budget:
+        cut = cut[:-1]
+    return cut.rstrip()
+
+def prepare_context(chunks: Sequence[str], ranked: Sequence[int], token_budget: int, boilerplate: Iterable[str] = ()) -> Tuple[List[str], dict]:
+    """Clean the ranked chunks and keep as many as fit in token_budget.
+
+    Priority is strictly the given rank order; a chunk that doesn't fit is skipped and smaller
+    ones further down may still get in. Chunks that come out empty or identical to an earlier one
+    are dropped. If even the best chunk is over budget it is cut down to size. Kept chunks come
+    back in document order, with neighbours merged so their shared overlap appears only once.
+    Returns (passages, stats), where stats holds the before/after token counts.
+    """
+    sections, stats = prepare_sources({None: (chunks, boilerplate)}, [(None, idx) for idx in ranked], token_budget)
+    return sections.get(None, []), stats
+
+def prepare_sources(sources: Dict[Hashable, Tuple[Sequence[str], Iterable[str]]], ranked: Sequence[Tuple[Hashable, int]],
+                    token_budget: int) -> Tuple[Dict[Hashable, List[str]], dict]:
+    """prepare_context across several documents sharing one budget.
+
+    sources maps a document key to its (chunks, boilerplate); ranked lists (key, chunk id) hits
+    best first. Returns passages per document – documents ordered by their best hit – and stats.
+    """
+    boilerplates = {key: frozenset(boilerplate) for key, (_, boilerplate) in sources.items()}
+    ranked = list(dict.fromkeys(ranked))
+    tokens_raw = sum(estimate_tokens(sources[key][0][idx]) for key, idx in ranked)
+    kept: Dict[Tuple[Hashable, int], str] = {}
+    seen_text = set()
+    used = 0
+    for key, idx in ranked:
+        text = clean_chunk(sources[key][0][idx], boilerplates[key])
+        if not text or text in seen_text:
+            continue
+        seen_text.add(text)
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            if kept:
+                continue
+            text = _truncate(text, token_budget)
+            if not text:
+                continue
+            cost = estimate_tokens(text)
+        kept[(key, idx)] = text
+        used += cost
+
+    sections: Dict[Hashable, List[str]] = {}
+    for key in dict.fromkeys(key for key, _ in kept):
+        passages = sections[key] = []
+        previous_idx = None
+        for idx in sorted(idx for kept_key, idx in kept if kept_key == key):
+            text = kept[(key, idx)]
+            if passages and previous_idx == idx - 1:
+                overlap = _overlap(passages[-1], text)
+                passages[-1] += text[overlap:] if overlap else "\n" + text
+            else:
+                passages.append(text)
+            previous_idx = idx
+    stats = {
+        "candidates": len(ranked),
+        "chunks_used": len(kept),
+        "tokens_raw": tokens_raw,
+        "tokens_cleaned": used,
+        "tokens_final": sum(estimate_tokens(passage) for passages in sections.values() for passage in passages),
+        "token_budget": token_budget,
+        "chunks": list(kept),
+    }
+    return sections, stats
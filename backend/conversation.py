@@ -0,0 +1,173 @@
+# Jo Jo's memory for conversations – the last few turns word for word, everything older as a running summary. 💬
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from workers import run_io
+
+logger = logging.getLogger("uvicorn.error")
+
+Turn = Tuple[str, str]  # (question, answer)
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+def summary_prompt(summary: str, turns: List[Turn], max_chars: int) -> str:
+    """Ask Gemini to fold a few more turns into the running summary – only the new turns are sent, never the whole chat."""
+    exchanges = "\n".join(f"User: {question}\nJo Jo: {answer}" for question, answer in turns)
+    return (f"Here is a summary of a conversation about a document, followed by newer exchanges. Rewrite the summary so it "
+            f"also covers the newer exchanges: keep the facts, names and numbers a follow-up question might refer to, and "
+            f"drop small talk. Use at most {max_chars} characters.\n\nSummary so far:\n{summary or '(nothing yet)'}\n\n"
+            f"Newer exchanges:\n{exchanges}\n\nUpdated summary:")
+
+def extractive_summary(summary: str, turns: List[Turn], max_chars: int) -> str:
+    """A summary without Gemini: each question with the first sentence of its answer, oldest dropped first."""
+    lines = [line for line in summary.split("\n") if line]
+    for question, answer in turns:
+        first_sentence = _SENTENCE_END.split(" ".join(answer.split()), maxsplit=1)[0]
+        lines.append(f"- Asked: {_clip(question, 200)} Answer: {_clip(first_sentence, 300)}")
+    while lines and len("\n".join(lines)) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+class ConversationMemory:
+    """Per-session conversation state for multi-turn questions, kept to a fixed size.
+
+    A session holds at most window_turns recent turns, each clipped to turn_max_chars, plus a
+    summary of at most summary_max_chars. Turns pushed out of the window are folded into the summary
+    in the background, a few at a time, so the history sent with each question stays the same size
+    however long the conversation runs. The summary is saved on the chat_sessions row; sessions this
+    worker hasn't seen are rebuilt from that row and the newest messages.
+    """
+
+    def __init__(self, get_client: Callable, window_turns: int = 4, summary_max_chars: int = 1500,
+                 turn_max_chars: int = 800, max_sessions: int = 1024,
+                 sessions_table: str = "chat_sessions", messages_table: str = "messages"):
+        self.get_client = get_client
+        self.window_turns = max(1, window_turns)
+        self.summary_max_chars = summary_max_chars
+        self.turn_max_chars = turn_max_chars
+        self.max_sessions = max_sessions
+        self.sessions_table = sessions_table
+        self.messages_table = messages_table
+        self._sessions: "OrderedDict[int, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def _keep(self, session_id: int, state: dict) -> dict:
+        with self._lock:
+            self._sessions[session_id] = state
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return state
+
+    def get_local(self, session_id: int) -> Optional[dict]:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+            return state
+
+    def start(self, session_id: int, document_id: int) -> dict:
+        """State for a brand-new session."""
+        return self._keep(session_id, {"session_id": session_id, "document_id": document_id, "summary": "",
+                                       "summarized_turns": 0, "turns": [], "folding": False})
+
+    def load(self, session_id: int) -> Optional[dict]:
+        """A session's state – from memory, else its chat_sessions row and newest messages. None if there's no such session.
+
+        Messages still waiting in the write-behind buffer of another worker aren't visible yet; the
+        summary and whatever has been saved carry the conversation in that case.
+        """
+        state = self.get_local(session_id)
+        if state is not None:
+            return state
+        client = self.get_client()
+        rows = client.table(self.sessions_table).select("id, document_id, summary, summarized_turns").eq("id", session_id).limit(1).execute().data
+        if not rows:
+            return None
+        self.loads += 1
+        messages = (client.table(self.messages_table).select("role, content").eq("session_id", session_id)
+                    .order("created_at", desc=True).order("id", desc=True).limit(2 * self.window_turns).execute().data or [])
+        turns: List[Turn] = []
+        question = None
+        for message in reversed(messages):
+            if message["role"] == "user":
+                question = message["content"]
+            elif question is not None:
+                turns.append((question, message["content"]))
+                question = None
+        row = rows[0]
+        return self._keep(session_id, {"session_id": session_id, "document_id": row["document_id"], "summary": row.get("summary") or "",
+                                       "summarized_turns": row.get("summarized_turns") or 0, "turns": turns[-self.window_turns:],
+                                       "folding": False})
+
+    def history_text(self, state: Optional[dict]) -> str:
+        """The conversation so far as prompt text – empty for a new session."""
+        if not state or not (state["summary"] or state["turns"]):
+            return ""
+        parts = []
+        if state["summary"]:
+            parts.append(f"Summary of earlier conversation:\n{state['summary']}")
+        if state["turns"]:
+            # Before a fold finishes the window may briefly run one turn over; only the newest count
+            recent = state["turns"][-self.window_turns:]
+            parts.append("Most recent exchanges:\n" + "\n".join(
+                f"User: {_clip(question, self.turn_max_chars)}\nJo Jo: {_clip(answer, self.turn_max_chars)}" for question, answer in recent))
+        return "\n\n".join(parts)
+
+    def retrieval_query(self, state: Optional[dict], question: str) -> str:
+        """Follow-ups like 'and its warranty?' retrieve better with the previous question alongside."""
+        if not state or not state["turns"]:
+            return question
+        return f"{state['turns'][-1][0]}\n{question}"
+
+    async def remember(self, session_id: int, document_id: int, question: str, answer: str, summarize: Summarizer) -> None:
+        """Add a finished turn, folding whatever falls out of the window into the summary."""
+        state = self.get_local(session_id) or self.start(session_id, document_id)
+        state["turns"].append((question, answer))
+        if state["folding"] or len(state["turns"]) <= self.window_turns:
+            return  # A fold already running picks up the overflow when it finishes
+        state["folding"] = True
+        try:
+            while len(state["turns"]) > self.window_turns:
+                overflow = state["turns"][:len(state["turns"]) - self.window_turns]
+                try:
+                    summary = await summarize(state["summary"], overflow)
+                    self.summaries += 1
+                except Exception as oops:
+                    self.summary_failures += 1
+                    logger.warning(f"(Jo Jo) Couldn't summarize session {session_id}; keeping a plain digest instead: {oops}")
+                    summary = extractive_summary(state["summary"], overflow, self.summary_max_chars)
+                state["summary"] = summary.strip()[:self.summary_max_chars]
+                state["summarized_turns"] += len(overflow)
+                del state["turns"][:len(overflow)]
+            await run_io(self._save_summary, state)
+        except Exception as oops:
+            logger.warning(f"(Jo Jo) Couldn't save the summary for session {session_id}; it stays in memory only: {oops}")
+        finally:
+            state["folding"] = False
+
+    def _save_summary(self, state: dict) -> None:
+        self.get_client().table(self.sessions_table).update(
+            {"summary": state["summary"], "summarized_turns": state["summarized_turns"]}
+        ).eq("id", state["session_id"]).execute()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = len(self._sessions)
+        return {"sessions": sessions, "loads": self.loads, "summaries": self.summaries, "summary_failures": self.summary_failures}
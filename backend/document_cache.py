@@ -0,0 +1,78 @@
+# Jo Jo's document shelf – hot documents stay in memory so questions skip the lookup and the index read. 📚
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+class DocumentContextCache:
+    """A per-worker LRU of document metadata and parsed retrieval indexes, bounded by total bytes.
+
+    Each entry is charged the size the caller estimates it takes in memory – for documents, what their
+    loaded BM25 index holds (BM25Index.memory_footprint), several times its size on disk.
+    Entries also expire after ttl_seconds, so a document deleted through another worker doesn't
+    linger here forever.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: float = 300):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, int, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, document_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry is not None:
+                expires_at, _, document = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(document_id)
+                    self.hits += 1
+                    return document
+                self._drop(document_id)
+            self.misses += 1
+            return None
+
+    def put(self, document_id: int, document: dict, size: int) -> None:
+        """Remember a document. Anything bigger than the whole budget simply isn't cached."""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(document_id)
+            self._entries[document_id] = (time.monotonic() + self.ttl_seconds, size, document)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, document_id: int) -> None:
+        with self._lock:
+            self._drop(document_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _drop(self, document_id: int) -> None:
+        entry = self._entries.pop(document_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,151 @@
+# Jo Jo's PDF reader – pure functions with no app state, so they can run inside worker processes. 📄
+
+import asyncio
+import logging
+import mmap
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+from metrics import observe_stage
+from page_store import PageWriter, temp_path_for
+from workers import get_process_pool, run_io
+
+logger = logging.getLogger("uvicorn.error")
+
+# Pages are separated by a form feed in extracted text, the same convention pdftotext uses
+PAGE_SEPARATOR = "\f"
+
+@contextmanager
+def open_pdf(pdf_path: str):
+    """Open a PDF on disk through a read-only memory map.
+
+    PdfReader(path) would copy the whole file into a BytesIO; the map lets the OS page in
+    only what the parser touches.
+    """
+    with open(pdf_path, "rb") as pdf_file, mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield PdfReader(mapped)
+
+def extract_text_from_pdf_file(pdf_path: str, original_filename: str) -> str:
+    """Pulls out all the readable text from a saved PDF. If it's just images, we'll warn you!"""
+    logger.info(f"Extracting text from {pdf_path} for: {original_filename}")
+    try:
+        with open_pdf(pdf_path) as reader:
+            page_texts = [page.extract_text() or "" for page in reader.pages]
+    except Exception as oops:
+        logger.error(f"(Jo Jo) Trouble reading {original_filename}", exc_info=oops)
+        raise ValueError(f"Couldn't read text from PDF: {original_filename}") from oops
+    for i, page_text in enumerate(page_texts):
+        if not page_text:
+            logger.warning(f"(Jo Jo) Page {i+1} of {original_filename} had no text.")
+    all_text = PAGE_SEPARATOR.join(page_texts)
+    if not all_text.strip(PAGE_SEPARATOR):
+        logger.warning(f"(Jo Jo) No text found in {original_filename}. Maybe it's a scanned image?")
+    logger.info(f"(Jo Jo) Got {len(all_text)} characters from {original_filename}")
+    return all_text
+
+def count_pdf_pages(pdf_path: str) -> int:
+    with open_pdf(pdf_path) as reader:
+        return len(reader.pages)
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """Extract pages [start, end) from a PDF on disk. Returns (page index, text, seconds) per page.
+
+    Each worker opens the file itself, so only the page numbers cross the process boundary.
+    """
+    results = []
+    with open_pdf(pdf_path) as reader:
+        for page_number in range(start, end):
+            began = time.perf_counter()
+            page_text = reader.pages[page_number].extract_text() or ""
+            results.append((page_number, page_text, time.perf_counter() - began))
+    return results
+
+def _page_ranges(page_count: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    step = max(1, pages_per_task)
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+async def extract_pdf_to_file(pdf_path: str, text_path: str, original_filename: str, pages_per_task: int = 8,
+                              ranges_in_flight: int = 0, on_pages: Optional[Callable[[PageWriter, int], Awaitable[None]]] = None) -> Dict:
+    """Extract a PDF page-range by page-range across the process pool, streaming pages to disk in page order.
+
+    Ranges are written as soon as every range before them has finished, so the full text never has
+    to sit in memory. Pages are stored compressed in a page file (see page_store), written under a
+    temporary name and renamed once complete. Returns extraction stats, including how long each page took.
+
+    ranges_in_flight caps how many ranges wait in the pool at once (0 submits them all up front), so
+    other work sent to the pool meanwhile doesn't queue behind the whole PDF. on_pages(writer, page_count)
+    is awaited after each range is written – progressive ingestion publishes early pages from there.
+    """
+    began = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    try:
+        page_count = await loop.run_in_executor(pool, count_pdf_pages, pdf_path)
+    except Exception as oops:
+        logger.error(f"(Jo Jo) Trouble reading {original_filename}", exc_info=oops)
+        raise ValueError(f"Couldn't read text from PDF: {original_filename}") from oops
+    ranges = _page_ranges(page_count, pages_per_task)
+    logger.info(f"(Jo Jo) Extracting {page_count} pages of {original_filename} in {len(ranges)} parallel batches")
+    window = len(ranges) if ranges_in_flight <= 0 else ranges_in_flight
+
+    def submit(position: int) -> "asyncio.Future":
+        start, end = ranges[position]
+        return loop.run_in_executor(pool, extract_page_range, pdf_path, start, end)
+
+    futures = [submit(position) for position in range(min(window, len(ranges)))]
+
+    page_seconds = [0.0] * page_count
+    save_seconds = hook_seconds = 0.0
+    empty_pages = []
+    tmp_path = temp_path_for(text_path)
+    writer = await run_io(PageWriter, tmp_path)
+    try:
+        for position in range(len(ranges)):
+            # Awaiting in order is enough: later ranges keep running in the pool while we wait
+            try:
+                pages = await futures[position]
+            except Exception as oops:
+                logger.error(f"(Jo Jo) Trouble reading pages {ranges[position]} of {original_filename}", exc_info=oops)
+                raise ValueError(f"Couldn't read text from PDF: {original_filename}") from oops
+            if len(futures) < len(ranges):
+                futures.append(submit(len(futures)))  # One range out, the next one in
+            for page_number, page_text, seconds in pages:
+                page_seconds[page_number] = seconds
+                if not page_text:
+                    empty_pages.append(page_number + 1)
+            started = time.perf_counter()
+            await run_io(writer.add_pages, [page_text for _, page_text, _ in pages])
+            save_seconds += time.perf_counter() - started
+            if on_pages is not None:
+                started = time.perf_counter()
+                await on_pages(writer, page_count)
+                hook_seconds += time.perf_counter() - started
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        await run_io(writer.abort)
+        raise
+    await run_io(writer.close)
+    await run_io(os.replace, tmp_path, text_path)
+    chars = writer.chars
+
+    wall_seconds = time.perf_counter() - began
+    observe_stage("pdf_extraction", wall_seconds - save_seconds - hook_seconds)
+    observe_stage("text_save", save_seconds)
+    if empty_pages:
+        logger.warning(f"(Jo Jo) {len(empty_pages)} page(s) of {original_filename} had no text: {empty_pages[:20]}")
+    slowest = max(range(page_count), key=page_seconds.__getitem__) + 1 if page_count else None
+    logger.info(f"(Jo Jo) Got {chars} characters from {page_count} pages of {original_filename} in {wall_seconds:.2f}s"
+                + (f" (slowest: page {slowest}, {page_seconds[slowest - 1]:.3f}s)" if slowest else ""))
+    return {
+        "page_count": page_count,
+        "chars": chars,
+        "compressed_bytes": writer.compressed_bytes,
+        "empty_pages": empty_pages,
+        "page_seconds": page_seconds,
+        "wall_seconds": wall_seconds,
+    }
@@ -0,0 +1,92 @@
+# Jo Jo's check-ups – dependency health is probed in the background, so /api/health never waits on it. 🩺
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from workers import run_io
+
+logger = logging.getLogger("uvicorn.error")
+
+class StartupReport:
+    """Named checkpoints from process start, so slow cold starts show where the time went."""
+
+    def __init__(self, started: Optional[float] = None):
+        self._started = time.perf_counter() if started is None else started
+        self._last = self._started
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def to_dict(self) -> dict:
+        return {"phases_ms": dict(self.phases), "total_ms": round((self._last - self._started) * 1000, 1)}
+
+class HealthProber:
+    """Runs each named check every `interval` seconds and keeps the latest result.
+
+    A check is a blocking callable that raises when its dependency is unhealthy. Checks run on
+    the I/O pool with a timeout. If the background loop isn't running (say, a serverless runtime
+    that skips the lifespan), reading a stale snapshot kicks off a refresh instead.
+    """
+
+    def __init__(self, checks: Dict[str, Callable[[], None]], interval: float = 30.0, timeout: float = 5.0):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.results: Dict[str, dict] = {
+            name: {"healthy": None, "message": "Not checked yet.", "checked_at": None, "latency_ms": None} for name in checks
+        }
+        self._last_probe = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def _check(self, name: str, check: Callable[[], None]) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(run_io(check), timeout=self.timeout)
+            healthy, message = True, "OK"
+        except asyncio.TimeoutError:
+            healthy, message = False, f"No answer within {self.timeout}s."
+        except Exception as e:
+            healthy, message = False, f"Check failed: {e}"
+        if not healthy and self.results[name]["healthy"] is not False:
+            logger.warning(f"(Jo Jo) Health check '{name}' is failing: {message}")
+        self.results[name] = {
+            "healthy": healthy,
+            "message": message,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    async def probe(self) -> None:
+        """Run every check once, concurrently."""
+        self._last_probe = time.monotonic()
+        await asyncio.gather(*(self._check(name, check) for name, check in self.checks.items()))
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._refresh):
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._refresh = None
+
+    def snapshot(self) -> Dict[str, dict]:
+        """The latest results, scheduling a background refresh if they're older than the interval."""
+        stale = time.monotonic() - self._last_probe > self.interval
+        if stale and (self._refresh is None or self._refresh.done()) and (self._task is None or self._task.done()):
+            self._refresh = asyncio.get_running_loop().create_task(self.probe())
+        return {name: dict(result) for name, result in self.results.items()}
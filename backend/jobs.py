@@ -0,0 +1,153 @@
+# Jo Jo's ingestion jobs – uploads are acknowledged right away and processed in the background. 🧺
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("uvicorn.error")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+class IngestionJob:
+    """One uploaded file working its way through ingestion, stage by stage."""
+
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.error: Optional[str] = None
+        self.result: Optional[dict] = None
+        self.progress: Optional[dict] = None  # Set while running once the document can already be asked about
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at: Optional[str] = None
+        self.stage_seconds: Dict[str, float] = {}
+        self._stage_started = time.perf_counter()
+        self._done: Optional[asyncio.Event] = None
+
+    def set_stage(self, stage: str) -> None:
+        """Move on to the next stage, recording how long the previous one took."""
+        now = time.perf_counter()
+        self.stage_seconds[self.stage] = round(self.stage_seconds.get(self.stage, 0.0) + now - self._stage_started, 3)
+        self.stage = stage
+        self._stage_started = now
+
+    def finish(self, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        self.set_stage(FAILED if error else "done")
+        self.status = FAILED if error else SUCCEEDED
+        self.result = result
+        self.error = error
+        self.finished_at = datetime.now(timezone.utc).isoformat()
+        if self._done is not None:
+            self._done.set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "result": self.result,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "stage_seconds": dict(self.stage_seconds),
+        }
+
+class JobQueue:
+    """Runs ingestion jobs on the event loop, at most max_concurrency at a time.
+
+    Jobs live in this worker's memory; the most recent max_finished finished jobs are kept around
+    for status checks and older ones are forgotten.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_finished: int = 1000):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created on first use so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def submit(self, filename: str, work: Callable[[IngestionJob], Awaitable[dict]]) -> IngestionJob:
+        """Queue work(job) and return the job straight away. work's return value becomes job.result."""
+        job = IngestionJob(filename)
+        job._done = asyncio.Event()
+        self._jobs[job.id] = job
+        self.submitted += 1
+        self._tasks[job.id] = asyncio.get_running_loop().create_task(self._run(job, work))
+        self._forget_old_jobs()
+        return job
+
+    async def _run(self, job: IngestionJob, work: Callable[[IngestionJob], Awaitable[dict]]) -> None:
+        try:
+            async with self._get_semaphore():
+                job.status = RUNNING
+                result = await work(job)
+            job.finish(result=result)
+            self.succeeded += 1
+        except asyncio.CancelledError:
+            job.finish(error="Ingestion was cancelled because the server is shutting down.")
+            self.failed += 1
+            raise
+        except Exception as e:
+            logger.error(f"(Jo Jo) Ingestion job {job.id} for '{job.filename}' failed in stage '{job.stage}'", exc_info=True)
+            job.finish(error=str(e))
+            self.failed += 1
+        finally:
+            self._tasks.pop(job.id, None)
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def many(self, job_ids: Iterable[str]) -> List[IngestionJob]:
+        return [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
+
+    async def wait(self, jobs: List[IngestionJob]) -> None:
+        """Block until every given job has finished."""
+        await asyncio.gather(*(job._done.wait() for job in jobs if not job.finished))
+
+    def _forget_old_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    async def shutdown(self, timeout: float = 30.0) -> None:
+        """Give running jobs a chance to finish, then cancel whatever is left."""
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        logger.info(f"(Jo Jo) Waiting up to {timeout}s for {len(tasks)} ingestion job(s) to finish")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
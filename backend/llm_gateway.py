@@ -0,0 +1,110 @@
+# Jo Jo's LLM gateway – Gemini calls run off the event loop, politely queued and never duplicated. 🚦
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import observe_stage, timed
+
+logger = logging.getLogger("uvicorn.error")
+
+class LLMBusy(Exception):
+    """No LLM slot freed up within the queue timeout."""
+
+class LLMGateway:
+    """Caps concurrent model calls, runs them on a dedicated thread pool and coalesces duplicates.
+
+    Identical in-flight requests (same coalescing key) share one generation: the first caller
+    starts it and everyone else awaits the same task, so a burst of the same question costs one
+    Gemini call.
+    """
+
+    def __init__(self, get_llm: Callable, max_concurrency: int = 8, queue_timeout: float = 10.0):
+        self.get_llm = get_llm
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.active = 0
+        self.waiting = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created on first use so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="jojo-llm")
+            return self._pool
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the concurrency slots, waiting at most queue_timeout seconds for it."""
+        semaphore = self._get_semaphore()
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise LLMBusy(f"All {self.max_concurrency} LLM slots stayed busy for {self.queue_timeout}s")
+        finally:
+            self.waiting -= 1
+            observe_stage("llm_queue_wait", time.perf_counter() - started)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            semaphore.release()
+
+    async def generate(self, prompt: str) -> str:
+        """Run one non-streaming generation and return its text."""
+        async with self.slot():
+            self.calls += 1
+            loop = asyncio.get_running_loop()
+            with timed("llm_call"):
+                response = await loop.run_in_executor(self._get_pool(), self.get_llm().generate_content, prompt)
+            return response.text
+
+    async def coalesce(self, key: str, produce: Callable[[], Awaitable[str]]) -> str:
+        """Run produce() once per key at a time; concurrent callers with the same key share its result."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.info(f"(Jo Jo) Joining an identical in-flight request ({self.coalesced} coalesced so far)")
+        else:
+            task = asyncio.ensure_future(produce())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is done else None)
+        # Shielded, so one impatient client disconnecting doesn't cancel the answer for everyone else
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "in_flight_keys": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,257 @@
+# Jo Jo's stopwatch – histograms, counters and gauges, served in Prometheus text format. ⏱️
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds – from sub-millisecond cache hits up to slow Gemini answers and big PDF extractions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.label_names, labels)} {value:g}" for labels, value in items]
+
+class Gauge(_Metric):
+    """A value that goes up and down. Pass `read` to sample it from somewhere else at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), read: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._read = read
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        if self._read is not None:
+            return self.header() + [f"{self.name} {float(self._read()):g}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.label_names, labels)} {value:g}" for labels, value in items]
+
+class Histogram(_Metric):
+    """Fixed buckets, so an observation is one bisect and a couple of additions under a lock."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, seconds: float, *label_values: str) -> None:
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(series[0]), series[1], series[2])) for labels, series in self._series.items())
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                running += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _label_text(self.label_names, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {running}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = (), read: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._add(Gauge(name, help_text, labels, read))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+stage_seconds = REGISTRY.histogram("jojo_stage_seconds", "Time spent in each stage of uploads and answers.", ("stage",))
+supabase_seconds = REGISTRY.histogram("jojo_supabase_seconds", "Time spent in Supabase calls.", ("table", "operation"))
+supabase_errors = REGISTRY.counter("jojo_supabase_errors_total", "Supabase calls that raised.", ("table", "operation"))
+
+def timed(stage: str):
+    """`with timed("prompt_build"): ...` – records the block's duration under that stage."""
+    return stage_seconds.time(stage)
+
+def observe_stage(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage)
+
+_QUERY_OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+
+class _TimedQuery:
+    """Wraps a Supabase query builder so .execute() is timed per table and operation."""
+
+    def __init__(self, builder, table: str, operation: str = "select"):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attribute = getattr(self._builder, name)
+        if name == "execute":
+            return self._execute
+        if not callable(attribute):
+            return attribute
+        operation = name if name in _QUERY_OPERATIONS else self._operation
+
+        def chain(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            return _TimedQuery(result, self._table, operation) if hasattr(result, "execute") else result
+        return chain
+
+    def _execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._builder.execute(*args, **kwargs)
+        except Exception:
+            supabase_errors.inc(self._table, self._operation)
+            raise
+        finally:
+            supabase_seconds.observe(time.perf_counter() - started, self._table, self._operation)
+
+class TimedSupabase:
+    """A drop-in stand-in for a Supabase client whose table queries report to jojo_supabase_seconds.
+
+    Takes a function returning the real client, so the client is only created when first used.
+    """
+
+    def __init__(self, get_client: Callable):
+        self._get_client = get_client
+
+    def table(self, name: str) -> _TimedQuery:
+        return _TimedQuery(self._get_client().table(name), name)
+
+    def __getattr__(self, name):
+        return getattr(self._get_client(), name)
+
+http_requests = REGISTRY.counter("jojo_http_requests_total", "HTTP requests by method, route and status.", ("method", "route", "status"))
+http_seconds = REGISTRY.histogram("jojo_http_request_seconds", "Full HTTP request duration, including streamed bodies.", ("route",))
+http_in_flight = REGISTRY.gauge("jojo_http_requests_in_flight", "HTTP requests being handled right now.")
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: counts requests, times them end to end and tracks how many are in flight.
+
+    Routes are labelled by their template (/api/jobs/{job_id}), never the raw path, so label
+    cardinality stays small.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_and_note_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_and_note_status)
+        finally:
+            http_in_flight.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.inc(scope["method"], route, str(status["code"]))
+            http_seconds.observe(time.perf_counter() - started, route)
@@ -0,0 +1,215 @@
+# Jo Jo's page shelf – extracted text stored one compressed frame per page, with an offset table to jump straight in. 📚
+#
+# Layout: MAGIC, then one zlib frame per page, then the table – per page (offset, compressed bytes,
+# characters) – and a fixed-size trailer (page count, table offset, END_MAGIC). The table sits at the
+# end so pages can be written as extraction finishes them, without knowing the page count up front.
+
+import bisect
+import os
+import struct
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+PAGE_SEPARATOR = "\f"  # Same convention as extraction.py – whole-document text joins pages with it
+PAGES_SUFFIX = ".pages"
+PARTIAL_MARK = ".partial"  # {key}.partial.pages holds the pages ready so far while a big PDF is still being read
+MAGIC = b"JOJOPAGES1\n"
+END_MAGIC = b"JJPG"
+_ENTRY = struct.Struct("<QII")  # Frame offset, compressed length, page length in characters
+_TRAILER = struct.Struct("<IQ4s")  # Page count, table offset, END_MAGIC
+
+class PageWriter:
+    """Appends pages as compressed frames; close() writes the offset table. Use as a context manager."""
+
+    def __init__(self, path: str, level: int = 6):
+        self.path = path
+        self.level = level
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._entries: List[Tuple[int, int, int]] = []
+        self.chars = 0
+        self.compressed_bytes = 0
+
+    def add_page(self, text: str) -> None:
+        frame = zlib.compress(text.encode("utf-8"), self.level)
+        self._entries.append((self._file.tell(), len(frame), len(text)))
+        self._file.write(frame)
+        self.chars += len(text) + (1 if len(self._entries) > 1 else 0)
+        self.compressed_bytes += len(frame)
+
+    def add_pages(self, texts: Iterable[str]) -> None:
+        for text in texts:
+            self.add_page(text)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._entries)
+
+    def _table(self, table_offset: int) -> bytes:
+        return b"".join(_ENTRY.pack(*entry) for entry in self._entries) + _TRAILER.pack(len(self._entries), table_offset, END_MAGIC)
+
+    def snapshot(self, path: str) -> int:
+        """Publish the pages written so far as a complete page file at path, renamed into place. Returns the page count.
+
+        The compressed frames are copied as they are – nothing is recompressed – and this writer keeps appending.
+        """
+        self._file.flush()
+        table_offset = self._file.tell()
+        tmp_path = temp_path_for(path)
+        with open(self.path, "rb") as source, open(tmp_path, "wb") as target:
+            remaining = table_offset
+            while remaining:
+                block = source.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                target.write(block)
+                remaining -= len(block)
+            target.write(self._table(table_offset))
+        os.replace(tmp_path, path)
+        return len(self._entries)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.write(self._table(self._file.tell()))
+        self._file.close()
+
+    def abort(self) -> None:
+        """Close without a table and remove the half-written file."""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self) -> "PageWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_pages(path: str, pages: Iterable[str], level: int = 6) -> int:
+    """Write a page file under a temporary name and rename it into place. Returns the compressed size."""
+    tmp_path = temp_path_for(path)
+    with PageWriter(tmp_path, level) as writer:
+        writer.add_pages(pages)
+    os.replace(tmp_path, path)
+    return writer.compressed_bytes
+
+def temp_path_for(path: str) -> str:
+    """A name next to path to write it under before renaming it into place. Files are named by content, and
+    the same PDF can be ingested by two workers at once, so the name is unique to this process and call."""
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex[:12]}.part"
+
+def partial_path_for(text_path: str) -> str:
+    """Where the pages ready so far are published while text_path is still being extracted."""
+    base, extension = os.path.splitext(text_path)
+    return f"{base}{PARTIAL_MARK}{extension}"
+
+def is_page_file(path: str) -> bool:
+    with open(path, "rb") as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+class PageReader:
+    """Random access to one page file. Only the offset table is read up front; pages are decompressed on
+    demand, and the last few are kept so neighbouring chunks don't decompress the same page twice."""
+
+    def __init__(self, path: str, cached_pages: int = 8):
+        self.path = path
+        self.cached_pages = cached_pages
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        with open(path, "rb") as handle:
+            if handle.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a page file")
+            handle.seek(-_TRAILER.size, os.SEEK_END)
+            page_count, table_offset, end_magic = _TRAILER.unpack(handle.read(_TRAILER.size))
+            if end_magic != END_MAGIC:
+                raise ValueError(f"{path} is incomplete (no offset table)")
+            handle.seek(table_offset)
+            table = handle.read(page_count * _ENTRY.size)
+        self._entries = [_ENTRY.unpack_from(table, n * _ENTRY.size) for n in range(page_count)]
+        # Where each page starts in the whole-document text (pages joined by PAGE_SEPARATOR)
+        self.page_starts: List[int] = []
+        position = 0
+        for _, _, chars in self._entries:
+            self.page_starts.append(position)
+            position += chars + 1
+        self.chars = max(0, position - 1)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._entries)
+
+    def page(self, number: int) -> str:
+        """The text of one page (0-based)."""
+        with self._lock:
+            cached = self._cache.get(number)
+            if cached is not None:
+                self._cache.move_to_end(number)
+                return cached
+        offset, length, _ = self._entries[number]
+        with open(self.path, "rb") as handle:
+            handle.seek(offset)
+            text = zlib.decompress(handle.read(length)).decode("utf-8")
+        with self._lock:
+            self._cache[number] = text
+            while len(self._cache) > self.cached_pages:
+                self._cache.popitem(last=False)
+        return text
+
+    def pin(self) -> None:
+        """Decompress every page now and keep them all, so reads carry on if the file is removed later."""
+        self.cached_pages = max(self.cached_pages, self.page_count)
+        self.pages()
+
+    def pages(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        end = self.page_count if end is None else min(end, self.page_count)
+        return [self.page(number) for number in range(start, end)]
+
+    def text(self) -> str:
+        """The whole document, pages joined by PAGE_SEPARATOR – the same text the old .txt files held."""
+        return PAGE_SEPARATOR.join(self.pages())
+
+    def pages_for_span(self, start: int, end: int) -> range:
+        """0-based page numbers covering characters [start, end) of the whole-document text."""
+        if not self.page_starts:
+            return range(0)
+        first = bisect.bisect_right(self.page_starts, start) - 1
+        last = bisect.bisect_right(self.page_starts, max(start, end - 1)) - 1
+        return range(max(0, first), last + 1)
+
+    def span(self, start: int, end: int) -> str:
+        """Characters [start, end) of the whole-document text, decompressing only the pages they touch."""
+        numbers = self.pages_for_span(start, end)
+        if not numbers:
+            return ""
+        joined = PAGE_SEPARATOR.join(self.page(number) for number in numbers)
+        base = self.page_starts[numbers[0]]
+        return joined[start - base:end - base]
+
+class PlainTextReader(PageReader):
+    """The same API over a legacy .txt file (pages separated by PAGE_SEPARATOR), read whole."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "r", encoding="utf-8") as text_file:
+            self._pages = text_file.read().split(PAGE_SEPARATOR)
+        self._entries = [(0, 0, len(page)) for page in self._pages]
+        self.page_starts = []
+        position = 0
+        for page in self._pages:
+            self.page_starts.append(position)
+            position += len(page) + 1
+        self.chars = max(0, position - 1)
+
+    def page(self, number: int) -> str:
+        return self._pages[number]
+
+def open_text(path: str) -> PageReader:
+    """A reader for an extracted-text file, whichever format it was saved in."""
+    return PageReader(path) if is_page_file(path) else PlainTextReader(path)
@@ -0,0 +1,36 @@
+# Jo Jo's paging helpers – opaque keyset cursors so long lists load page by page at a flat cost. 📑
+
+import base64
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+def encode_cursor(values: dict) -> str:
+    raw = json.dumps(values, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, required: Iterable[str]) -> dict:
+    """Decode a cursor from encode_cursor, raising ValueError if it's garbled or missing fields."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as oops:
+        raise ValueError("Invalid cursor") from oops
+    if not isinstance(values, dict) or any(field not in values for field in required):
+        raise ValueError("Invalid cursor")
+    return values
+
+def keyset_before(sort_column: str, sort_value: str, id_value: int) -> str:
+    """PostgREST or() filter for rows strictly after a (sort_column, id) cursor in descending order."""
+    quoted = json.dumps(str(sort_value))  # Quote timestamps – their ':' and '+' would otherwise confuse the parser
+    return f"{sort_column}.lt.{quoted},and({sort_column}.eq.{quoted},id.lt.{int(id_value)})"
+
+def group_messages_by_session(messages: List[dict], per_session_limit: Optional[int] = None) -> Dict[int, List[dict]]:
+    """Group chronologically ordered messages by session, keeping only the newest N per session if asked."""
+    grouped: Dict[int, List[dict]] = defaultdict(list)
+    for message in messages:
+        grouped[message["session_id"]].append(message)
+    if per_session_limit is not None:
+        for session_id, session_messages in grouped.items():
+            grouped[session_id] = session_messages[-per_session_limit:]
+    return grouped
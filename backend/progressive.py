@@ -0,0 +1,66 @@
+# Jo Jo's early bird – long PDFs answer questions from their first pages while the rest are still being read. 🐣
+
+import logging
+import os
+from typing import Awaitable, Callable
+
+from metrics import timed
+from page_store import PageWriter, partial_path_for
+from retrieval import index_path_for, index_text_file
+from workers import run_cpu, run_io
+
+logger = logging.getLogger("uvicorn.error")
+
+def _remove_if_present(paths) -> None:
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+class ProgressivePublisher:
+    """Publishes the pages extracted so far, for extract_pdf_to_file's on_pages hook.
+
+    PDFs with at least min_pages pages get their first first_pages pages copied to a partial page
+    file and indexed as soon as they're written, then on_publish(pages_ready, page_count) is awaited –
+    that first call is where the documents row gets created. Later snapshots wait until the ready
+    pages have grown by growth times, so copying and re-indexing the prefix costs a small constant
+    factor over doing it once, however long the PDF. The finished text replaces all of this.
+    """
+
+    def __init__(self, text_path: str, chunk_size: int, chunk_overlap: int, on_publish: Callable[[int, int], Awaitable[None]],
+                 first_pages: int = 8, growth: float = 2.0, min_pages: int = 32):
+        self.partial_path = partial_path_for(text_path)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.on_publish = on_publish
+        self.first_pages = max(1, first_pages)
+        self.growth = max(1.1, growth)
+        self.min_pages = min_pages
+        self.pages_ready = 0
+        self.snapshots = 0
+
+    def due(self, pages_written: int, page_count: int) -> bool:
+        if page_count < self.min_pages or pages_written >= page_count:
+            return False  # Short PDFs finish soon enough, and a finished one is about to be saved for real
+        if not self.pages_ready:
+            return pages_written >= self.first_pages
+        return pages_written >= self.pages_ready * self.growth
+
+    async def __call__(self, writer: PageWriter, page_count: int) -> None:
+        pages_written = writer.page_count
+        if not self.due(pages_written, page_count):
+            return
+        with timed("progressive_publish"):
+            await run_io(writer.snapshot, self.partial_path)
+            await run_cpu(index_text_file, self.partial_path, self.chunk_size, self.chunk_overlap)
+        self.pages_ready = pages_written
+        self.snapshots += 1
+        logger.info(f"(Jo Jo) {pages_written} of {page_count} pages ready to answer from ({self.partial_path})")
+        await self.on_publish(pages_written, page_count)
+
+    @property
+    def published(self) -> bool:
+        return self.snapshots > 0
+
+    async def discard(self) -> None:
+        """Remove the partial text and its index once the finished ones are in place."""
+        await run_io(_remove_if_present, [self.partial_path, index_path_for(self.partial_path)])
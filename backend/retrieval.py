@@ -0,0 +1,325 @@
+# Jo Jo's retrieval helpers – we chop documents into chunks and only hand Gemini the bits that matter. 🔎
+
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from itertools import islice
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from context_prep import find_boilerplate
+from page_store import PageReader, open_text, temp_path_for
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+INDEX_SUFFIX = ".bm25.json"
+INDEX_FORMAT_VERSION = 4  # 2: remembers running headers and footers. 3: chunk spans instead of chunk text. 4: idf and chunk norms
+# Rough in-memory cost of a loaded index, measured with tracemalloc: a posting is a (chunk id, tf) tuple in a
+# list plus its slots in the impact arrays; a term is its string, its dict entries and its idf
+POSTING_BYTES = 110
+TERM_BYTES = 300
+CHUNK_BYTES = 200
+
+# Tiny stopword list – enough to keep "the" and friends from drowning out real matches
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or "
+    "that the their there these this to was were what when where which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase the text and split it into searchable terms (stopwords skipped)."""
+    return [tok for tok in TOKEN_PATTERN.findall(text.lower()) if tok not in STOPWORDS]
+
+def chunk_spans(text: str, chunk_size: int, chunk_overlap: int) -> List[Tuple[int, int]]:
+    """(start, end) of each overlapping character window, preferring to break on whitespace.
+    Spans are trimmed of surrounding whitespace and empty windows are skipped."""
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    chunk_overlap = max(0, min(chunk_overlap, chunk_size - 1))
+    spans = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            # Back up to the last whitespace so we don't cut words in half
+            space = text.rfind(" ", start + chunk_overlap + 1, end)
+            newline = text.rfind("\n", start + chunk_overlap + 1, end)
+            cut = max(space, newline)
+            if cut > start:
+                end = cut
+        window = text[start:end]
+        stripped = window.strip()
+        if stripped:
+            left = start + len(window) - len(window.lstrip())
+            spans.append((left, left + len(stripped)))
+        if end >= length:
+            break
+        start = max(end - chunk_overlap, start + 1)
+    return spans
+
+def chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Split text into overlapping character windows, preferring to break on whitespace."""
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, chunk_overlap)]
+
+class StoredChunks(Sequence):
+    """A document's chunks, read from its text file on demand – only the pages a chunk spans are decompressed."""
+
+    def __init__(self, text_path: str, spans: List[Tuple[int, int]]):
+        self.text_path = text_path
+        self.spans = spans
+        self._reader: Optional[PageReader] = None
+
+    @property
+    def reader(self) -> PageReader:
+        if self._reader is None:
+            self._reader = open_text(self.text_path)
+        return self._reader
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[n] for n in range(*idx.indices(len(self)))]
+        return self.reader.span(*self.spans[idx])
+
+    def pages(self, idx: int) -> List[int]:
+        """1-based page numbers a chunk comes from, for citations."""
+        return [number + 1 for number in self.reader.pages_for_span(*self.spans[idx])]
+
+class BM25Index:
+    """A small Okapi BM25 inverted index over one document's chunks.
+
+    Each term's idf and each chunk's length norm are worked out once, when the index is built, and
+    saved with it. A query term's postings become two NumPy arrays (chunk ids and their ready-made
+    BM25 contributions) the first time it's searched, so scoring is a handful of array adds.
+    """
+
+    def __init__(self, chunks: Sequence[str], k1: float = 1.5, b: float = 0.75, boilerplate: Optional[List[str]] = None,
+                 spans: Optional[List[Tuple[int, int]]] = None):
+        self.chunks = chunks
+        self.spans = spans  # Where each chunk sits in the document text; saved instead of the chunk text when known
+        self.boilerplate = boilerplate or []  # Line keys stripped from chunks before they reach the prompt
+        self.k1 = k1
+        self.b = b
+        self.chunk_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for idx, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.chunk_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((idx, tf))
+        self.idfs = {term: self._idf(len(postings)) for term, postings in self.postings.items()}
+        self._prepare()
+
+    def _prepare(self, chunk_norms: Optional[List[float]] = None) -> None:
+        self.avg_length = (sum(self.chunk_lengths) / len(self.chunk_lengths)) if self.chunk_lengths else 0.0
+        if chunk_norms is None:
+            avg = self.avg_length or 1.0
+            chunk_norms = [self.k1 * (1 - self.b + self.b * length / avg) for length in self.chunk_lengths]
+        self.chunk_norms = np.asarray(chunk_norms, dtype=np.float64)
+        self._impacts: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _idf(self, df: int) -> float:
+        n = len(self.chunk_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def idf(self, term: str) -> float:
+        return self.idfs.get(term) or self._idf(0)
+
+    def _term_impacts(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(chunk ids, BM25 contribution of this term to each of them), built on first use and kept."""
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            postings = self.postings[term]
+            ids = np.fromiter((idx for idx, _ in postings), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter((tf for _, tf in postings), dtype=np.float64, count=len(postings))
+            impacts = self._impacts[term] = (ids, self.idfs[term] * tfs * (self.k1 + 1) / (tfs + self.chunk_norms[ids]))
+        return impacts
+
+    def memory_footprint(self) -> int:
+        """Roughly how many bytes this index holds once loaded, counting the impact arrays every term may grow."""
+        postings = sum(len(plist) for plist in self.postings.values())
+        size = postings * POSTING_BYTES + len(self.postings) * TERM_BYTES + len(self.chunk_lengths) * CHUNK_BYTES
+        if not isinstance(self.chunks, StoredChunks):
+            size += sum(len(chunk) for chunk in self.chunks)  # Old indexes keep their chunk text in memory
+        return size + self.chunk_norms.nbytes
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Return up to top_k (chunk index, score) pairs, best first. Only chunks sharing a term are scored."""
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not terms or top_k <= 0:
+            return []
+        scores = np.zeros(len(self.chunk_lengths), dtype=np.float64)
+        for term in terms:
+            ids, impacts = self._term_impacts(term)
+            scores[ids] += impacts  # A term lists each chunk once, so plain fancy-index adds are safe
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            cutoff = np.partition(scores[matched], len(matched) - top_k)[len(matched) - top_k]
+            matched = matched[scores[matched] >= cutoff]  # Keeps ties at the cutoff, so they still go to the earlier chunk
+        order = np.lexsort((matched, -scores[matched]))[:top_k]
+        return [(int(idx), float(scores[idx])) for idx in matched[order]]
+
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            **({"spans": self.spans} if self.spans is not None else {"chunks": list(self.chunks)}),
+            "boilerplate": self.boilerplate,
+            "chunk_lengths": self.chunk_lengths,
+            "chunk_norms": self.chunk_norms.tolist(),
+            "idf": self.idfs,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, text_path: Optional[str] = None) -> "BM25Index":
+        index = cls.__new__(cls)
+        index.spans = [tuple(span) for span in data["spans"]] if "spans" in data else None
+        index.chunks = StoredChunks(text_path, index.spans) if index.spans is not None else data["chunks"]
+        index.boilerplate = data.get("boilerplate", [])
+        index.k1 = data["k1"]
+        index.b = data["b"]
+        index.chunk_lengths = data["chunk_lengths"]
+        index.postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        index.idfs = data["idf"]
+        index._prepare(data["chunk_norms"])
+        return index
+
+    def save(self, path: str) -> str:
+        tmp_path = temp_path_for(path)
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump(self.to_dict(), index_file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str, text_path: Optional[str] = None) -> "BM25Index":
+        """Load a saved index. Indexes saved with spans need text_path to read their chunks from."""
+        with open(path, "r", encoding="utf-8") as index_file:
+            data = json.load(index_file)
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index version in {path}: {data.get('version')}")
+        if "spans" in data and text_path is None:
+            raise ValueError(f"Index {path} keeps chunk spans only; pass the text file to read them from")
+        return cls.from_dict(data, text_path)
+
+def index_path_for(text_path: str) -> str:
+    """The BM25 index lives right next to the extracted text file."""
+    return os.path.splitext(text_path)[0] + INDEX_SUFFIX
+
+def build_index(text: str, chunk_size: int, chunk_overlap: int) -> BM25Index:
+    spans = chunk_spans(text, chunk_size, chunk_overlap)
+    return BM25Index([text[start:end] for start, end in spans], boilerplate=find_boilerplate(text), spans=spans)
+
+def index_text_file(text_path: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Build and save the index for a text file, returning its chunks. Safe to run in a worker process."""
+    index = build_index(open_text(text_path).text(), chunk_size, chunk_overlap)
+    index.save(index_path_for(text_path))
+    return index.chunks
+
+def load_or_build_index(text_path: str, chunk_size: int, chunk_overlap: int) -> BM25Index:
+    """Load the saved index for a text file, building (and saving) it for older uploads that never got one.
+
+    Chunks come back as StoredChunks, read from the text file only when they're actually used.
+    """
+    path = index_path_for(text_path)
+    if os.path.exists(path):
+        try:
+            return BM25Index.load(path, text_path)
+        except (ValueError, KeyError, json.JSONDecodeError):
+            pass  # Stale or corrupt index – rebuild below
+    index = build_index(open_text(text_path).text(), chunk_size, chunk_overlap)
+    index.save(path)
+    index.chunks = StoredChunks(text_path, index.spans)
+    return index
+
+def merge_hits(per_document: Iterable[Tuple[Hashable, List[Tuple[int, float]]]], top_k: int) -> List[Tuple[Hashable, int, float]]:
+    """Merge per-document hit lists (each best first) into the overall top_k as (document, chunk id, score).
+
+    A k-way heap merge, so only the heads of the lists are compared – the work grows with top_k and
+    the number of documents, not with how much text they hold. Ties go to the earlier document.
+    """
+    streams = [[(-score, position, key, idx) for idx, score in hits] for position, (key, hits) in enumerate(per_document)]
+    return [(key, idx, -negative) for negative, _, key, idx in islice(heapq.merge(*streams), top_k)]
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse best-first rankings into one: an item scores 1 / (k + rank) in every list it appears in, summed.
+
+    Only ranks are used, so BM25 scores and cosine similarities never have to be put on one scale.
+    Ties go to the item that appeared first.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda entry: -entry[1])
+
+def token_similarity(texts: Sequence[str]) -> np.ndarray:
+    """Pairwise Jaccard overlap of the texts' term sets."""
+    term_sets = [set(tokenize(text)) for text in texts]
+    similarity = np.eye(len(term_sets))
+    for a in range(len(term_sets)):
+        for b in range(a + 1, len(term_sets)):
+            union = len(term_sets[a] | term_sets[b])
+            similarity[a, b] = similarity[b, a] = len(term_sets[a] & term_sets[b]) / union if union else 0.0
+    return similarity
+
+def mmr_select(relevance: Sequence[float], similarity: np.ndarray, top_k: int, weight: float) -> List[int]:
+    """Maximal marginal relevance: positions of up to top_k candidates, in the order picked.
+
+    Each pick maximises weight * relevance - (1 - weight) * (similarity to the closest candidate
+    already picked), with relevance scaled so the best candidate is 1. weight=1 is plain relevance order.
+    """
+    relevance = np.asarray(relevance, dtype=np.float64)
+    if not len(relevance) or top_k <= 0:
+        return []
+    if relevance.max() > 0:
+        relevance = relevance / relevance.max()
+    picked = [int(np.argmax(relevance))]
+    redundancy = np.array(similarity[picked[0]], dtype=np.float64)
+    taken = np.zeros(len(relevance), dtype=bool)
+    taken[picked[0]] = True
+    while len(picked) < min(top_k, len(relevance)):
+        gains = weight * relevance - (1 - weight) * redundancy
+        gains[taken] = -np.inf
+        pick = int(np.argmax(gains))
+        picked.append(pick)
+        taken[pick] = True
+        redundancy = np.maximum(redundancy, similarity[pick])
+    return picked
+
+def hybrid_rank(index: BM25Index, question: str, top_k: int, semantic: Optional[Sequence[int]] = None, chunk_vectors=None,
+                lexical: bool = True, candidates: int = 30, rrf_k: int = 60, mmr_weight: float = 1.0) -> List[int]:
+    """The best chunk ids for a question, best first.
+
+    The BM25 ranking and the embedding ranking (semantic: chunk ids, best first) are fused with
+    reciprocal-rank fusion, then the top candidates are reranked with MMR so overlapping windows and
+    repeated passages don't crowd out other evidence. MMR compares chunk_vectors rows when given
+    (L2-normalised, so a dot product is the cosine), else the chunks' terms. If nothing matches at
+    all we fall back to the start of the document, which is usually where titles, abstracts and
+    summaries live.
+    """
+    rankings = []
+    if lexical:
+        rankings.append([idx for idx, _ in index.search(question, candidates)])
+    if semantic:
+        rankings.append(list(semantic)[:candidates])
+    fused = reciprocal_rank_fusion(rankings, rrf_k)[:candidates]
+    if not fused:
+        return list(range(min(top_k, len(index.chunks))))
+    ids = [idx for idx, _ in fused]
+    if mmr_weight >= 1 or len(ids) == 1:
+        return ids[:top_k]
+    if chunk_vectors is not None:
+        rows = np.asarray(chunk_vectors[ids], dtype=np.float32)
+        similarity = rows @ rows.T
+    else:
+        similarity = token_similarity([index.chunks[idx] for idx in ids])
+    return [ids[position] for position in mmr_select([score for _, score in fused], similarity, top_k, mmr_weight)]
@@ -0,0 +1,337 @@
+# Jo Jo's tidy-up crew – cascading deletes, orphan sweeps and retention, so disk use stays bounded. 🧹
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from page_store import partial_path_for
+from retrieval import index_path_for
+from uploads import content_lock
+from workers import run_io
+
+logger = logging.getLogger("uvicorn.error")
+
+KEYS_PER_QUERY = 25  # Content keys per documents lookup, so the or() filter keeps the URL short
+
+def content_key(path: str) -> str:
+    """The name stored artifacts share – the content hash for 'abc.pdf', 'abc.pages', 'abc.bm25.json' and vectors 'abc/'."""
+    name = os.path.basename(path.rstrip(os.sep))
+    return name.split(".", 1)[0] or name
+
+def path_size(path: str) -> int:
+    """Bytes on disk for a file, or everything under a folder. Missing paths count as nothing."""
+    if os.path.isdir(path):
+        total = 0
+        for folder, _, names in os.walk(path):
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(folder, name))
+                except OSError:
+                    pass
+        return total
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def remove_paths(paths: Iterable[str]) -> Tuple[int, int, List[str]]:
+    """Delete files and folders (blocking). Returns (removed, bytes freed, paths that couldn't be removed).
+
+    Paths that are already gone are skipped; anything else that fails is logged and reported.
+    """
+    removed, freed, failed = 0, 0, []
+    for path in paths:
+        size = path_size(path)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as oops:
+            logger.warning(f"(Jo Jo) Couldn't remove {path}: {oops}")
+            failed.append(path)
+            continue
+        removed += 1
+        freed += size
+    return removed, freed, failed
+
+class StorageCollector:
+    """Deletes documents with everything derived from them, and keeps the storage folders bounded.
+
+    Stored artifacts are shared between documents with the same content, so files are only removed
+    once no documents row points at them. Every removal happens under the content lock ingestion
+    uses, after re-checking the table, so a dedup racing with a delete never ends up pointing at
+    missing files.
+
+    A pass (run_once, every `interval` seconds once started) does three things, in batches:
+      1. removes orphans – files and vector folders no row refers to that are older than
+         min_orphan_age (younger ones may belong to an upload still being ingested);
+      2. deletes documents uploaded more than max_age_days ago;
+      3. deletes the oldest documents until the folders fit in max_bytes.
+    A limit of 0 switches that kind of retention off.
+    """
+
+    def __init__(self, get_client: Callable, upload_dir: str, text_dir: str, vector_store, min_orphan_age: float = 3600,
+                 max_age_days: float = 0, max_bytes: int = 0, batch_size: int = 100, interval: float = 3600,
+                 page_size: int = 1000, on_deleted: Callable[[List[int]], None] = lambda document_ids: None):
+        self.get_client = get_client
+        self.upload_dir = upload_dir
+        self.text_dir = text_dir
+        self.vector_store = vector_store
+        self.min_orphan_age = min_orphan_age
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.page_size = page_size
+        self.on_deleted = on_deleted
+        self._task: Optional[asyncio.Task] = None
+        self._pass_lock: Optional[asyncio.Lock] = None
+        self.passes = 0
+        self.documents_deleted = 0
+        self.files_removed = 0
+        self.bytes_freed = 0
+        self.failures = 0
+        self.last_pass: Optional[dict] = None
+
+    # --- Reading the documents table ---
+    def _list_documents(self) -> List[dict]:
+        """Every document's id, paths and upload date, oldest first, a page at a time (blocking)."""
+        rows: List[dict] = []
+        while True:
+            page = (self.get_client().table("documents").select("id, file_path, text_path, upload_date")
+                    .order("upload_date").order("id").range(len(rows), len(rows) + self.page_size - 1).execute().data or [])
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+
+    def _referenced_keys(self, keys: List[str]) -> Set[str]:
+        """Which content keys some documents row still uses (blocking). Rows are matched on file name, not on
+        the full path, so rows written with another UPLOAD_DIR or a relative path still count."""
+        client = self.get_client()
+        used: Set[str] = set()
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            patterns = [json.dumps(f"*{key}.*") for key in keys[start:start + KEYS_PER_QUERY]]
+            rows = (client.table("documents").select("file_path, text_path")
+                    .or_(",".join(f"{column}.like.{pattern}" for pattern in patterns for column in ("file_path", "text_path")))
+                    .execute().data or [])
+            used.update(content_key(path) for row in rows for path in (row.get("file_path"), row.get("text_path")) if path)
+        return used & set(keys)
+
+    def _artifacts(self, row: dict) -> List[str]:
+        """Everything stored for one document: the PDF, its text, the BM25 index and the vector folder – plus the
+        partial text and index of an ingestion that never finished."""
+        paths = [row.get("file_path")]
+        text_path = row.get("text_path")
+        if text_path:
+            partial_path = partial_path_for(text_path)
+            paths += [text_path, index_path_for(text_path), self.vector_store.path_for(os.path.splitext(os.path.basename(text_path))[0]),
+                      partial_path, index_path_for(partial_path)]
+        return [path for path in paths if path]
+
+    # --- Removing ---
+    async def _remove_unreferenced(self, groups: Dict[str, List[str]]) -> Tuple[int, int, List[str]]:
+        """Remove each group of paths unless a documents row still uses its content key. Locks a batch of keys at a time."""
+        removed, freed, failed = 0, 0, []
+        keys = sorted(groups)
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            async with AsyncExitStack() as stack:
+                for key in batch:  # Always in sorted order, so two removers can't deadlock
+                    await stack.enter_async_context(content_lock(key))
+                still_used = await run_io(self._referenced_keys, batch)
+                paths = [path for key in batch if key not in still_used for path in groups[key]]
+                batch_removed, batch_freed, batch_failed = await run_io(self._remove, paths)
+            removed, freed, failed = removed + batch_removed, freed + batch_freed, failed + batch_failed
+        self.files_removed += removed
+        self.bytes_freed += freed
+        self.failures += len(failed)
+        return removed, freed, failed
+
+    def _remove(self, paths: List[str]) -> Tuple[int, int, List[str]]:
+        """remove_paths, except vector folders go through the vector store so it drops its open maps too (blocking)."""
+        vector_folders = [path for path in paths if os.path.dirname(path) == self.vector_store.root]
+        removed, freed, failed = remove_paths([path for path in paths if path not in vector_folders])
+        for folder in vector_folders:
+            if not os.path.exists(folder):
+                continue
+            size = path_size(folder)
+            self.vector_store.delete(os.path.basename(folder))
+            if os.path.exists(folder):
+                logger.warning(f"(Jo Jo) Couldn't remove {folder}")
+                failed.append(folder)
+            else:
+                removed, freed = removed + 1, freed + size
+        return removed, freed, failed
+
+    def _delete_rows(self, document_ids: List[int]) -> None:
+        """Rows that point at these documents go first (cached answers, then chat sessions), then the documents (blocking)."""
+        client = self.get_client()
+        client.table("llm_cache").delete().in_("document_id", document_ids).execute()
+        session_ids = [row["id"] for row in client.table("chat_sessions").select("id").in_("document_id", document_ids).execute().data or []]
+        if session_ids:
+            client.table("messages").delete().in_("session_id", session_ids).execute()
+            client.table("chat_sessions").delete().in_("id", session_ids).execute()
+        client.table("documents").delete().in_("id", document_ids).execute()
+
+    async def delete_documents(self, rows: List[dict]) -> dict:
+        """Delete documents and their chats, then every file of theirs that no other document shares."""
+        removed, freed, failed = 0, 0, []
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            document_ids = [row["id"] for row in batch]
+            await run_io(self._delete_rows, document_ids)
+            self.documents_deleted += len(document_ids)
+            self.on_deleted(document_ids)
+            groups: Dict[str, List[str]] = {}
+            for row in batch:
+                for path in self._artifacts(row):
+                    groups.setdefault(content_key(path), []).append(path)
+            batch_removed, batch_freed, batch_failed = await self._remove_unreferenced(groups)
+            removed, freed, failed = removed + batch_removed, freed + batch_freed, failed + batch_failed
+        return {"documents": len(rows), "files_removed": removed, "bytes_freed": freed, "failed": failed}
+
+    # --- The background pass ---
+    def _stored_paths_by_folder(self) -> Dict[str, List[str]]:
+        """Every file in the upload and text folders and every vector folder, by the folder they're in (blocking)."""
+        stored = {}
+        for folder in (self.upload_dir, self.text_dir):
+            if os.path.isdir(folder):
+                stored[folder] = [os.path.join(folder, name) for name in os.listdir(folder) if os.path.isfile(os.path.join(folder, name))]
+        stored[self.vector_store.root] = [self.vector_store.path_for(key) for key in self.vector_store.keys()]
+        return stored
+
+    def _stored_paths(self) -> List[str]:
+        return [path for paths in self._stored_paths_by_folder().values() for path in paths]
+
+    def _find_orphans(self, rows: List[dict]) -> Dict[str, List[str]]:
+        """Stored paths whose content key no row uses and old enough not to belong to an ingestion in progress (blocking).
+
+        A folder that none of the rows resolve into is left alone: that's what it looks like when
+        UPLOAD_DIR or TEXT_DIR has moved, or the rows were written with other paths, and sweeping it
+        would delete live files.
+        """
+        referenced = {content_key(path) for row in rows for path in (row.get("file_path"), row.get("text_path")) if path}
+        cutoff = time.time() - self.min_orphan_age
+        groups: Dict[str, List[str]] = {}
+        candidates = []
+        for folder, paths in self._stored_paths_by_folder().items():
+            if paths and not any(content_key(path) in referenced for path in paths):
+                logger.warning(f"(Jo Jo) None of the {len(rows)} documents rows resolve into {folder}; not sweeping it for orphans")
+                continue
+            candidates += paths
+        for path in candidates:
+            if content_key(path) in referenced:
+                continue
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            groups.setdefault(content_key(path), []).append(path)
+        return groups
+
+    def _over_age(self, rows: List[dict]) -> List[dict]:
+        if self.max_age_days <= 0:
+            return []
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.max_age_days)
+        return [row for row in rows if row.get("upload_date") and _as_utc(row["upload_date"]) < cutoff]
+
+    def _over_budget(self, rows: List[dict]) -> List[dict]:
+        """The oldest documents whose removal brings the folders back under max_bytes (blocking)."""
+        if self.max_bytes <= 0:
+            return []
+        usage = sum(path_size(path) for path in self._stored_paths())
+        if usage <= self.max_bytes:
+            return []
+        users: Dict[str, int] = {}
+        for row in rows:
+            for key in {content_key(path) for path in self._artifacts(row)}:
+                users[key] = users.get(key, 0) + 1
+        victims = []
+        for row in rows:  # Oldest first
+            if usage <= self.max_bytes:
+                break
+            victims.append(row)
+            for key, paths in _grouped(self._artifacts(row)).items():
+                users[key] -= 1
+                if users[key] == 0:  # Shared content only frees space once its last document goes
+                    usage -= sum(path_size(path) for path in paths)
+        return victims
+
+    async def run_once(self) -> dict:
+        """One full pass: orphans, then age retention, then the byte budget."""
+        if self._pass_lock is None:
+            self._pass_lock = asyncio.Lock()
+        async with self._pass_lock:
+            started = time.perf_counter()
+            rows = await run_io(self._list_documents)
+            orphans = await run_io(self._find_orphans, rows)
+            orphans_removed, orphan_bytes, orphan_failed = await self._remove_unreferenced(orphans)
+            expired = self._over_age(rows)
+            expired_result = await self.delete_documents(expired)
+            expired_ids = {row["id"] for row in expired}
+            remaining = [row for row in rows if row["id"] not in expired_ids]
+            over_budget = await run_io(self._over_budget, remaining)
+            budget_result = await self.delete_documents(over_budget)
+            self.passes += 1
+            self.last_pass = {
+                "orphans_removed": orphans_removed,
+                "orphan_bytes_freed": orphan_bytes,
+                "expired_documents": len(expired),
+                "over_budget_documents": len(over_budget),
+                "bytes_freed": orphan_bytes + expired_result["bytes_freed"] + budget_result["bytes_freed"],
+                "failed": orphan_failed + expired_result["failed"] + budget_result["failed"],
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+            }
+        if self.last_pass["bytes_freed"] or self.last_pass["failed"]:
+            logger.info(f"(Jo Jo) Storage GC: {self.last_pass}")
+        return self.last_pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.error("(Jo Jo) Storage GC pass crashed; will try again next time", exc_info=True)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "passes": self.passes,
+            "documents_deleted": self.documents_deleted,
+            "files_removed": self.files_removed,
+            "bytes_freed": self.bytes_freed,
+            "failures": self.failures,
+            "last_pass": self.last_pass,
+        }
+
+def _grouped(paths: List[str]) -> Dict[str, List[str]]:
+    groups: Dict[str, List[str]] = {}
+    for path in paths:
+        groups.setdefault(content_key(path), []).append(path)
+    return groups
+
+def _as_utc(timestamp: str) -> datetime:
+    """Parse upload_date – rows written with utcnow() have no offset, so naive times are UTC."""
+    parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
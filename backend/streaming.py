@@ -0,0 +1,31 @@
+# Jo Jo's streaming helpers – answers trickle out as server-sent events while Gemini is still writing. 📡
+
+import json
+import logging
+from typing import AsyncIterator, Optional
+
+from workers import iterate_in_thread
+
+logger = logging.getLogger("uvicorn.error")
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one server-sent event. Data is JSON so newlines inside tokens survive the trip."""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text or ""
+    except ValueError:
+        # Gemini raises on chunks without text parts (e.g. a safety stop); there's nothing to forward
+        return ""
+
+async def stream_llm_text(llm, prompt: str) -> AsyncIterator[str]:
+    """Yield text pieces from the model's streaming generation without blocking the event loop."""
+    async for chunk in iterate_in_thread(lambda: llm.generate_content(prompt, stream=True)):
+        text = _chunk_text(chunk)
+        if text:
+            yield text
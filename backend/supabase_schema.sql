@@ -49,8 +49,11 @@ CREATE TABLE IF NOT EXISTS public.llm_cache (
     document_id BIGINT REFERENCES public.documents(id),
     question TEXT,
     answer TEXT,
+    cache_key TEXT, -- sha256 of document id, model, prompt version and normalized question
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
+ALTER TABLE public.llm_cache ADD COLUMN IF NOT EXISTS cache_key TEXT;
+CREATE INDEX IF NOT EXISTS llm_cache_cache_key_idx ON public.llm_cache (cache_key, created_at DESC);
 
 -- Exports
 CREATE TABLE IF NOT EXISTS public.exports (
@@ -71,4 +74,16 @@ CREATE TABLE IF NOT EXISTS public.analytics (
     question_id BIGINT REFERENCES public.messages(id),
     response_time_ms INT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-); 
\ No newline at end of file
+); 
+-- Indexes for history paging (documents, sessions per document, messages per session)
+CREATE INDEX IF NOT EXISTS documents_upload_date_idx ON public.documents (upload_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS chat_sessions_document_created_idx ON public.chat_sessions (document_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS messages_session_created_idx ON public.messages (session_id, created_at, id);
+-- Conversation memory: older turns of a session folded into a running summary
+ALTER TABLE public.chat_sessions ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE public.chat_sessions ADD COLUMN IF NOT EXISTS summarized_turns INT DEFAULT 0;
+-- Progressive ingestion: long PDFs are answerable once their first pages are extracted
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS pages_ready INT;
+-- History ETags: bumped whenever a documents row is written, so in-place progress updates are seen
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS documents_updated_at_idx ON public.documents (updated_at DESC, id DESC);
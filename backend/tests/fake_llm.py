@@ -0,0 +1,70 @@
+# A stand-in for genai.GenerativeModel with controllable latency, for tests and benchmarks.
+
+import threading
+import time
+from typing import Callable, Optional
+
+class FakeLLMResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeLLM:
+    """Answers every prompt with `answer` (or answer_fn(prompt)) after `latency` seconds.
+
+    With stream=True the answer is yielded in pieces of `chunk_chars`, the first after
+    `first_token_latency` seconds and the rest spread over the remaining latency.
+    """
+
+    def __init__(self, answer: str = "Jo Jo says: the answer is in the document.", latency: float = 0.0,
+                 first_token_latency: Optional[float] = None, chunk_chars: int = 8,
+                 answer_fn: Optional[Callable[[str], str]] = None):
+        self.answer = answer
+        self.latency = latency
+        self.first_token_latency = latency / 4 if first_token_latency is None else first_token_latency
+        self.chunk_chars = chunk_chars
+        self.answer_fn = answer_fn
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self) -> int:
+        return len(self.prompts)
+
+    def _answer_for(self, prompt: str) -> str:
+        return self.answer_fn(prompt) if self.answer_fn else self.answer
+
+    def _enter(self, prompt: str) -> None:
+        with self._lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _exit(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._stream(prompt)
+        self._enter(prompt)
+        try:
+            time.sleep(self.latency)
+            return FakeLLMResponse(self._answer_for(prompt))
+        finally:
+            self._exit()
+
+    def _stream(self, prompt: str):
+        self._enter(prompt)
+        try:
+            answer = self._answer_for(prompt)
+            pieces = [answer[i:i + self.chunk_chars] for i in range(0, len(answer), self.chunk_chars)] or [""]
+            time.sleep(self.first_token_latency)
+            gap = max(0.0, self.latency - self.first_token_latency) / max(1, len(pieces) - 1)
+            for position, piece in enumerate(pieces):
+                if position:
+                    time.sleep(gap)
+                yield FakeLLMResponse(piece)
+        finally:
+            self._exit()
@@ -0,0 +1,216 @@
+# An in-memory stand-in for the bits of the Supabase table API the backend uses.
+
+import itertools
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+        self.error = None
+        self.status_code = 200
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table_name = table
+        self.operation = "select"
+        self.columns = "*"
+        self.count_mode = None
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.row_offset = 0
+        self.single = False
+
+    def select(self, columns="*", count=None):
+        self.columns = columns
+        self.count_mode = count
+        return self
+
+    def insert(self, payload):
+        self.operation = "insert"
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.operation = "upsert"
+        self.payload = payload
+        self.on_conflict = on_conflict or "id"
+        return self
+
+    def update(self, payload):
+        self.operation = "update"
+        self.payload = payload
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def _filter(self, predicate):
+        self.filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) < value)
+
+    def lte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) <= value)
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) > value)
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) >= value)
+
+    def is_(self, column, value):
+        expected = None if value in (None, "null") else value
+        return self._filter(lambda row: row.get(column) is expected)
+
+    def or_(self, expression):
+        # Supports the "and(a.eq.x,b.lt.y),a.lt.x" shape used for keyset pagination
+        clauses = _split_top_level(expression)
+        predicates = [_parse_clause(clause) for clause in clauses]
+        return self._filter(lambda row: any(predicate(row) for predicate in predicates))
+
+    def order(self, column, desc=False, nullsfirst=None):
+        self.orders.append((column, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def range(self, start, end):
+        self.row_offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def maybe_single(self):
+        self.single = True
+        return self
+
+    def execute(self):
+        self.db.calls[self.table_name] += 1
+        if self.db.latency:
+            time.sleep(self.db.latency)  # Pretend to be a network round trip away
+        with self.db.lock:
+            return self._execute()
+
+    def _execute(self):
+        rows = self.db.tables[self.table_name]
+        if self.operation in ("insert", "upsert"):
+            items = self.payload if isinstance(self.payload, list) else [self.payload]
+            stored = []
+            for item in items:
+                if self.operation == "upsert":
+                    keys = [key.strip() for key in self.on_conflict.split(",")]
+                    existing = next((row for row in rows if all(row.get(k) == item.get(k) for k in keys)), None)
+                    if existing is not None:
+                        existing.update(item)
+                        stored.append(dict(existing))
+                        continue
+                row = dict(item)
+                row.setdefault("id", next(self.db.ids[self.table_name]))
+                row.setdefault("created_at", self.db.now())
+                rows.append(row)
+                stored.append(dict(row))
+            return FakeResponse(stored)
+        matched = [row for row in rows if all(predicate(row) for predicate in self.filters)]
+        if self.operation == "delete":
+            self.db.tables[self.table_name] = [row for row in rows if row not in matched]
+            return FakeResponse([dict(row) for row in matched])
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.payload)
+            return FakeResponse([dict(row) for row in matched])
+        for column, desc, nulls_first in reversed(self.orders):
+            present = [row for row in matched if row.get(column) is not None]
+            present.sort(key=lambda row: row[column], reverse=desc)
+            missing = [row for row in matched if row.get(column) is None]
+            matched = missing + present if nulls_first else present + missing
+        total = len(matched)
+        matched = matched[self.row_offset:]
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        if self.columns.strip() != "*":
+            wanted = [column.strip() for column in self.columns.split(",")]
+            matched = [{column: row.get(column) for column in wanted} for row in matched]
+        else:
+            matched = [dict(row) for row in matched]
+        if self.single:
+            return FakeResponse(matched[0]) if matched else None
+        return FakeResponse(matched, total if self.count_mode else None)
+
+def _split_top_level(expression):
+    parts, depth, current = [], 0, ""
+    for char in expression:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+def _parse_clause(clause):
+    if clause.startswith("and(") and clause.endswith(")"):
+        predicates = [_parse_clause(part) for part in _split_top_level(clause[4:-1])]
+        return lambda row: all(predicate(row) for predicate in predicates)
+    column, operator, raw = clause.split(".", 2)
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        raw = raw[1:-1]
+
+    def coerce(row_value):
+        if isinstance(row_value, int) and not isinstance(row_value, bool):
+            return int(raw)
+        return raw
+
+    comparisons = {
+        "eq": lambda a, b: a == b,
+        "lt": lambda a, b: a < b,
+        "lte": lambda a, b: a <= b,
+        "gt": lambda a, b: a > b,
+        "gte": lambda a, b: a >= b,
+        "like": lambda a, b: re.fullmatch("".join(".*" if char in "*%" else "." if char == "_" else re.escape(char) for char in b), str(a)) is not None,
+    }
+    compare = comparisons[operator]
+    return lambda row: row.get(column) is not None and compare(row.get(column), coerce(row.get(column)))
+
+class FakeSupabase:
+    """Tables are plain lists of dicts; ids and created_at are filled in like Postgres defaults would.
+
+    Set `latency` to make every call sleep that long, like a round trip to a real Supabase.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables = defaultdict(list)
+        self.ids = defaultdict(lambda: itertools.count(1))
+        self.calls = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def now(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
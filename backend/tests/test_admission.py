@@ -0,0 +1,138 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from admission import AdmissionController, AdmissionRejected, TokenBucket
+from fake_supabase import FakeSupabase
+
+USER = "7d0c6a44-5a4e-4f5e-9d43-3a3c5b7f2a10"
+
+def today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    for _ in range(3):
+        assert bucket.wait_time(0.0) == 0
+        bucket.take(0.0)
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.5) == 0
+    assert bucket.full(10.0)
+
+def test_burst_from_one_ip_is_limited_without_touching_others():
+    admission = AdmissionController(lambda: FakeSupabase(), ip_rate=1.0, ip_burst=3)
+
+    async def scenario():
+        for _ in range(3):
+            admission.release(await admission.admit(None, "10.0.0.1"))
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.admit(None, "10.0.0.1")
+        admission.release(await admission.admit(None, "10.0.0.2"))
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "rate_limited" and rejected.retry_after_header == "1"
+    assert admission.stats()["rejected"] == {"rate_limited": 1} and admission.stats()["admitted"] == 4
+
+def test_questions_past_the_in_flight_cap_are_turned_away_at_once():
+    admission = AdmissionController(lambda: FakeSupabase(), max_in_flight=2)
+
+    async def scenario():
+        first = await admission.admit(None, "a")
+        await admission.admit(None, "b")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.admit(None, "c")
+        admission.release(first)
+        admission.release(first)  # Releasing twice is harmless
+        await admission.admit(None, "c")
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "overloaded" and int(rejected.retry_after_header) >= 1
+    assert admission.in_flight == 2
+
+def test_daily_quota_is_enforced_and_synced_in_batches():
+    db = FakeSupabase()
+    db.tables["users"].append({"id": USER, "daily_quota": 5, "questions_asked_today": 2, "last_quota_reset": f"{today()}T00:00:00+00:00"})
+    admission = AdmissionController(lambda: db, user_burst=100, ip_burst=100)
+
+    async def scenario():
+        for _ in range(3):
+            admission.release(await admission.admit(USER, "10.0.0.1"))
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.admit(USER, "10.0.0.1")
+        calls_before_sync = db.calls["users"]
+        await admission.sync()
+        return rejected.value, calls_before_sync
+
+    rejected, calls_before_sync = asyncio.run(scenario())
+    assert rejected.reason == "quota" and int(rejected.retry_after_header) > 0
+    assert calls_before_sync == 1  # One read for the user, nothing written per question
+    assert db.calls["users"] == 3  # One read and one update for the whole batch
+    assert db.tables["users"][0]["questions_asked_today"] == 5
+    assert admission.stats()["pending_usage"] == 0
+
+def test_yesterdays_count_resets_and_unknown_users_never_get_a_row():
+    db = FakeSupabase()
+    db.tables["users"].append({"id": USER, "daily_quota": 1, "questions_asked_today": 1, "last_quota_reset": "2001-01-01T00:00:00+00:00"})
+    newcomer = "00000000-0000-4000-8000-000000000001"
+    admission = AdmissionController(lambda: db, default_daily_quota=2)
+
+    async def scenario():
+        admission.release(await admission.admit(USER, "10.0.0.1"))
+        for _ in range(2):
+            admission.release(await admission.admit(newcomer, "10.0.0.1"))
+        await admission.sync()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.admit(newcomer, "10.0.0.1")
+        return rejected.value
+
+    assert asyncio.run(scenario()).reason == "quota"  # Still counted, just not saved
+    rows = {row["id"]: row for row in db.tables["users"]}
+    assert rows[USER]["questions_asked_today"] == 1 and rows[USER]["last_quota_reset"] == today()
+    assert list(rows) == [USER]
+
+def test_overloaded_requests_are_turned_away_before_any_quota_read():
+    db = FakeSupabase()
+    admission = AdmissionController(lambda: db, max_in_flight=1)
+
+    async def scenario():
+        await admission.admit(None, "10.0.0.1")
+        for n in range(20):
+            with pytest.raises(AdmissionRejected):
+                await admission.admit(f"00000000-0000-4000-8000-{n:012d}", "10.0.0.1")
+
+    asyncio.run(scenario())
+    assert db.calls["users"] == 0 and admission.stats()["users"] == 0
+
+def test_remembered_users_are_bounded_but_unsaved_counts_are_kept():
+    db = FakeSupabase()
+    db.tables["users"].append({"id": USER, "daily_quota": 50, "questions_asked_today": 0, "last_quota_reset": today()})
+    admission = AdmissionController(lambda: db, max_users=3, user_burst=100)
+
+    async def scenario():
+        admission.release(await admission.admit(USER, "10.0.0.1"))
+        for n in range(10):
+            admission.release(await admission.admit(f"00000000-0000-4000-8000-{n:012d}", "10.0.0.1"))
+        assert admission.stats()["users"] == 3
+        assert admission.stats()["pending_usage"] == 1  # USER's unsaved question kept them from being dropped
+        await admission.sync()
+        admission.release(await admission.admit("00000000-0000-4000-8000-999999999999", "10.0.0.1"))
+
+    asyncio.run(scenario())
+    assert admission.stats()["users"] == 3 and admission.stats()["pending_usage"] == 0
+    assert db.tables["users"][0]["questions_asked_today"] == 1
+
+def test_a_zero_rate_turns_that_limit_off():
+    admission = AdmissionController(lambda: FakeSupabase(), ip_rate=0, ip_burst=1, user_rate=0, user_burst=1)
+
+    async def scenario():
+        for _ in range(50):
+            admission.release(await admission.admit(USER, "10.0.0.1"))
+
+    asyncio.run(scenario())
+    assert admission.stats()["admitted"] == 50 and not admission.stats()["rejected"]
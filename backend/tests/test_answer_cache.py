@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from answer_cache import AnswerCache, normalize_question
+from fake_supabase import FakeSupabase
+
+def make_cache(db, **kwargs):
+    return AnswerCache(lambda: db, "gemini-test", "1", **kwargs)
+
+def test_normalize_question_folds_case_punctuation_and_spaces():
+    assert normalize_question("  What's the   WARRANTY?? ") == normalize_question("what s the warranty")
+
+def test_memory_then_table_then_miss():
+    db = FakeSupabase()
+    cache = make_cache(db)
+    assert cache.get_local(1, "Reset?") is None
+    assert cache.get_remote(1, "Reset?") is None
+    cache.put(1, "Reset?", "Hold the button.")
+    assert cache.get_local(1, "reset") == "Hold the button."
+    assert db.tables["llm_cache"][0]["question"] == "reset"
+
+    fresh = make_cache(db)  # Another worker: empty memory, same table
+    assert fresh.get_local(1, "RESET") is None
+    assert fresh.get_remote(1, "RESET") == "Hold the button."
+    assert fresh.get_local(1, "RESET") == "Hold the button."
+    assert fresh.stats()["memory_hits"] == 1 and fresh.stats()["table_hits"] == 1
+
+def test_model_and_prompt_version_are_part_of_the_key():
+    db = FakeSupabase()
+    make_cache(db).put(1, "Reset?", "old answer")
+    newer = AnswerCache(lambda: db, "gemini-test", "2")
+    assert newer.get_remote(1, "Reset?") is None
+    assert make_cache(db).get_remote(2, "Reset?") is None
+
+def test_lru_bound_and_ttl():
+    db = FakeSupabase()
+    cache = make_cache(db, max_entries=2)
+    for n in range(3):
+        cache.put(1, f"question {n}", f"answer {n}")
+    assert cache.get_local(1, "question 0") is None
+    assert cache.stats()["entries"] == 2
+    expired = make_cache(db, ttl_seconds=-1)
+    expired.put(1, "q", "a")
+    assert expired.get_local(1, "q") is None
+
+def test_table_errors_fail_open():
+    class Broken:
+        def table(self, name):
+            raise RuntimeError("supabase is down")
+
+    cache = AnswerCache(lambda: Broken(), "gemini-test", "1")
+    assert cache.get_remote(1, "q") is None
+    cache.put(1, "q", "a")
+    assert cache.get_local(1, "q") == "a"
@@ -0,0 +1,196 @@
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.run_benchmarks import prepare_environment
+from fake_llm import FakeLLM
+from fake_supabase import FakeSupabase
+from metrics import TimedSupabase
+from pdf_factory import make_pdf
+
+PDF = make_pdf([f"Page {n}: the parrot eats seed type {n}." for n in range(1, 6)])
+
+def load_app():
+    """api.index, imported once per test run – in throwaway folders, with nothing reaching a real service."""
+    if "api.index" not in sys.modules:
+        prepare_environment(tempfile.mkdtemp(prefix="jojo-api-tests-"))
+        if "config" in sys.modules:
+            importlib.reload(sys.modules["config"])  # An earlier test may have read the real settings already
+    import api.index as app_module
+    return app_module
+
+@pytest.fixture
+def api():
+    app_module = load_app()
+    db = FakeSupabase()
+    app_module.supabase = TimedSupabase(lambda: db)
+    app_module.llm = None
+    for cache in (app_module.document_cache, app_module.answer_cache, app_module.conversations):
+        cache.clear()
+    with TestClient(app_module.app) as client:
+        yield SimpleNamespace(client=client, db=db, app=app_module)
+
+def wait_for_job(client, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} never finished")
+
+def upload_document(api) -> int:
+    return api.client.post("/api/upload?wait=true", files=[("files", ("birds.pdf", PDF, "application/pdf"))]).json()[0]["document_id"]
+
+def stream_events(response) -> list:
+    """(event, data) pairs from a server-sent event stream."""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def eventually(check, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "gave up waiting"
+        time.sleep(0.02)
+
+def test_uploads_return_jobs_at_once_and_the_jobs_endpoints_follow_them(api):
+    response = api.client.post("/api/upload", files=[("files", ("birds.pdf", PDF, "application/pdf")),
+                                                     ("files", ("notes.txt", b"hello", "text/plain"))])
+    assert response.status_code == 200
+    queued, refused = response.json()
+    assert queued["status"] in ("queued", "running") and queued["filename"] == "birds.pdf"
+    assert "error" in refused and "job_id" not in refused
+
+    job = wait_for_job(api.client, queued["job_id"])
+    assert job["status"] == "succeeded" and job["stage"] == "done" and job["error"] is None
+    assert job["result"]["document_id"] == api.db.tables["documents"][0]["id"]
+    assert {"queued", "extracting"} <= set(job["stage_seconds"])
+
+    batch = api.client.get(f"/api/jobs?ids={queued['job_id']},not-a-job")
+    assert batch.status_code == 200 and [entry["job_id"] for entry in batch.json()] == [queued["job_id"]]
+    assert api.client.get("/api/jobs/not-a-job").status_code == 404
+
+def test_a_broken_pdf_fails_its_job_with_the_reason(api):
+    queued = api.client.post("/api/upload", files=[("files", ("broken.pdf", b"%PDF-1.4 not really", "application/pdf"))]).json()[0]
+    job = wait_for_job(api.client, queued["job_id"])
+    assert job["status"] == "failed" and job["error"] and job["result"] is None
+    assert api.db.tables["documents"] == []
+
+def add_documents(db, count: int) -> None:
+    for n in range(count):
+        stamp = f"2026-01-{n + 1:02d}T10:00:00+00:00"
+        db.tables["documents"].append({"id": n + 1, "filename": f"doc{n + 1}.pdf", "file_path": f"/u/{n + 1}.pdf", "text_path": f"/t/{n + 1}.pages",
+                                       "upload_date": stamp, "updated_at": stamp, "metadata": "{}"})
+
+def test_history_answers_304_until_a_document_changes(api):
+    add_documents(api.db, 3)
+    first = api.client.get("/api/history")
+    assert first.status_code == 200 and len(first.json()) == 3
+    etag = first.headers["ETag"]
+    unchanged = api.client.get("/api/history", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b"" and unchanged.headers["ETag"] == etag
+    api.db.tables["documents"][0]["updated_at"] = "2026-02-01T00:00:00+00:00"  # Say, its pages finished
+    changed = api.client.get("/api/history", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+def test_history_pages_follow_the_cursor_and_bad_cursors_are_refused(api):
+    add_documents(api.db, 5)
+    ids, cursor = [], None
+    while True:
+        response = api.client.get("/api/history", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200 and len(response.json()) <= 2
+        ids += [document["id"] for document in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert ids == ["5", "4", "3", "2", "1"]
+    assert api.client.get("/api/history", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert api.client.get("/api/history", params={"fields": "filename,secrets"}).status_code == 400
+
+def test_history_fields_trim_rows_and_the_schema_allows_it(api):
+    add_documents(api.db, 2)
+    rows = api.client.get("/api/history", params={"fields": "filename"}).json()
+    assert rows == [{"id": "2", "filename": "doc2.pdf", "upload_date": "2026-01-02T10:00:00+00:00"},
+                    {"id": "1", "filename": "doc1.pdf", "upload_date": "2026-01-01T10:00:00+00:00"}]
+    schema = api.client.get("/openapi.json").json()["components"]["schemas"]["DocumentResponse"]
+    assert set(schema["required"]) == {"id", "upload_date"}
+
+def test_a_finished_stream_saves_its_messages(api):
+    document_id = upload_document(api)
+    api.app.llm = FakeLLM(answer="Parrots eat seed type 3.")
+    response = api.client.post("/api/ask/stream", json={"document_id": document_id, "question": "What do parrots eat?"})
+    events = stream_events(response)
+    assert [name for name, _ in events][0] == "start" and events[-1][0] == "done"
+    assert "".join(data["text"] for name, data in events if name == "token") == "Parrots eat seed type 3."
+    session_id = events[-1][1]["session_id"]
+    sessions = api.client.get(f"/api/history/{document_id}").json()
+    assert [session["id"] for session in sessions] == [session_id]
+    assert [(message["role"], message["content"]) for message in sessions[0]["messages"]] == [
+        ("user", "What do parrots eat?"), ("assistant", "Parrots eat seed type 3.")]
+
+def test_a_stream_that_fails_leaves_no_empty_session(api):
+    document_id = upload_document(api)
+
+    def broken(prompt):
+        raise RuntimeError("Gemini fell over")
+
+    api.app.llm = FakeLLM(answer_fn=broken)
+    events = stream_events(api.client.post("/api/ask/stream", json={"document_id": document_id, "question": "What do parrots eat?"}))
+    assert events[-1][0] == "error" and "Gemini fell over" in events[-1][1]["detail"]
+    eventually(lambda: api.db.tables["chat_sessions"] == [])
+    assert api.db.tables["messages"] == []
+
+def test_deleting_a_document_needs_the_secret_and_an_existing_row(api):
+    document_id = upload_document(api)
+    assert api.client.delete(f"/api/documents/{document_id}", params={"secret": "guess"}).status_code == 403
+    assert api.client.delete(f"/api/documents/{document_id}").status_code == 422
+    assert api.client.delete("/api/documents/999", params={"secret": "admin123"}).status_code == 404
+    assert [row["id"] for row in api.db.tables["documents"]] == [document_id]
+
+def test_shared_files_outlive_a_deleted_duplicate(api):
+    pdf = make_pdf([f"Page {n}: the toucan hides fruit number {n}." for n in range(1, 4)])
+    first, second = [api.client.post("/api/upload?wait=true", files=[("files", (f"toucan{n}.pdf", pdf, "application/pdf"))]).json()[0]
+                     for n in (1, 2)]
+    row = next(row for row in api.db.tables["documents"] if row["id"] == first["document_id"])
+    shared = [row["file_path"], row["text_path"]]
+    assert second["text_path"] == row["text_path"]  # Same content, one copy on disk
+    asked = api.client.post("/api/ask", json={"document_id": first["document_id"], "question": "Where is the fruit?"}).json()
+
+    deleted = api.client.delete(f"/api/documents/{first['document_id']}", params={"secret": "admin123"})
+    assert deleted.status_code == 200 and deleted.json()["files_removed"] == 0
+    assert all(os.path.exists(path) for path in shared)
+    assert [row["id"] for row in api.db.tables["documents"]] == [second["document_id"]]
+    assert all(session["id"] != asked["session_id"] for session in api.db.tables["chat_sessions"])
+    assert api.client.post("/api/ask", json={"document_id": second["document_id"], "question": "Where is the fruit?"}).status_code == 200
+
+    deleted = api.client.delete(f"/api/documents/{second['document_id']}", params={"secret": "admin123"})
+    assert deleted.status_code == 200 and deleted.json()["files_removed"] >= 2
+    assert not any(os.path.exists(path) for path in shared)
+
+def test_follow_ups_need_a_session_about_the_same_document(api):
+    birds = upload_document(api)
+    other_pdf = make_pdf([f"Page {n}: the gecko climbs wall number {n}." for n in range(1, 4)])
+    geckos = api.client.post("/api/upload?wait=true", files=[("files", ("geckos.pdf", other_pdf, "application/pdf"))]).json()[0]["document_id"]
+    api.app.llm = FakeLLM(answer="Seed type 3.")
+    session_id = api.client.post("/api/ask", json={"document_id": birds, "question": "What do parrots eat?"}).json()["session_id"]
+
+    follow_up = api.client.post("/api/ask", json={"document_id": birds, "question": "And on page 4?", "session_id": session_id})
+    assert follow_up.status_code == 200 and follow_up.json()["session_id"] == session_id
+    assert "What do parrots eat?" in api.app.llm.prompts[-1]
+    for endpoint in ("/api/ask", "/api/ask/stream"):
+        unknown = api.client.post(endpoint, json={"document_id": birds, "question": "Hm?", "session_id": 999})
+        assert unknown.status_code == 404
+        elsewhere = api.client.post(endpoint, json={"document_id": geckos, "question": "Hm?", "session_id": session_id})
+        assert elsewhere.status_code == 400 and str(session_id) in elsewhere.json()["detail"]
+    assert [session["id"] for session in api.db.tables["chat_sessions"]] == [session_id]
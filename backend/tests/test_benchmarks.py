@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.run_benchmarks import parse_args, percentile, summarize
+
+def test_percentile_interpolates_between_ranks():
+    values = [0.1, 0.2, 0.3, 0.4]
+    assert percentile(values, 0) == 0.1
+    assert percentile(values, 100) == 0.4
+    assert abs(percentile(values, 50) - 0.25) < 1e-9
+    assert percentile([], 95) == 0.0
+
+def test_summary_reports_latency_percentiles_and_throughput():
+    row = summarize("ask", 4, [0.01] * 98 + [0.5, 1.0], errors=2, wall_seconds=2.0)
+    assert row["requests"] == 102 and row["errors"] == 2
+    assert row["p50_ms"] == 10.0
+    assert row["p99_ms"] > row["p95_ms"]
+    assert row["throughput_rps"] == 50.0
+
+def test_arguments_parse_lists_and_reject_unknown_scenarios():
+    args = parse_args(["--concurrency", "2,16", "--scenarios", "ask,history"])
+    assert args.concurrency == [2, 16] and args.scenarios == ["ask", "history"]
+    try:
+        parse_args(["--scenarios", "teleport"])
+    except SystemExit:
+        pass
+    else:
+        raise AssertionError("unknown scenario should be rejected")
@@ -0,0 +1,82 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from context_prep import clean_chunk, collapse_whitespace, estimate_tokens, find_boilerplate, prepare_context, prepare_sources
+from retrieval import build_index, load_or_build_index
+
+def make_document(pages: int = 6) -> str:
+    body = [
+        f"ACME Widget Manual\nChapter {n // 2 + 1}\nSection {n} explains   how widget part number {n * 7} is fitted.\n"
+        f"Keep the widget dry.\nPage {n + 1} of {pages}\nConfidential"
+        for n in range(pages)
+    ]
+    return "\f".join(body)
+
+def test_find_boilerplate_catches_running_headers_footers_and_page_numbers():
+    boilerplate = find_boilerplate(make_document())
+    assert "acme widget manual" in boilerplate
+    assert "page # of #" in boilerplate
+    assert "confidential" in boilerplate
+    assert not any(key.startswith("section") for key in boilerplate)  # Differs on every page
+    assert find_boilerplate("one page\fand another") == []  # Too few pages to tell
+    numbered_content = "\f".join(f"Page {n}: the parrot eats seed type {n}." for n in range(10))
+    assert find_boilerplate(numbered_content) == []  # Only numbers differ, but these are sentences
+
+def test_body_lines_repeated_mid_page_are_kept():
+    pages = [f"Header\nintro {n}\n" + "\n".join(f"line {n}-{k}" for k in range(4)) + "\nKeep the widget dry.\n"
+             + "\n".join(f"more {n}-{k}" for k in range(4)) + "\nFooter" for n in range(5)]
+    boilerplate = find_boilerplate("\f".join(pages))
+    assert "header" in boilerplate and "footer" in boilerplate
+    assert "keep the widget dry." not in boilerplate
+
+def test_clean_chunk_strips_boilerplate_and_collapses_whitespace():
+    chunk = "Confidential\fACME Widget Manual\n\n\n\nThe   widget\t is   blue.  \nPage 3 of 6\n"
+    cleaned = clean_chunk(chunk, find_boilerplate(make_document()))
+    assert cleaned == "The widget is blue."
+    assert collapse_whitespace("a  b\n\n\n\nc \n") == "a b\n\nc"
+
+def test_prepare_context_follows_rank_order_within_budget():
+    chunks = [f"chunk {n} " + "word " * (20 if n != 3 else 200) for n in range(6)]
+    budget = estimate_tokens(chunks[0]) * 2 + 5
+    passages, stats = prepare_context(chunks, [4, 3, 1, 0], budget)
+    # 4 first, 3 doesn't fit and is skipped, then 1; 0 no longer fits. Returned in document order.
+    assert [passage.split()[1] for passage in passages] == ["1", "4"]
+    assert stats["chunks_used"] == 2 and stats["tokens_final"] <= budget
+    assert stats["tokens_raw"] > stats["tokens_final"]
+    assert prepare_context(chunks, [4, 3, 1, 0], budget) == (passages, stats)  # Deterministic
+
+def test_prepare_context_truncates_an_oversized_best_chunk_and_drops_duplicates():
+    chunks = ["alpha " * 100, "beta gamma", "beta   gamma"]
+    passages, stats = prepare_context(chunks, [0, 1, 2], token_budget=20)
+    assert len(passages) == 1 and estimate_tokens(passages[0]) <= 20 and passages[0].startswith("alpha")
+    passages, stats = prepare_context(chunks, [1, 2], token_budget=100)
+    assert passages == ["beta gamma"] and stats["chunks_used"] == 1
+
+def test_neighbouring_chunks_are_merged_without_repeating_their_overlap():
+    text = " ".join(f"sentence number {n} about widgets." for n in range(40))
+    index = build_index(text, chunk_size=200, chunk_overlap=60)
+    passages, _ = prepare_context(index.chunks, [2, 1], token_budget=10_000)
+    assert len(passages) == 1
+    assert passages[0].count("sentence number") < index.chunks[1].count("sentence number") + index.chunks[2].count("sentence number")
+    assert passages[0].startswith(index.chunks[1][:30]) and passages[0].endswith(index.chunks[2][-30:])
+
+def test_index_remembers_boilerplate_through_disk(tmp_path):
+    text_path = tmp_path / "manual.txt"
+    text_path.write_text(make_document(), encoding="utf-8")
+    built = load_or_build_index(str(text_path), 200, 40)
+    loaded = load_or_build_index(str(text_path), 200, 40)
+    assert "confidential" in built.boilerplate
+    assert loaded.boilerplate == built.boilerplate
+
+def test_prepare_sources_shares_one_budget_across_documents():
+    sources = {
+        "a.pdf": (["Confidential\nalpha one", "alpha two", "alpha three " * 50], ["confidential"]),
+        "b.pdf": (["beta one", "beta two"], []),
+    }
+    ranked = [("b.pdf", 1), ("a.pdf", 2), ("a.pdf", 0), ("b.pdf", 0)]
+    sections, stats = prepare_sources(sources, ranked, token_budget=10)
+    assert list(sections) == ["b.pdf", "a.pdf"]  # Ordered by each document's best kept hit
+    assert sections["a.pdf"] == ["alpha one"]  # Boilerplate of a.pdf only; the oversized chunk was skipped
+    assert sections["b.pdf"] == ["beta one\nbeta two"]
+    assert stats["chunks"] == [("b.pdf", 1), ("a.pdf", 0), ("b.pdf", 0)]
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from conversation import ConversationMemory, extractive_summary
+from fake_supabase import FakeSupabase
+
+def turn(n):
+    return f"What does section {n} say?", f"Section {n} says the widget needs part {n}. More detail follows here."
+
+def test_old_turns_fold_into_the_summary_one_batch_at_a_time():
+    db = FakeSupabase()
+    db.tables["chat_sessions"].append({"id": 7, "document_id": 1})
+    memory = ConversationMemory(lambda: db, window_turns=2)
+    folded = []
+
+    async def summarize(summary, turns):
+        folded.append(list(turns))
+        return (summary + " " + " ".join(question for question, _ in turns)).strip()
+
+    async def scenario():
+        for n in range(5):
+            await memory.remember(7, 1, *turn(n), summarize)
+
+    asyncio.run(scenario())
+    state = memory.get_local(7)
+    assert state["turns"] == [turn(3), turn(4)]
+    assert state["summarized_turns"] == 3
+    assert folded == [[turn(0)], [turn(1)], [turn(2)]]  # Only the turn that left the window, never the whole chat
+    assert db.tables["chat_sessions"][0]["summary"] == state["summary"] and "section 2" in state["summary"]
+    assert memory.retrieval_query(state, "and its colour?") == f"{turn(4)[0]}\nand its colour?"
+
+def test_history_stays_the_same_size_however_long_the_chat_runs():
+    memory = ConversationMemory(lambda: FakeSupabase(), window_turns=3, summary_max_chars=300, turn_max_chars=60)
+
+    async def summarize(summary, turns):
+        return extractive_summary(summary, turns, 300)
+
+    async def chat(session_id, turns):
+        for n in range(turns):
+            await memory.remember(session_id, 1, *turn(n), summarize)
+        return memory.history_text(memory.get_local(session_id))
+
+    short, long = asyncio.run(chat(1, 10)), asyncio.run(chat(2, 200))
+    assert "Summary of earlier conversation" in long and "section 199" in long
+    assert len(long) <= 300 + 3 * 2 * 70 + 100
+    assert abs(len(long) - len(short)) < 40  # Only longer section numbers differ
+    assert memory.history_text(None) == ""
+
+def test_sessions_are_rebuilt_from_supabase_by_another_worker():
+    db = FakeSupabase()
+    db.tables["chat_sessions"].append({"id": 3, "document_id": 9, "summary": "Talked about batteries.", "summarized_turns": 4})
+    for n in range(3):
+        question, answer = turn(n)
+        db.tables["messages"].append({"id": 2 * n + 1, "session_id": 3, "role": "user", "content": question, "created_at": f"2026-01-01T00:00:0{n}"})
+        db.tables["messages"].append({"id": 2 * n + 2, "session_id": 3, "role": "assistant", "content": answer, "created_at": f"2026-01-01T00:00:0{n}"})
+    memory = ConversationMemory(lambda: db, window_turns=2)
+    state = memory.load(3)
+    assert state["document_id"] == 9 and state["summary"] == "Talked about batteries."
+    assert state["turns"] == [turn(1), turn(2)]
+    assert memory.load(3) is state and memory.stats()["loads"] == 1
+    assert memory.load(404) is None
+
+def test_failed_summaries_fall_back_to_a_plain_digest():
+    memory = ConversationMemory(lambda: FakeSupabase(), window_turns=1, summary_max_chars=500)
+
+    async def broken(summary, turns):
+        raise RuntimeError("gemini is out")
+
+    async def scenario():
+        for n in range(3):
+            await memory.remember(1, 1, *turn(n), broken)
+
+    asyncio.run(scenario())
+    state = memory.get_local(1)
+    assert state["summary"].splitlines() == [
+        "- Asked: What does section 0 say? Answer: Section 0 says the widget needs part 0.",
+        "- Asked: What does section 1 say? Answer: Section 1 says the widget needs part 1.",
+    ]
+    assert memory.stats()["summary_failures"] == 2
@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from document_cache import DocumentContextCache
+
+def test_hits_misses_and_invalidation():
+    cache = DocumentContextCache(max_bytes=1000)
+    assert cache.get(1) is None
+    cache.put(1, {"filename": "manual.pdf"}, size=100)
+    assert cache.get(1) == {"filename": "manual.pdf"}
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["bytes"] == 0
+    assert stats["hit_rate"] == round(1 / 3, 3)
+
+def test_evicts_least_recently_used_when_over_budget():
+    cache = DocumentContextCache(max_bytes=250)
+    cache.put(1, {"id": 1}, size=100)
+    cache.put(2, {"id": 2}, size=100)
+    cache.get(1)  # 2 is now the coldest
+    cache.put(3, {"id": 3}, size=100)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.stats()["bytes"] == 200 and cache.stats()["evictions"] == 1
+    cache.put(4, {"id": 4}, size=1000)  # Bigger than the whole budget – never cached
+    assert cache.get(4) is None and cache.stats()["entries"] == 2
+
+def test_entries_expire_and_clear_empties_everything():
+    cache = DocumentContextCache(max_bytes=1000, ttl_seconds=0.05)
+    cache.put(1, {"id": 1}, size=10)
+    time.sleep(0.06)
+    assert cache.get(1) is None and cache.stats()["bytes"] == 0
+    cache.put(2, {"id": 2}, size=10)
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
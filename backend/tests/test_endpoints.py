@@ -8,7 +8,8 @@ import shutil
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from main import app  # Import your FastAPI app
-from config import supabase, UPLOAD_DIR, TEXT_DIR, API_HOST, API_PORT # Import supabase client and config
+from config import get_supabase, UPLOAD_DIR, TEXT_DIR, API_HOST, API_PORT # Import supabase client and config
+supabase = get_supabase()
 
 # Test Client Fixture using httpx.AsyncClient for async app
 @pytest.fixture(scope="session")
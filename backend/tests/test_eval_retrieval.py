@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.eval_retrieval import main, parse_args, recall_at, synthetic_dataset
+
+def test_recall_counts_the_share_of_answers_found():
+    texts = ["The pump is set to 120 kPa.", "Nothing here.", "The fan runs at 900 RPM."]
+    assert recall_at(texts, ["120 kpa", "900 rpm"], 1) == 0.5
+    assert recall_at(texts, ["120 kpa", "900 rpm"], 3) == 1.0
+    assert recall_at(texts, [], 3) == 0.0
+
+def test_synthetic_answers_are_in_the_document():
+    text, questions = synthetic_dataset(pages=10, questions=6, seed=1)
+    assert len(questions) == 6 and "\f" in text
+    assert all(answer in text for question in questions for answer in question["answers"])
+
+def test_arguments_parse_lists_and_reject_unknown_pipelines():
+    args = parse_args(["--k", "10,3", "--pipelines", "bm25,hybrid_mmr", "--mmr-weights", "0.5,0.9"])
+    assert args.k == [3, 10] and args.pipelines == ["bm25", "hybrid_mmr"] and args.mmr_weights == [0.5, 0.9]
+    try:
+        parse_args(["--pipelines", "telepathy"])
+    except SystemExit:
+        pass
+    else:
+        raise AssertionError("unknown pipeline should be rejected")
+
+def test_a_small_run_writes_a_report(tmp_path):
+    output = tmp_path / "report.json"
+    assert main(["--pages", "8", "--questions", "6", "--k", "1,3", "--mmr-weights", "0.7", "--output", str(output)]) == 0
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert [row["pipeline"] for row in report["results"]] == ["bm25", "semantic", "hybrid", "bm25_mmr@0.7", "hybrid_mmr@0.7"]
+    assert all(0.0 <= row["recall@3"] <= 1.0 and row["questions"] == 6 for row in report["results"])
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import workers
+from extraction import PAGE_SEPARATOR, extract_pdf_to_file, extract_text_from_pdf_file
+from page_store import open_text
+from pdf_factory import make_pdf
+
+@pytest.fixture
+def pools():
+    workers.configure_pools(2, 2)
+    yield
+    workers.shutdown_pools()
+
+def test_parallel_extraction_streams_pages_in_order(tmp_path, pools):
+    pages = [f"Page {n} covers topic number {n}." for n in range(1, 12)]
+    pdf_bytes = make_pdf(pages)
+    pdf_path = tmp_path / "manual.pdf"
+    pdf_path.write_bytes(pdf_bytes)
+    text_path = tmp_path / "manual.pages"
+
+    stats = asyncio.run(extract_pdf_to_file(str(pdf_path), str(text_path), "manual.pdf", pages_per_task=3))
+
+    text = open_text(str(text_path)).text()
+    assert text == extract_text_from_pdf_file(str(pdf_path), "manual.pdf")
+    assert [page.strip() for page in text.split(PAGE_SEPARATOR)] == pages
+    assert stats["page_count"] == 11 and len(stats["page_seconds"]) == 11
+    assert stats["chars"] == len(text)
+    assert stats["compressed_bytes"] < os.path.getsize(text_path)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+def test_parallel_extraction_rejects_broken_pdf(tmp_path, pools):
+    pdf_path = tmp_path / "broken.pdf"
+    pdf_path.write_bytes(b"definitely not a pdf")
+    with pytest.raises(ValueError):
+        asyncio.run(extract_pdf_to_file(str(pdf_path), str(tmp_path / "broken.txt"), "broken.pdf"))
+    assert not (tmp_path / "broken.txt").exists()
+
+def test_file_extraction_warns_about_pages_without_text(tmp_path, caplog):
+    pdf_path = tmp_path / "scan.pdf"
+    pdf_path.write_bytes(make_pdf(["", ""]))
+    with caplog.at_level("WARNING", logger="uvicorn.error"):
+        assert extract_text_from_pdf_file(str(pdf_path), "scan.pdf") == PAGE_SEPARATOR
+    warnings = [record.getMessage() for record in caplog.records if record.levelname == "WARNING"]
+    assert "(Jo Jo) Page 2 of scan.pdf had no text." in warnings
+    assert any("Maybe it's a scanned image?" in warning for warning in warnings)
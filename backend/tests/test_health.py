@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from health import HealthProber, StartupReport
+
+def test_startup_report_records_each_phase_since_the_start():
+    report = StartupReport(time.perf_counter() - 0.05)
+    report.mark("imports")
+    time.sleep(0.02)
+    report.mark("setup")
+    summary = report.to_dict()
+    assert list(summary["phases_ms"]) == ["imports", "setup"]
+    assert summary["phases_ms"]["imports"] >= 50
+    assert summary["phases_ms"]["setup"] >= 20
+    assert summary["total_ms"] >= 70
+
+def test_prober_records_healthy_failing_and_slow_checks():
+    def broken():
+        raise RuntimeError("connection refused")
+
+    prober = HealthProber({"ok": lambda: None, "broken": broken, "slow": lambda: time.sleep(0.5)}, timeout=0.1)
+    assert all(result["healthy"] is None for result in prober.results.values())
+
+    async def scenario():
+        await prober.probe()
+        return prober.snapshot()
+
+    results = asyncio.run(scenario())
+    assert results["ok"]["healthy"] is True
+    assert results["broken"]["healthy"] is False and "connection refused" in results["broken"]["message"]
+    assert results["slow"]["healthy"] is False and results["slow"]["latency_ms"] < 400
+    assert all(result["checked_at"] for result in results.values())
+
+def test_background_loop_keeps_results_fresh_and_reads_never_wait():
+    calls = {"n": 0}
+
+    def slow_check():
+        calls["n"] += 1
+        time.sleep(0.05)
+
+    prober = HealthProber({"supabase": slow_check}, interval=0.02, timeout=1)
+
+    async def scenario():
+        prober.start()
+        started = time.perf_counter()
+        first = prober.snapshot()
+        read_seconds = time.perf_counter() - started
+        await asyncio.sleep(0.2)
+        await prober.stop()
+        return first, read_seconds
+
+    first, read_seconds = asyncio.run(scenario())
+    assert read_seconds < 0.01  # Reading never runs the check itself
+    assert first["supabase"]["healthy"] is None
+    assert calls["n"] >= 2
+    assert prober.results["supabase"]["healthy"] is True
+
+def test_stale_snapshot_schedules_a_refresh_without_the_loop():
+    calls = {"n": 0}
+    prober = HealthProber({"supabase": lambda: calls.__setitem__("n", calls["n"] + 1)}, interval=60)
+
+    async def scenario():
+        prober.snapshot()  # Never probed – stale, so a refresh is scheduled
+        prober.snapshot()  # Already refreshing – no second probe
+        await asyncio.sleep(0.05)
+        fresh = prober.snapshot()  # Fresh now – nothing new scheduled
+        await asyncio.sleep(0.05)
+        await prober.stop()
+        return fresh
+
+    fresh = asyncio.run(scenario())
+    assert calls["n"] == 1
+    assert fresh["supabase"]["healthy"] is True
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from jobs import FAILED, QUEUED, SUCCEEDED, JobQueue
+
+def test_jobs_run_concurrently_up_to_the_cap_and_report_stages():
+    queue = JobQueue(max_concurrency=3)
+    running = {"now": 0, "peak": 0}
+
+    async def work(job):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        job.set_stage("extracting")
+        await asyncio.sleep(0.05)
+        job.set_stage("indexing")
+        running["now"] -= 1
+        return {"document_id": job.filename}
+
+    async def scenario():
+        started = time.perf_counter()
+        jobs = [queue.submit(f"doc{n}.pdf", work) for n in range(6)]
+        assert all(job.status == QUEUED for job in jobs)  # Submitting never waits for the work
+        await queue.wait(jobs)
+        return jobs, time.perf_counter() - started
+
+    jobs, elapsed = asyncio.run(scenario())
+    assert running["peak"] == 3
+    assert elapsed < 0.25  # Two waves of 0.05s, not six in a row
+    assert all(job.status == SUCCEEDED and job.stage == "done" for job in jobs)
+    assert jobs[0].result == {"document_id": "doc0.pdf"}
+    assert {"queued", "extracting", "indexing"} <= set(jobs[0].to_dict()["stage_seconds"])
+    assert queue.stats()["succeeded"] == 6
+
+def test_failures_are_recorded_and_batch_lookup_skips_unknown_ids():
+    queue = JobQueue(max_concurrency=2)
+
+    async def broken(job):
+        job.set_stage("extracting")
+        raise ValueError("not really a PDF")
+
+    async def scenario():
+        job = queue.submit("broken.pdf", broken)
+        await queue.wait([job])
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == FAILED and job.error == "not really a PDF"
+    assert job.stage_seconds.get("extracting") is not None
+    assert [found.id for found in queue.many([job.id, "nope"])] == [job.id]
+    assert queue.get("nope") is None
+
+def test_only_the_most_recent_finished_jobs_are_kept():
+    queue = JobQueue(max_concurrency=4, max_finished=2)
+
+    async def work(job):
+        return {}
+
+    async def scenario():
+        ids = []
+        for n in range(5):
+            job = queue.submit(f"doc{n}.pdf", work)
+            await queue.wait([job])
+            ids.append(job.id)
+        return ids
+
+    ids = asyncio.run(scenario())
+    assert queue.get(ids[0]) is None
+    assert queue.get(ids[-1]) is not None
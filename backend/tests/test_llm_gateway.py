@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fake_llm import FakeLLM
+from llm_gateway import LLMBusy, LLMGateway
+
+def test_calls_run_concurrently_up_to_the_cap():
+    llm = FakeLLM(latency=0.1)
+    gateway = LLMGateway(lambda: llm, max_concurrency=4)
+
+    async def scenario():
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(gateway.generate(f"prompt {n}") for n in range(8)))
+        return answers, time.perf_counter() - started
+
+    answers, elapsed = asyncio.run(scenario())
+    gateway.shutdown()
+    assert len(answers) == 8 and llm.calls == 8
+    assert llm.max_in_flight == 4
+    assert elapsed < 0.6  # Two waves of 0.1s, not eight sequential calls
+
+def test_queue_timeout_rejects_with_llm_busy():
+    llm = FakeLLM(latency=0.3)
+    gateway = LLMGateway(lambda: llm, max_concurrency=1, queue_timeout=0.05)
+
+    async def scenario():
+        return await asyncio.gather(gateway.generate("slow"), gateway.generate("waits"), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    gateway.shutdown()
+    assert first == llm.answer
+    assert isinstance(second, LLMBusy)
+    assert gateway.stats()["rejected"] == 1
+
+def test_identical_in_flight_requests_share_one_generation():
+    llm = FakeLLM(latency=0.1)
+    gateway = LLMGateway(lambda: llm, max_concurrency=4)
+
+    async def scenario():
+        burst = [gateway.coalesce("doc-1|reset", lambda: gateway.generate("reset prompt")) for _ in range(20)]
+        other = gateway.coalesce("doc-1|warranty", lambda: gateway.generate("warranty prompt"))
+        return await asyncio.gather(*burst, other)
+
+    answers = asyncio.run(scenario())
+    gateway.shutdown()
+    assert len(set(answers)) == 1
+    assert llm.calls == 2
+    assert gateway.stats()["coalesced"] == 19
+    assert gateway.stats()["in_flight_keys"] == 0
+
+def test_errors_reach_every_coalesced_waiter():
+    gateway = LLMGateway(lambda: None)
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("gemini fell over")
+
+    async def scenario():
+        return await asyncio.gather(*(gateway.coalesce("k", boom) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
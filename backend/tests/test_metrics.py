@@ -0,0 +1,56 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fake_supabase import FakeSupabase
+from metrics import MetricsMiddleware, Registry, TimedSupabase, http_requests, supabase_seconds
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("demo_seconds", "Demo latency.", ("stage",), buckets=(0.1, 1.0))
+    latency.observe(0.05, "read")
+    latency.observe(0.5, "read")
+    latency.observe(5.0, "read")
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{stage="read",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="read",le="1"} 2' in text
+    assert 'demo_seconds_bucket{stage="read",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="read"} 3' in text
+
+def test_counters_and_gauges_render_with_labels():
+    registry = Registry()
+    hits = registry.counter("demo_hits_total", "Hits.", ("route",))
+    hits.inc("/api/ask")
+    hits.inc("/api/ask", amount=2)
+    registry.gauge("demo_in_flight", "Live value.", read=lambda: 7)
+    text = registry.render()
+    assert 'demo_hits_total{route="/api/ask"} 3' in text
+    assert "demo_in_flight 7" in text
+
+def test_timed_supabase_labels_calls_by_table_and_operation():
+    fake = FakeSupabase()
+    db = TimedSupabase(lambda: fake)
+    before_insert = supabase_seconds.count("metric_docs", "insert")
+    before_select = supabase_seconds.count("metric_docs", "select")
+    db.table("metric_docs").insert({"name": "a"}).execute()
+    rows = db.table("metric_docs").select("*").eq("name", "a").limit(1).execute().data
+    assert rows[0]["name"] == "a"
+    assert supabase_seconds.count("metric_docs", "insert") == before_insert + 1
+    assert supabase_seconds.count("metric_docs", "select") == before_select + 1
+
+def test_middleware_counts_requests_by_status():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    before = http_requests.value("GET", "unmatched", "204")
+    asyncio.run(MetricsMiddleware(app)({"type": "http", "method": "GET", "path": "/nowhere"}, receive, send))
+    assert http_requests.value("GET", "unmatched", "204") == before + 1
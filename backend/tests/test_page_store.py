@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from page_store import PAGE_SEPARATOR, PageReader, PageWriter, PlainTextReader, open_text, write_pages
+from retrieval import index_path_for, load_or_build_index
+
+PAGES = [f"Page {n}: the widget manual explains how part {n} is fitted and serviced. " * 20 for n in range(12)]
+
+def test_pages_round_trip_and_compress(tmp_path):
+    path = str(tmp_path / "manual.pages")
+    compressed = write_pages(path, PAGES)
+    reader = open_text(path)
+    assert isinstance(reader, PageReader) and reader.page_count == 12
+    assert reader.text() == PAGE_SEPARATOR.join(PAGES)
+    assert reader.chars == len(reader.text())
+    assert os.path.getsize(path) < len(reader.text()) // 4
+    assert compressed < os.path.getsize(path)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+def test_spans_decompress_only_the_pages_they_touch(tmp_path):
+    path = str(tmp_path / "manual.pages")
+    write_pages(path, PAGES)
+    text = PAGE_SEPARATOR.join(PAGES)
+    reader = PageReader(path)
+    start = reader.page_starts[5] - 30
+    end = reader.page_starts[6] + 40
+    assert reader.span(start, end) == text[start:end]
+    assert list(reader.pages_for_span(start, end)) == [4, 5, 6]
+    assert set(reader._cache) == {4, 5, 6}
+    assert reader.page(9) == PAGES[9]
+
+def test_a_pinned_reader_keeps_working_after_its_file_is_removed(tmp_path):
+    path = str(tmp_path / "manual.partial.pages")
+    write_pages(path, PAGES)
+    reader = PageReader(path)
+    reader.pin()
+    os.remove(path)
+    assert reader.text() == PAGE_SEPARATOR.join(PAGES)
+    assert reader.span(reader.page_starts[11], reader.page_starts[11] + 8) == PAGES[11][:8]
+
+def test_legacy_text_files_read_through_the_same_api(tmp_path):
+    path = tmp_path / "manual.txt"
+    path.write_text(PAGE_SEPARATOR.join(PAGES[:3]), encoding="utf-8")
+    reader = open_text(str(path))
+    assert isinstance(reader, PlainTextReader)
+    assert reader.page_count == 3 and reader.page(1) == PAGES[1]
+    assert reader.span(reader.page_starts[1], reader.page_starts[1] + 7) == "Page 1:"
+
+def test_half_written_page_file_is_rejected(tmp_path):
+    path = str(tmp_path / "broken.pages")
+    writer = PageWriter(path)
+    writer.add_pages(PAGES[:2])
+    writer._file.close()  # Crashed before the offset table went out
+    with pytest.raises(ValueError):
+        PageReader(path)
+
+def test_index_keeps_spans_and_reads_chunks_from_the_page_file(tmp_path):
+    path = str(tmp_path / "manual.pages")
+    write_pages(path, PAGES)
+    text = PAGE_SEPARATOR.join(PAGES)
+    index = load_or_build_index(path, 300, 50)
+    loaded = load_or_build_index(path, 300, 50)
+    assert [text[start:end] for start, end in loaded.spans] == list(index.chunks) == list(loaded.chunks)
+    assert "widget manual" not in open(index_path_for(path), encoding="utf-8").read()
+    last = len(loaded.chunks) - 1
+    assert loaded.chunks.pages(0) == [1] and loaded.chunks.pages(last) == [12]
+
+def test_snapshots_publish_a_readable_prefix_while_writing_goes_on(tmp_path):
+    path, snapshot = str(tmp_path / "manual.pages.part"), str(tmp_path / "manual.partial.pages")
+    writer = PageWriter(path)
+    writer.add_pages(PAGES[:5])
+    assert writer.snapshot(snapshot) == 5
+    writer.add_pages(PAGES[5:])
+    assert open_text(snapshot).text() == PAGE_SEPARATOR.join(PAGES[:5])
+    writer.snapshot(snapshot)
+    writer.close()
+    assert open_text(snapshot).text() == open_text(path).text() == PAGE_SEPARATOR.join(PAGES)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("manual.partial.pages.")]
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fake_supabase import FakeSupabase
+from pagination import decode_cursor, encode_cursor, group_messages_by_session, keyset_before
+
+def test_cursor_round_trip_and_rejects_garbage():
+    cursor = encode_cursor({"created_at": "2026-01-02T03:04:05+00:00", "id": 42})
+    assert decode_cursor(cursor, ("created_at", "id")) == {"created_at": "2026-01-02T03:04:05+00:00", "id": 42}
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", ("id",))
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor({"id": 1}), ("created_at", "id"))
+
+def test_keyset_filter_pages_through_ties_without_gaps():
+    db = FakeSupabase()
+    stamps = ["2026-01-01T00:00:01+00:00"] * 3 + ["2026-01-01T00:00:00+00:00"] * 2
+    db.table("chat_sessions").insert([{"created_at": stamp, "document_id": 1} for stamp in stamps]).execute()
+    seen, after = [], None
+    while True:
+        query = db.table("chat_sessions").select("id, created_at")
+        if after:
+            query = query.or_(keyset_before("created_at", after["created_at"], after["id"]))
+        page = query.order("created_at", desc=True).order("id", desc=True).limit(2).execute().data
+        if not page:
+            break
+        seen.extend(row["id"] for row in page)
+        after = page[-1]
+    assert seen == [3, 2, 1, 5, 4]
+
+def test_group_messages_keeps_newest_per_session():
+    messages = [{"session_id": sid, "id": n} for n, sid in enumerate([1, 1, 1, 2], start=1)]
+    grouped = group_messages_by_session(messages, per_session_limit=2)
+    assert [m["id"] for m in grouped[1]] == [2, 3]
+    assert [m["id"] for m in grouped[2]] == [4]
+    assert len(group_messages_by_session(messages)[1]) == 3
@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import workers
+from extraction import extract_pdf_to_file
+from page_store import open_text, partial_path_for
+from pdf_factory import make_pdf
+from progressive import ProgressivePublisher
+from retrieval import hybrid_rank, index_path_for, load_or_build_index
+
+@pytest.fixture
+def pools():
+    workers.configure_pools(2, 2)
+    yield
+    workers.shutdown_pools()
+
+def test_growing_prefixes_are_published_while_extraction_runs(tmp_path, pools):
+    pdf_path = tmp_path / "atlas.pdf"
+    pdf_path.write_bytes(make_pdf([f"Page {n} maps the island of Isle{n}." for n in range(1, 41)]))
+    text_path = str(tmp_path / "atlas.pages")
+    published = []
+
+    async def on_publish(pages_ready, page_count):
+        index = load_or_build_index(publisher.partial_path, 200, 20)
+        best = index.chunks[hybrid_rank(index, "Isle3", 1)[0]]
+        published.append((pages_ready, page_count, open_text(publisher.partial_path).page_count, "Isle3" in best))
+
+    publisher = ProgressivePublisher(text_path, 200, 20, on_publish, first_pages=4, growth=2.0, min_pages=10)
+    asyncio.run(extract_pdf_to_file(str(pdf_path), text_path, "atlas.pdf", pages_per_task=4, ranges_in_flight=2, on_pages=publisher))
+
+    assert published == [(4, 40, 4, True), (8, 40, 8, True), (16, 40, 16, True), (32, 40, 32, True)]
+    assert open_text(text_path).page_count == 40
+    asyncio.run(publisher.discard())
+    assert not os.path.exists(partial_path_for(text_path)) and not os.path.exists(index_path_for(partial_path_for(text_path)))
+
+def test_short_pdfs_are_not_published_early():
+    publisher = ProgressivePublisher("/t/short.pages", 200, 20, None, first_pages=4, min_pages=32)
+    assert not publisher.due(8, 20)
+    assert publisher.due(4, 100) and not publisher.due(100, 100)
+    assert publisher.partial_path == "/t/short.partial.pages"
@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from retrieval import (INDEX_FORMAT_VERSION, BM25Index, chunk_text, hybrid_rank, index_path_for, load_or_build_index, merge_hits,
+                       mmr_select, reciprocal_rank_fusion, tokenize)
+
+SAMPLE_TEXT = (
+    "Jo Jo is a parrot who reads PDFs. "
+    "The warranty covers water damage for two years from the purchase date. "
+    "Battery replacement is handled by authorised service centres only. "
+    "To reset the device, hold the power button for ten seconds. "
+) * 3
+
+def test_chunk_text_overlaps_and_covers_text():
+    chunks = chunk_text(SAMPLE_TEXT, chunk_size=120, chunk_overlap=30)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    assert chunks[0].startswith("Jo Jo")
+    assert SAMPLE_TEXT.strip().endswith(chunks[-1])
+
+def test_bm25_ranks_matching_chunk_first():
+    chunks = ["The warranty covers water damage.", "Hold the power button to reset.", "Parrots love crackers."]
+    index = BM25Index(chunks)
+    hits = index.search("How do I reset the device?", top_k=2)
+    assert hits[0][0] == 1
+    assert index.search("zebra", top_k=3) == []
+
+def test_index_round_trips_through_disk(tmp_path):
+    text_path = tmp_path / "manual.txt"
+    text_path.write_text(SAMPLE_TEXT, encoding="utf-8")
+    built = load_or_build_index(str(text_path), 120, 30)
+    assert os.path.exists(index_path_for(str(text_path)))
+    loaded = load_or_build_index(str(text_path), 120, 30)
+    assert list(loaded.chunks) == list(built.chunks)
+    assert loaded.search("warranty water", 3) == built.search("warranty water", 3)
+
+def test_merge_hits_keeps_the_best_across_documents():
+    per_document = [
+        ("a.pdf", [(3, 9.0), (1, 4.0), (0, 1.0)]),
+        ("b.pdf", [(7, 8.0), (2, 4.0)]),
+        ("c.pdf", []),
+        ("d.pdf", [(5, 6.5)]),
+    ]
+    assert merge_hits(per_document, top_k=4) == [("a.pdf", 3, 9.0), ("b.pdf", 7, 8.0), ("d.pdf", 5, 6.5), ("a.pdf", 1, 4.0)]
+    assert len(merge_hits(per_document, top_k=50)) == 6
+    assert merge_hits([], top_k=3) == []
+
+def test_bm25_scores_match_the_textbook_formula():
+    index = BM25Index(chunk_text(SAMPLE_TEXT * 4, chunk_size=90, chunk_overlap=20))
+    question = "reset the battery warranty"
+    expected = {}
+    for idx, chunk in enumerate(index.chunks):
+        terms = tokenize(chunk)
+        score = 0.0
+        for term in set(tokenize(question)):
+            freq = terms.count(term)
+            if freq:
+                norm = index.k1 * (1 - index.b + index.b * len(terms) / index.avg_length)
+                score += index.idf(term) * freq * (index.k1 + 1) / (freq + norm)
+        if score > 0:
+            expected[idx] = score
+    hits = index.search(question, top_k=len(index.chunks))
+    assert {idx for idx, _ in hits} == set(expected)
+    assert all(abs(score - expected[idx]) < 1e-9 for idx, score in hits)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [item for item, _ in fused] == [1, 3, 2, 4]
+    assert reciprocal_rank_fusion([]) == []
+
+def test_mmr_skips_a_near_duplicate():
+    similarity = np.array([[1.0, 0.99, 0.1], [0.99, 1.0, 0.1], [0.1, 0.1, 1.0]])
+    assert mmr_select([1.0, 0.95, 0.8], similarity, top_k=2, weight=0.5) == [0, 2]
+    assert mmr_select([1.0, 0.95, 0.8], similarity, top_k=2, weight=1.0) == [0, 1]
+
+def test_hybrid_rank_fuses_falls_back_and_diversifies():
+    chunks = ["reset the router by holding power", "reset the router by holding power", "warranty covers water", "router lights explained"]
+    index = BM25Index(chunks)
+    assert hybrid_rank(index, "reset router", 2, mmr_weight=1.0) == [0, 1]
+    assert hybrid_rank(index, "reset router", 2, mmr_weight=0.5) == [0, 3]  # The duplicate gives way
+    assert hybrid_rank(index, "reset router", 2, semantic=[3, 2], mmr_weight=1.0)[0] == 3
+    assert hybrid_rank(index, "zebra", 2) == [0, 1]
+
+def test_index_saves_idf_and_chunk_norms(tmp_path):
+    text_path = tmp_path / "manual.txt"
+    text_path.write_text(SAMPLE_TEXT, encoding="utf-8")
+    built = load_or_build_index(str(text_path), 120, 30)
+    with open(index_path_for(str(text_path)), "r", encoding="utf-8") as index_file:
+        saved = json.load(index_file)
+    assert saved["version"] == INDEX_FORMAT_VERSION and "idf" in saved and len(saved["chunk_norms"]) == len(built.chunks)
+    loaded = load_or_build_index(str(text_path), 120, 30)
+    assert loaded.idf("warranty") == built.idf("warranty")
+
+def test_memory_footprint_covers_what_a_loaded_index_holds(tmp_path):
+    text_path = tmp_path / "manual.txt"
+    text_path.write_text(" ".join(f"term{n % 700} word{n % 53}" for n in range(40_000)), encoding="utf-8")
+    load_or_build_index(str(text_path), 500, 100)
+    tracemalloc.start()
+    index = load_or_build_index(str(text_path), 500, 100)
+    for term in list(index.postings):
+        index._term_impacts(term)
+    measured = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert measured * 0.7 <= index.memory_footprint() <= measured * 2
+    assert index.memory_footprint() > 3 * os.path.getsize(index_path_for(str(text_path)))
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fake_supabase import FakeSupabase
+from retrieval import index_path_for
+from storage_gc import StorageCollector, content_key
+from vector_store import VectorStore
+
+def store_document(db, tmp_path, store, key, document_id=None, upload_date="2026-01-01T00:00:00", size=1000):
+    """Write the artifacts an ingested PDF leaves behind and (optionally) its documents row."""
+    pdf_path = str(tmp_path / "uploads" / f"{key}.pdf")
+    text_path = str(tmp_path / "texts" / f"{key}.pages")
+    for path in (pdf_path, text_path, index_path_for(text_path)):
+        with open(path, "wb") as handle:
+            handle.write(b"x" * size)
+    store.save(key, np.ones((2, 4), dtype=np.float32), "hashing")
+    if document_id is not None:
+        db.tables["documents"].append({"id": document_id, "file_path": pdf_path, "text_path": text_path, "upload_date": upload_date})
+    return pdf_path, text_path
+
+def make_collector(tmp_path, db, **kwargs):
+    for folder in ("uploads", "texts"):
+        os.makedirs(tmp_path / folder, exist_ok=True)
+    store = VectorStore(str(tmp_path / "vectors"))
+    return StorageCollector(lambda: db, str(tmp_path / "uploads"), str(tmp_path / "texts"), store, **kwargs), store
+
+def age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+def test_deleting_a_document_cascades_but_keeps_shared_content(tmp_path):
+    db = FakeSupabase()
+    forgotten = []
+    collector, store = make_collector(tmp_path, db, on_deleted=forgotten.extend)
+    pdf_path, text_path = store_document(db, tmp_path, store, "aaa", document_id=1)
+    db.tables["documents"].append({"id": 2, "file_path": pdf_path, "text_path": text_path, "upload_date": "2026-01-02T00:00:00"})
+    store_document(db, tmp_path, store, "bbb", document_id=3)
+    db.tables["chat_sessions"].append({"id": 10, "document_id": 3})
+    db.tables["messages"].append({"id": 100, "session_id": 10, "role": "user", "content": "hi"})
+    db.tables["llm_cache"].append({"id": 5, "document_id": 3})
+
+    first = asyncio.run(collector.delete_documents([row for row in db.tables["documents"] if row["id"] == 1]))
+    assert first["files_removed"] == 0 and os.path.exists(pdf_path)  # Document 2 still uses the same content
+
+    rows = [row for row in db.tables["documents"] if row["id"] == 3]
+    result = asyncio.run(collector.delete_documents(rows))
+    assert result["files_removed"] == 4 and result["bytes_freed"] >= 3000 and not result["failed"]
+    assert not os.path.exists(tmp_path / "uploads" / "bbb.pdf") and not store.exists("bbb")
+    assert [row["id"] for row in db.tables["documents"]] == [2]
+    assert not db.tables["chat_sessions"] and not db.tables["messages"] and not db.tables["llm_cache"]
+    assert forgotten == [1, 3]
+
+def test_gc_sweeps_old_orphans_only(tmp_path):
+    db = FakeSupabase()
+    collector, store = make_collector(tmp_path, db, min_orphan_age=60)
+    kept_pdf, _ = store_document(db, tmp_path, store, "kept", document_id=1)
+    old_pdf, old_text = store_document(db, tmp_path, store, "old")
+    young_pdf, _ = store_document(db, tmp_path, store, "young")
+    leftover = str(tmp_path / "uploads" / ".incoming_1234.pdf")
+    open(leftover, "wb").close()
+    for path in (kept_pdf, old_pdf, old_text, index_path_for(old_text), store.path_for("old"), leftover):
+        age(path, 3600)
+
+    result = asyncio.run(collector.run_once())
+    assert result["orphans_removed"] == 5 and not result["failed"]
+    assert not os.path.exists(old_pdf) and not store.exists("old") and not os.path.exists(leftover)
+    assert os.path.exists(kept_pdf) and os.path.exists(young_pdf) and store.exists("kept")
+
+def test_retention_by_age_and_by_total_bytes(tmp_path):
+    db = FakeSupabase()
+    store_kwargs = dict(max_age_days=30, max_bytes=7000)
+    collector, store = make_collector(tmp_path, db, **store_kwargs)
+    store_document(db, tmp_path, store, "ancient", document_id=1, upload_date="2001-01-01T00:00:00")
+    for n, key in enumerate(["older", "newer", "newest"], start=2):
+        store_document(db, tmp_path, store, key, document_id=n, upload_date=f"2099-01-0{n}T00:00:00+00:00")
+
+    result = asyncio.run(collector.run_once())
+    assert result["expired_documents"] == 1 and result["over_budget_documents"] == 1
+    assert [row["id"] for row in db.tables["documents"]] == [3, 4]  # The oldest go first
+    assert not os.path.exists(tmp_path / "uploads" / "older.pdf")
+
+def test_content_key_groups_every_artifact_of_one_upload():
+    assert {content_key(path) for path in ["/u/abc.pdf", "/t/abc.pages", "/t/abc.bm25.json", "/v/abc/"]} == {"abc"}
+    assert content_key("/u/.incoming_1.pdf") == ".incoming_1.pdf"
+
+def test_rows_with_other_paths_still_protect_their_files(tmp_path):
+    db = FakeSupabase()
+    collector, store = make_collector(tmp_path, db, min_orphan_age=0)
+    live_pdf, live_text = store_document(db, tmp_path, store, "live")
+    store_document(db, tmp_path, store, "dead")
+    db.tables["documents"].append({"id": 1, "file_path": "uploads/live.pdf", "text_path": "/old/texts/live.pages",
+                                   "upload_date": "2026-01-01T00:00:00"})
+
+    result = asyncio.run(collector.run_once())
+    assert os.path.exists(live_pdf) and os.path.exists(live_text) and store.exists("live")
+    assert result["orphans_removed"] == 4 and not store.exists("dead")
+    assert asyncio.run(collector._remove_unreferenced({"live": [live_pdf]}))[0] == 0  # The by-name lookup sees the row
+
+def test_folders_no_row_resolves_into_are_not_swept(tmp_path):
+    db = FakeSupabase()
+    collector, store = make_collector(tmp_path, db, min_orphan_age=0)
+    pdf_path, text_path = store_document(db, tmp_path, store, "moved")
+    db.tables["documents"].append({"id": 1, "file_path": "/elsewhere/renamed.pdf", "text_path": "/elsewhere/renamed.pages",
+                                   "upload_date": "2026-01-01T00:00:00"})
+
+    result = asyncio.run(collector.run_once())
+    assert result["orphans_removed"] == 0
+    assert os.path.exists(pdf_path) and os.path.exists(text_path) and store.exists("moved")
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import workers
+from fake_llm import FakeLLM
+from streaming import sse_event, stream_llm_text
+
+def teardown_function():
+    workers.shutdown_pools()
+
+def test_sse_event_format():
+    event = sse_event({"text": "line one\nline two"}, event="token")
+    assert event.endswith("\n\n")
+    name, data = event.strip().split("\n")
+    assert name == "event: token"
+    assert json.loads(data[len("data: "):]) == {"text": "line one\nline two"}
+
+def test_stream_yields_first_token_before_generation_finishes():
+    llm = FakeLLM(answer="a" * 80, latency=0.4, first_token_latency=0.02, chunk_chars=10)
+
+    async def scenario():
+        started = time.perf_counter()
+        first = None
+        pieces = []
+        async for text in stream_llm_text(llm, "prompt"):
+            if first is None:
+                first = time.perf_counter() - started
+            pieces.append(text)
+        return first, time.perf_counter() - started, pieces
+
+    first, total, pieces = asyncio.run(scenario())
+    assert "".join(pieces) == "a" * 80
+    assert len(pieces) == 8
+    assert first < total / 2
+
+def test_consumer_stopping_early_stops_the_producer():
+    llm = FakeLLM(answer="b" * 100, latency=0.5, first_token_latency=0.0, chunk_chars=1)
+
+    async def scenario():
+        async for _ in stream_llm_text(llm, "prompt"):
+            break
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    deadline = time.time() + 2
+    while llm.in_flight and time.time() < deadline:
+        time.sleep(0.01)
+    assert llm.in_flight == 0
@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+import os
+import sys
+from io import BytesIO
+
+import pytest
+from starlette.datastructures import UploadFile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import workers
+from uploads import UploadTooLarge, content_lock, spool_upload_to_disk
+
+class CountingFile(BytesIO):
+    """Remembers the biggest single read so we can check uploads are consumed in chunks."""
+
+    largest_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.largest_read = max(self.largest_read, len(data))
+        return data
+
+@pytest.fixture(autouse=True)
+def pools():
+    yield
+    workers.shutdown_pools()
+
+def test_spool_streams_in_chunks_and_hashes(tmp_path):
+    payload = os.urandom(300_000)
+    source = CountingFile(payload)
+    dest = tmp_path / "upload.pdf"
+    size, digest = asyncio.run(spool_upload_to_disk(UploadFile(source, filename="a.pdf"), str(dest), 64 * 1024, 1_000_000))
+    assert size == len(payload)
+    assert digest == hashlib.sha256(payload).hexdigest()
+    assert dest.read_bytes() == payload
+    assert source.largest_read <= 64 * 1024
+
+def test_spool_rejects_oversized_upload_and_cleans_up(tmp_path):
+    dest = tmp_path / "upload.pdf"
+    upload = UploadFile(BytesIO(b"x" * 5000), filename="big.pdf")
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload_to_disk(upload, str(dest), 1024, 4096))
+    assert os.listdir(tmp_path) == []
+
+def test_simultaneous_spools_to_the_same_file_do_not_share_a_temp_file(tmp_path):
+    payload = os.urandom(200_000)
+    dest = str(tmp_path / "same.pdf")
+
+    async def scenario():
+        uploads = [UploadFile(BytesIO(payload), filename=f"{n}.pdf") for n in range(3)]
+        return await asyncio.gather(*(spool_upload_to_disk(upload, dest, 16 * 1024, 1_000_000) for upload in uploads))
+
+    results = asyncio.run(scenario())
+    assert results == [(len(payload), hashlib.sha256(payload).hexdigest())] * 3
+    assert os.listdir(tmp_path) == ["same.pdf"]
+    assert open(dest, "rb").read() == payload
+
+def test_spool_rejects_declared_size_before_reading(tmp_path):
+    source = CountingFile(b"x" * 10)
+    upload = UploadFile(source, filename="big.pdf", size=10_000)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload_to_disk(upload, str(tmp_path / "upload.pdf"), 1024, 4096))
+    assert source.largest_read == 0
+
+def test_content_lock_is_shared_per_digest():
+    first = content_lock("abc")
+    assert content_lock("abc") is first
+    assert content_lock("def") is not first
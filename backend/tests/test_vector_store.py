@@ -0,0 +1,67 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import vector_store
+from vector_store import HashingEmbedder, VectorStore, top_k_cosine
+
+CHUNKS = [
+    "The warranty covers water damage for two years.",
+    "Hold the power button for ten seconds to reset the device.",
+    "Battery replacement is handled by service centres.",
+]
+
+def test_hashing_embedder_is_deterministic_and_normalised():
+    embedder = HashingEmbedder(dim=64)
+    first = embedder.embed(CHUNKS)
+    second = HashingEmbedder(dim=64).embed(CHUNKS)
+    assert first.dtype == np.float32 and first.shape == (3, 64)
+    assert np.allclose(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+def test_store_round_trip_uses_mmap_and_finds_best_chunk(tmp_path):
+    embedder = HashingEmbedder()
+    store = VectorStore(str(tmp_path))
+    store.save("manual_abc", embedder.embed(CHUNKS), embedder.name)
+    assert store.keys() == ["manual_abc"]
+    matrix, meta = store.open("manual_abc")
+    assert isinstance(matrix, np.memmap)
+    assert meta == {"embedder": embedder.name, "count": 3, "dim": embedder.dim}
+    hits = store.search("manual_abc", embedder.embed(["reset the device power button"], is_query=True), top_k=2)
+    assert hits[0][0][0] == 1
+    store.delete("manual_abc")
+    assert not store.exists("manual_abc")
+
+def test_top_k_cosine_matches_brute_force_across_blocks(monkeypatch):
+    monkeypatch.setattr(vector_store, "SEARCH_BLOCK_ROWS", 7)
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(50, 16)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    queries = matrix[[3, 41]]
+    results = top_k_cosine(matrix, queries, top_k=5)
+    expected = np.argsort(-(queries @ matrix.T), axis=1)[:, :5]
+    assert [[idx for idx, _ in row] for row in results] == expected.tolist()
+
+def test_search_together_matches_searching_each_document(tmp_path):
+    embedder = HashingEmbedder()
+    store = VectorStore(str(tmp_path))
+    documents = {
+        "manual": CHUNKS,
+        "recipes": ["Parrots love crackers and seeds.", "Bake the crackers for ten minutes."],
+        "empty": [],
+    }
+    for key, chunks in documents.items():
+        store.save(key, embedder.embed(chunks) if chunks else np.zeros((0, embedder.dim)), embedder.name)
+    query = embedder.embed(["how long do the crackers bake"], is_query=True)
+    together = store.search_together(list(documents), query, top_k=3)
+    assert together[2] == []
+    assert together[1][0][0] == 1  # Baking chunk, numbered within its own document
+    apart = {key: dict(store.search(key, query, 5)[0]) for key in documents if documents[key]}
+    best = sorted((score for hits in apart.values() for score in hits.values()), reverse=True)[:3]
+    assert sorted((score for hits in together for _, score in hits), reverse=True) == best
+    assert all(apart[key][row] == score for key, hits in zip(documents, together) for row, score in hits)
+    # Re-saving a document is picked up by the next search
+    store.save("recipes", embedder.embed(["Crackers bake for ten minutes."]), embedder.name)
+    assert store.search_together(list(documents), query, top_k=3)[1][0][0] == 0
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import workers
+from extraction import extract_text_from_pdf_file
+from pdf_factory import make_pdf
+
+def test_extraction_runs_in_process_pool_without_blocking_loop(tmp_path):
+    pdf_path = tmp_path / "sample.pdf"
+    pdf_path.write_bytes(make_pdf([f"Page {n} talks about parrots." for n in range(1, 6)]))
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        beat = asyncio.create_task(heartbeat())
+        text = await workers.run_cpu(extract_text_from_pdf_file, str(pdf_path), "sample.pdf")
+        beat.cancel()
+        return text, ticks
+
+    workers.configure_pools(1, 2)
+    try:
+        text, ticks = asyncio.run(scenario())
+    finally:
+        workers.shutdown_pools()
+    assert text == extract_text_from_pdf_file(str(pdf_path), "sample.pdf")
+    assert ticks > 0
+
+def test_run_io_and_shutdown_recreates_pools():
+    workers.configure_pools(1, 1)
+    assert asyncio.run(workers.run_io(sum, [1, 2, 3])) == 6
+    first_pool = workers.get_thread_pool()
+    workers.shutdown_pools()
+    assert workers.get_thread_pool() is not first_pool
+    workers.shutdown_pools()
+
+def test_extraction_errors_surface_as_value_error(tmp_path):
+    pdf_path = tmp_path / "broken.pdf"
+    pdf_path.write_bytes(b"not a pdf")
+    with pytest.raises(ValueError):
+        extract_text_from_pdf_file(str(pdf_path), "broken.pdf")
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fake_supabase import FakeSupabase
+from write_behind import SpillFile, WriteBehindWriter
+
+class RejectedInsert(Exception):
+    """Shaped like postgrest's APIError: Supabase answered, with a Postgres error code."""
+    code = "23503"
+
+class FlakySupabase(FakeSupabase):
+    """Refuses every insert while `down` is set, like a Supabase blip, and any insert that touches a deleted session."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.deleted_sessions = set()
+        self.insert_batches = []
+
+    def table(self, name):
+        query = super().table(name)
+        original_execute = query.execute
+
+        def execute():
+            if query.operation == "insert":
+                if self.down:
+                    raise ConnectionError("supabase is napping")
+                rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                if any(row.get("session_id") in self.deleted_sessions for row in rows):
+                    raise RejectedInsert("insert or update on table \"messages\" violates foreign key constraint")
+                self.insert_batches.append(len(query.payload))
+            return original_execute()
+
+        query.execute = execute
+        return query
+
+def message(n):
+    return {"session_id": 1, "role": "user", "content": f"question {n}", "created_at": f"2024-01-01T00:00:{n:02d}"}
+
+def test_messages_are_flushed_in_batches(tmp_path):
+    db = FlakySupabase()
+    writer = WriteBehindWriter(lambda: db, str(tmp_path / "spill.db"), batch_size=10, flush_interval=0.05)
+
+    async def scenario():
+        for n in range(25):
+            writer.enqueue("messages", [message(n)])
+        await asyncio.sleep(0.2)
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert len(db.tables["messages"]) == 25
+    assert sum(db.insert_batches) == 25 and len(db.insert_batches) <= 4  # Multi-row inserts, not 25 round trips
+    assert writer.stats()["buffered"] == 0
+
+def test_close_flushes_whatever_is_buffered(tmp_path):
+    db = FlakySupabase()
+    writer = WriteBehindWriter(lambda: db, str(tmp_path / "spill.db"), batch_size=100, flush_interval=60)
+
+    async def scenario():
+        writer.enqueue("messages", [message(1), message(2)])
+        assert db.tables["messages"] == []
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert [row["content"] for row in db.tables["messages"]] == ["question 1", "question 2"]
+
+def test_outage_spills_to_disk_and_replays_on_restart(tmp_path):
+    db = FlakySupabase()
+    spill_path = str(tmp_path / "spill.db")
+    db.down = True
+    writer = WriteBehindWriter(lambda: db, spill_path, batch_size=10, flush_interval=0.05, retry_backoff=0.001)
+
+    async def outage():
+        writer.enqueue("messages", [message(1), message(2)])
+        await writer.close()
+
+    asyncio.run(outage())
+    assert db.tables["messages"] == []
+    assert writer.stats()["rows_spilled"] == 2
+    spill = SpillFile(spill_path)
+    assert spill.count() == 2
+    spill.close()
+
+    db.down = False
+    restarted = WriteBehindWriter(lambda: db, spill_path, batch_size=10, flush_interval=0.05)
+
+    async def recovery():
+        restarted.start()
+        await asyncio.sleep(0.1)
+        await restarted.close()
+
+    asyncio.run(recovery())
+    assert [row["content"] for row in db.tables["messages"]] == ["question 1", "question 2"]
+    assert restarted.stats()["rows_replayed"] == 2
+    spill = SpillFile(spill_path)
+    assert spill.count() == 0
+    spill.close()
+
+def test_spilled_rows_that_never_succeed_are_dropped(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.db"))
+    spill.add("messages", [message(1)])
+    assert spill.record_failure([row_id for row_id, _, _ in spill.peek(10)], max_attempts=2) == 0
+    assert spill.record_failure([row_id for row_id, _, _ in spill.peek(10)], max_attempts=2) == 1
+    assert spill.count() == 0
+    spill.close()
+
+def test_one_bad_row_does_not_spill_its_whole_batch(tmp_path):
+    db = FlakySupabase()
+    db.deleted_sessions = {9}
+    spill_path = str(tmp_path / "spill.db")
+    writer = WriteBehindWriter(lambda: db, spill_path, batch_size=16, flush_interval=60, retry_backoff=0.001)
+
+    async def scenario():
+        rows = [message(n) for n in range(16)]
+        rows[5]["session_id"] = 9
+        writer.enqueue("messages", rows)
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert len(db.tables["messages"]) == 15
+    assert writer.stats()["rows_spilled"] == 1
+    spill = SpillFile(spill_path)
+    assert [row["session_id"] for _, _, row in spill.peek(10)] == [9]
+    spill.close()
+
+def test_replay_moves_past_rows_that_keep_failing(tmp_path):
+    db = FlakySupabase()
+    db.deleted_sessions = {9}
+    spill_path = str(tmp_path / "spill.db")
+    spill = SpillFile(spill_path)
+    spill.add("messages", [dict(message(n), session_id=9) for n in range(4)])  # A whole batch of orphans first
+    spill.add("messages", [message(n) for n in range(10, 14)])
+    spill.close()
+    writer = WriteBehindWriter(lambda: db, spill_path, batch_size=4, flush_interval=60, max_replays=2)
+
+    async def replay():
+        writer.start()
+        await asyncio.sleep(0.1)
+        await writer.close()
+
+    asyncio.run(replay())
+    assert [row["content"] for row in db.tables["messages"]] == [f"question {n}" for n in range(10, 14)]
+    assert writer.stats()["rows_replayed"] == 4
+    asyncio.run(replay())  # Second strike for the orphans
+    assert writer.stats()["rows_dropped"] == 4
+    spill = SpillFile(spill_path)
+    assert spill.count() == 0
+    spill.close()
@@ -0,0 +1,73 @@
+# Jo Jo's upload spooler – uploads go to disk in small chunks, so big PDFs never sit in memory. 📥
+
+import asyncio
+import hashlib
+import os
+import time
+import weakref
+from typing import Tuple
+
+from metrics import observe_stage
+from page_store import temp_path_for
+from workers import run_io
+
+_content_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def content_lock(digest: str) -> asyncio.Lock:
+    """One lock per content hash, so two simultaneous uploads of the same PDF only ingest it once.
+
+    Locks live only as long as someone holds a reference, so the table never grows without bound.
+    """
+    lock = _content_locks.get(digest)
+    if lock is None:
+        lock = asyncio.Lock()
+        _content_locks[digest] = lock
+    return lock
+
+class UploadTooLarge(ValueError):
+    """The upload went past the configured size limit."""
+
+def _write_and_hash(handle, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    handle.write(chunk)
+
+def _discard(handle, path: str) -> None:
+    handle.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+async def spool_upload_to_disk(upload, dest_path: str, chunk_size: int, max_bytes: int) -> Tuple[int, str]:
+    """Stream an UploadFile to dest_path chunk by chunk, returning (size in bytes, sha256 hex digest).
+
+    The limit is checked against the declared size before reading and again as bytes arrive, so an
+    oversized upload is stopped at the first chunk that crosses it. Partial files never survive.
+    """
+    declared_size = getattr(upload, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise UploadTooLarge(f"File is {declared_size} bytes; the limit is {max_bytes} bytes.")
+    hasher = hashlib.sha256()
+    size = 0
+    read_seconds = write_seconds = 0.0
+    tmp_path = temp_path_for(dest_path)
+    handle = await run_io(open, tmp_path, "wb")
+    try:
+        while True:
+            started = time.perf_counter()
+            chunk = await upload.read(chunk_size)
+            read_seconds += time.perf_counter() - started
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File is larger than the {max_bytes} byte limit.")
+            started = time.perf_counter()
+            await run_io(_write_and_hash, handle, hasher, chunk)
+            write_seconds += time.perf_counter() - started
+    except BaseException:
+        await run_io(_discard, handle, tmp_path)
+        raise
+    await run_io(handle.close)
+    await run_io(os.replace, tmp_path, dest_path)
+    observe_stage("upload_read", read_seconds)
+    observe_stage("disk_write", write_seconds)
+    return size, hasher.hexdigest()
@@ -0,0 +1,193 @@
+# Jo Jo's vector shelf – chunk embeddings saved as NumPy matrices and memory-mapped on demand. 🧠
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from page_store import temp_path_for
+from retrieval import merge_hits, tokenize
+
+VECTORS_FILENAME = "vectors.npy"
+META_FILENAME = "meta.json"
+SEARCH_BLOCK_ROWS = 65536  # Score big matrices in blocks so we never materialise one giant score array
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class HashingEmbedder:
+    """Deterministic offline embedder: hashes words and word pairs into a fixed number of buckets.
+
+    It knows nothing about meaning, but it's free, fast and stable across processes – perfect for
+    tests and for deployments without an embedding API.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, (1.0 if value >> 63 else -1.0)
+
+    def embed(self, texts: List[str], is_query: bool = False) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                bucket, sign = self._bucket(feature)
+                matrix[row, bucket] += sign
+        return _normalize_rows(matrix)
+
+class GeminiEmbedder:
+    """Embeds text with Google's embedding API, batching requests to keep round trips down."""
+
+    def __init__(self, model: str = "models/text-embedding-004", batch_size: int = 100, api_key: Optional[str] = None):
+        self.model = model
+        self.batch_size = batch_size
+        self.api_key = api_key
+        self.name = f"gemini-{model.split('/')[-1]}"
+        self._configured = False
+
+    def embed(self, texts: List[str], is_query: bool = False) -> np.ndarray:
+        import google.generativeai as genai  # Only needed when this embedder is actually used
+        if self.api_key and not self._configured:
+            genai.configure(api_key=self.api_key)
+            self._configured = True
+        task_type = "retrieval_query" if is_query else "retrieval_document"
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            result = genai.embed_content(model=self.model, content=batch, task_type=task_type)
+            rows.extend(result["embedding"])
+        return _normalize_rows(np.array(rows, dtype=np.float32))
+
+def key_for_text_path(text_path: str) -> str:
+    """Vectors are keyed by the text file's name, so they line up with the BM25 chunks saved beside it."""
+    return os.path.splitext(os.path.basename(text_path))[0]
+
+def get_embedder(name: str, model: Optional[str] = None, api_key: Optional[str] = None):
+    """Build the embedder named in config ("hashing" or "gemini")."""
+    if name == "gemini":
+        return GeminiEmbedder(model, api_key=api_key) if model else GeminiEmbedder(api_key=api_key)
+    if name == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown embedder: {name}")
+
+class VectorStore:
+    """Per-document float32 matrices under one root folder, one subfolder per document key.
+
+    Vectors are L2-normalised before saving, so cosine similarity is a plain dot product. Matrices
+    are opened with mmap, so a worker only pages in the documents it actually searches.
+    """
+
+    def __init__(self, root: str, max_open: int = 64):
+        self.root = root
+        self.max_open = max_open
+        self._open: "OrderedDict[str, Tuple[np.ndarray, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        safe_key = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in str(key))
+        return os.path.join(self.root, safe_key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path_for(key), VECTORS_FILENAME))
+
+    def save(self, key: str, vectors: np.ndarray, embedder_name: str) -> str:
+        folder = self.path_for(key)
+        os.makedirs(folder, exist_ok=True)
+        matrix = _normalize_rows(vectors) if len(vectors) else np.zeros((0, 0), dtype=np.float32)
+        tmp_path = temp_path_for(os.path.join(folder, VECTORS_FILENAME))
+        with open(tmp_path, "wb") as vector_file:
+            np.save(vector_file, matrix)
+        os.replace(tmp_path, os.path.join(folder, VECTORS_FILENAME))
+        meta = {"embedder": embedder_name, "count": int(matrix.shape[0]), "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0}
+        with open(os.path.join(folder, META_FILENAME), "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file)
+        self._forget(key)
+        return folder
+
+    def open(self, key: str) -> Tuple[np.ndarray, dict]:
+        """Return the (memory-mapped matrix, metadata) pair for a document."""
+        with self._lock:
+            cached = self._open.get(key)
+            if cached is not None:
+                self._open.move_to_end(key)
+                return cached
+        folder = self.path_for(key)
+        matrix = np.load(os.path.join(folder, VECTORS_FILENAME), mmap_mode="r")
+        with open(os.path.join(folder, META_FILENAME), "r", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        with self._lock:
+            self._open[key] = (matrix, meta)
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return matrix, meta
+
+    def search(self, key: str, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """Batched cosine top-k: one result list of (row, score) pairs per query row, best first."""
+        matrix, _ = self.open(key)
+        queries = _normalize_rows(queries)
+        return top_k_cosine(matrix, queries, top_k)
+
+    def search_together(self, keys: List[str], query: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """Cosine top_k over several documents as one index: for each key, its (row, score) hits among the
+        overall best top_k, best first.
+
+        Each document's memory-mapped matrix is searched where it lies and the per-document lists are
+        heap-merged, so nothing is copied into RAM beyond the blocks being scored.
+        """
+        query = _normalize_rows(query)[:1]
+        per_document = [(position, top_k_cosine(self.open(key)[0], query, top_k)[0]) for position, key in enumerate(keys)]
+        results: List[List[Tuple[int, float]]] = [[] for _ in keys]
+        for position, row, score in merge_hits(per_document, top_k):
+            results[position].append((row, score))
+        return results
+
+    def keys(self) -> List[str]:
+        """Every document key that has saved vectors (older folders from other tools are ignored)."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.exists(os.path.join(self.root, name, VECTORS_FILENAME)))
+
+    def delete(self, key: str) -> None:
+        self._forget(key)
+        shutil.rmtree(self.path_for(key), ignore_errors=True)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._open.pop(key, None)
+
+def top_k_cosine(matrix: np.ndarray, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+    """Top-k rows of a normalised matrix for each normalised query, scored block by block."""
+    rows = matrix.shape[0] if matrix.ndim == 2 else 0
+    if rows == 0 or top_k <= 0:
+        return [[] for _ in range(len(queries))]
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, rows, SEARCH_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1)
+        keep = min(top_k, scores.shape[1])
+        part = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        best_scores = np.take_along_axis(scores, part, axis=1)
+        best_ids = np.take_along_axis(ids, part, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_ids = np.take_along_axis(best_ids, order, axis=1)
+    return [list(zip(row_ids.tolist(), row_scores.tolist())) for row_ids, row_scores in zip(best_ids, best_scores)]
@@ -0,0 +1,112 @@
+# Jo Jo's worker pools – CPU-heavy and blocking work happens here so the event loop stays snappy. 🏋️
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+logger = logging.getLogger("uvicorn.error")
+
+_lock = threading.Lock()
+_process_pool: Optional[ProcessPoolExecutor] = None
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_workers = 2
+_thread_workers = 8
+
+def configure_pools(process_workers: int, thread_workers: int) -> None:
+    """Set pool sizes. Pools are created lazily, so call this before the first job runs."""
+    global _process_workers, _thread_workers
+    _process_workers = max(1, process_workers)
+    _thread_workers = max(1, thread_workers)
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            # spawn keeps children clean – forking a threaded uvicorn worker can copy held locks
+            _process_pool = ProcessPoolExecutor(max_workers=_process_workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"(Jo Jo) Started process pool with {_process_workers} workers")
+        return _process_pool
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    with _lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=_thread_workers, thread_name_prefix="jojo-io")
+        return _thread_pool
+
+async def run_cpu(func: Callable, *args, **kwargs):
+    """Run a picklable, CPU-bound function in the process pool without blocking the event loop."""
+    global _process_pool
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    try:
+        return await loop.run_in_executor(pool, partial(func, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (OOM, segfault in a parser...). Drop the pool so the next job gets a fresh one.
+        logger.error("(Jo Jo) Process pool broke; it will be recreated on the next job.")
+        with _lock:
+            if _process_pool is pool:
+                _process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+async def run_io(func: Callable, *args, **kwargs):
+    """Run blocking file or network work in the thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), partial(func, *args, **kwargs))
+
+async def iterate_in_thread(make_iterable: Callable[[], Iterable]) -> AsyncIterator:
+    """Consume a blocking iterator (e.g. a streaming HTTP response) on the thread pool, yielding items as they arrive.
+
+    If the consumer stops early (client went away), the producer thread stops at the next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def publish(item, error=None) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            stop.set()  # The event loop is gone; nobody is listening any more
+
+    def produce() -> None:
+        try:
+            for item in make_iterable():
+                if stop.is_set():
+                    return
+                publish(item)
+        except BaseException as error:
+            publish(finished, error)
+            return
+        publish(finished)
+
+    loop.run_in_executor(get_thread_pool(), produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+def shutdown_pools(wait: bool = True) -> None:
+    """Stop both pools. Queued jobs are cancelled; running ones finish when wait is True."""
+    global _process_pool, _thread_pool
+    with _lock:
+        process_pool, thread_pool = _process_pool, _thread_pool
+        _process_pool = _thread_pool = None
+    if process_pool is not None:
+        process_pool.shutdown(wait=wait, cancel_futures=True)
+    if thread_pool is not None:
+        thread_pool.shutdown(wait=wait, cancel_futures=True)
+    logger.info("(Jo Jo) Worker pools shut down")
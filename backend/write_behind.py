@@ -0,0 +1,266 @@
+# Jo Jo's write-behind queue – chat messages are saved in batches after the answer has gone out. 📨
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from workers import run_io
+
+logger = logging.getLogger("uvicorn.error")
+
+class SpillFile:
+    """A tiny SQLite-backed queue of rows that Supabase wouldn't take, so they survive restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY AUTOINCREMENT, target TEXT NOT NULL, "
+                           "payload TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)")
+        self._conn.commit()
+
+    def add(self, target: str, rows: List[dict]) -> None:
+        with self._lock:
+            self._conn.executemany("INSERT INTO pending (target, payload) VALUES (?, ?)",
+                                   [(target, json.dumps(row)) for row in rows])
+            self._conn.commit()
+
+    def peek(self, limit: int, after_id: int = 0) -> List[Tuple[int, str, dict]]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT id, target, payload FROM pending WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+            return [(row_id, target, json.loads(payload)) for row_id, target, payload in cursor.fetchall()]
+
+    def remove(self, row_ids: List[int]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending WHERE id = ?", [(row_id,) for row_id in row_ids])
+            self._conn.commit()
+
+    def record_failure(self, row_ids: List[int], max_attempts: int) -> int:
+        """Bump the attempt count for rows that failed again, dropping any that have run out. Returns how many were dropped."""
+        with self._lock:
+            self._conn.executemany("UPDATE pending SET attempts = attempts + 1 WHERE id = ?", [(row_id,) for row_id in row_ids])
+            dropped = self._conn.execute("DELETE FROM pending WHERE attempts >= ?", (max_attempts,)).rowcount
+            self._conn.commit()
+            return dropped
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def is_rejection(error: BaseException) -> bool:
+    """True when Supabase answered and refused the rows – PostgREST errors carry a Postgres error code
+    (23503 for a foreign key, say) – rather than timing out or dropping the connection."""
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and bool(code)
+
+class WriteBehindWriter:
+    """Buffers inserts and flushes them as multi-row inserts when the batch fills or the interval passes.
+
+    A failed batch is retried with backoff. If Supabase can't be reached the whole batch goes to the
+    spill file; if it refuses the rows, the batch is bisected so only the rows it refuses on their
+    own (say, their session was deleted) are spilled. Spilled rows are replayed the same way after
+    the next successful flush (and on startup), and rows that keep being refused are dropped after
+    max_replays tries without holding up the rest.
+    """
+
+    def __init__(self, get_client: Callable, spill_path: str, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_attempts: int = 3, retry_backoff: float = 0.2, max_replays: int = 20):
+        self.get_client = get_client
+        self.spill_path = spill_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.max_replays = max(1, max_replays)
+        self._spill: Optional[SpillFile] = None
+        self._buffer: List[Tuple[str, dict]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill_pending = True  # Unknown until the first replay looks
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_spilled = 0
+        self.rows_replayed = 0
+        self.rows_dropped = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, table: str, rows: List[dict]) -> None:
+        """Queue rows for insertion. Never blocks and never talks to Supabase directly."""
+        self.start()
+        self._buffer.extend((table, row) for row in rows)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        try:
+            async with self._flush_lock:
+                await self._replay_spill()
+        except Exception:
+            logger.error("(Jo Jo) Couldn't replay the write-behind spill file at startup", exc_info=True)
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.error("(Jo Jo) Write-behind flush crashed; will try again next tick", exc_info=True)
+
+    async def flush(self) -> None:
+        """Write everything buffered so far. Safe to call any time, e.g. before reading history."""
+        if self._flush_lock is None:
+            self.start()
+        async with self._flush_lock:
+            while self._buffer:
+                batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+                by_table: Dict[str, List[Tuple[Any, dict]]] = defaultdict(list)
+                for table, row in batch:
+                    by_table[table].append((None, row))
+                for table, entries in by_table.items():
+                    error = await self._insert_with_retry(table, [row for _, row in entries])
+                    if error is None:
+                        if self._spill_pending:
+                            await self._replay_spill()
+                        continue
+                    failed = await self._failed_rows(table, entries, error)
+                    rows = [row for _, row in (entries if failed is None else failed)]
+                    if not rows:
+                        continue  # Every half went in on its own – the batch failure was a blip
+                    await run_io(self._get_spill().add, table, rows)
+                    self._spill_pending = True
+                    self.rows_spilled += len(rows)
+                    logger.error(f"(Jo Jo) Spilled {len(rows)} of {len(entries)} {table} row(s) to {self.spill_path}; they'll be retried")
+
+    async def _insert_with_retry(self, table: str, rows: List[dict]) -> Optional[Exception]:
+        """Insert rows, retrying with backoff. Returns None once they're in, else the last error."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await run_io(self._insert, table, rows)
+                self.rows_written += len(rows)
+                self.batches_written += 1
+                return None
+            except Exception as oops:
+                self.failures += 1
+                logger.warning(f"(Jo Jo) Batch insert of {len(rows)} {table} row(s) failed (attempt {attempt}/{self.max_attempts}): {oops}")
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+                error = oops
+        return error
+
+    async def _try_insert(self, table: str, entries: List[Tuple[Any, dict]]) -> Optional[Exception]:
+        try:
+            await run_io(self._insert, table, [row for _, row in entries])
+        except Exception as oops:
+            self.failures += 1
+            if len(entries) == 1:
+                logger.warning(f"(Jo Jo) A {table} row can't be written: {oops}")
+            return oops
+        self.rows_written += len(entries)
+        self.batches_written += 1
+        return None
+
+    async def _failed_rows(self, table: str, entries: List[Tuple[Any, dict]], error: Exception) -> Optional[List[Tuple[Any, dict]]]:
+        """For a batch that just failed with error: the entries that fail on their own, found by bisecting.
+
+        None when Supabase didn't refuse the rows but couldn't be reached – splitting the batch would
+        only add load, and every row deserves another go.
+        """
+        if not is_rejection(error):
+            return None
+        if len(entries) == 1:
+            return entries
+        failed = []
+        middle = len(entries) // 2
+        for half in (entries[:middle], entries[middle:]):
+            error = await self._try_insert(table, half)
+            if error is not None:
+                failed += await self._failed_rows(table, half, error) or half
+        return failed
+
+    def _insert(self, table: str, rows: List[dict]) -> None:
+        self.get_client().table(table).insert(rows).execute()
+
+    async def _replay_spill(self) -> None:
+        """Push spilled rows back to Supabase a batch at a time. Rows that are still refused stay behind
+        (until they run out of tries) and replay moves on past them; it stops early only if Supabase
+        can't be reached."""
+        spill = await run_io(self._get_spill)
+        after_id = 0
+        while True:
+            pending = await run_io(spill.peek, self.batch_size, after_id)
+            if not pending:
+                self._spill_pending = await run_io(spill.count) > 0
+                return
+            after_id = pending[-1][0]
+            by_table: Dict[str, List[Tuple[int, dict]]] = defaultdict(list)
+            for row_id, table, row in pending:
+                by_table[table].append((row_id, row))
+            for table, entries in by_table.items():
+                error = await self._try_insert(table, entries)
+                failed = [] if error is None else await self._failed_rows(table, entries, error)
+                if failed is None:
+                    logger.warning(f"(Jo Jo) Spilled {table} rows still can't be written: {error}")
+                    self._spill_pending = True
+                    return  # Supabase is unreachable; the next successful flush will try again
+                if failed:
+                    dropped = await run_io(spill.record_failure, [row_id for row_id, _ in failed], self.max_replays)
+                    self.rows_dropped += dropped
+                    logger.warning(f"(Jo Jo) {len(failed)} spilled {table} row(s) were refused again")
+                    if dropped:
+                        logger.error(f"(Jo Jo) Gave up on {dropped} spilled {table} row(s) after {self.max_replays} tries")
+                failed_ids = {row_id for row_id, _ in failed}
+                replayed = [row_id for row_id, _ in entries if row_id not in failed_ids]
+                if replayed:
+                    await run_io(spill.remove, replayed)
+                    self.rows_replayed += len(replayed)
+                    logger.info(f"(Jo Jo) Replayed {len(replayed)} spilled {table} row(s)")
+
+    def _get_spill(self) -> SpillFile:
+        if self._spill is None:
+            self._spill = SpillFile(self.spill_path)
+        return self._spill
+
+    async def close(self) -> None:
+        """Stop the background flusher and write out whatever is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._buffer:
+            await self.flush()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "rows_spilled": self.rows_spilled,
+            "rows_replayed": self.rows_replayed,
+            "rows_dropped": self.rows_dropped,
+            "failures": self.failures,
+        }
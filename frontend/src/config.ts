@@ -31,6 +31,8 @@ export const ERROR_MESSAGES = {
 // UI Configuration
 export const TOAST_DURATION = 3000; // 3 seconds
 export const UPLOAD_PROGRESS_INTERVAL = 100; // 100ms
+export const JOB_POLL_INTERVAL = 1000; // 1 second between ingestion status checks
+export const JOB_POLL_MAX_MISSES = 5; // Checks a job may be missing from /jobs before we give up on it
 
 // History Configuration
 export const HISTORY_STORAGE_KEY = "pdf_qa_history";
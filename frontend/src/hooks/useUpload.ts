@@ -1,6 +1,7 @@
 // This is Jo Jo's upload hook – your friendly helper for uploading PDFs. Handles errors, progress, and all the little details. 🦜
 import { useState, useCallback } from "react";
 import { API_URL } from "../config";
+import { waitForUploads } from "../services/api";
 
 // Jo Jo's PDF upload helper – let's make file uploads a breeze!
 export const useUpload = () => {
@@ -43,7 +44,7 @@ export const useUpload = () => {
     setResults([]);
     const formData = new FormData();
     files.forEach((file) => formData.append("files", file));
-    return new Promise<any[]>((resolve, reject) => {
+    const accepted = await new Promise<any[]>((resolve, reject) => {
       const xhr = new XMLHttpRequest();
       xhr.upload.addEventListener("progress", (event) => {
         if (event.lengthComputable) {
@@ -54,9 +55,7 @@ export const useUpload = () => {
       xhr.addEventListener("load", () => {
         if (xhr.status === 200) {
           try {
-            const response = JSON.parse(xhr.responseText);
-            setResults(response);
-            resolve(response);
+            resolve(JSON.parse(xhr.responseText));
           } catch (err) {
             setError("Hmm, the server sent something weird back. Try again?");
             reject(err);
@@ -70,9 +69,18 @@ export const useUpload = () => {
         setError("Network error. Are you online?");
         reject(new Error("Network error"));
       });
+      // The response comes as soon as the files are saved; processing carries on in the background
       xhr.open("POST", `${API_URL}/upload`);
       xhr.send(formData);
     });
+    try {
+      const response = await waitForUploads(accepted);
+      setResults(response);
+      return response;
+    } catch (err) {
+      setError("Lost touch with the server while your PDF was being read. Try again?");
+      throw err;
+    }
   }, [files]);
 
   const resetUpload = useCallback(() => {
@@ -1,5 +1,5 @@
 // Hi! This is Jo Jo's API helper – your friendly bridge to the backend. All fetches, all the time, with a smile. 🦜
-import { API_URL } from "../config";
+import { API_URL, JOB_POLL_INTERVAL, JOB_POLL_MAX_MISSES } from "../config";
 
 // These are the shapes of the things we send and receive. Think of them as our shared language!
 interface UploadResult {
@@ -8,6 +8,17 @@ interface UploadResult {
   text_path?: string;
   message?: string;
   error?: string;
+  job_id?: string;
+}
+
+// What /upload hands back for each accepted file: a background ingestion job to check on
+interface IngestionJob {
+  job_id: string;
+  filename: string;
+  status: "queued" | "running" | "succeeded" | "failed";
+  stage: string;
+  error: string | null;
+  result: UploadResult | null;
 }
 
 interface AskResponse {
@@ -79,6 +90,58 @@ async function fetchApi<T>(url: string, options?: RequestInit): Promise<T> {
   }
 }
 
+// Check on a batch of ingestion jobs in one call. Jobs the server doesn't know are left out.
+export const getJobs = async (jobIds: string[]): Promise<IngestionJob[]> => {
+  return fetchApi<IngestionJob[]>(
+    `/jobs?ids=${encodeURIComponent(jobIds.join(","))}`
+  );
+};
+
+const jobResult = (job: IngestionJob): UploadResult =>
+  job.status === "succeeded" && job.result
+    ? { ...job.result, job_id: job.job_id }
+    : {
+        filename: job.filename,
+        error: `Yikes! Something went wrong: ${job.error || "processing failed"}`,
+        job_id: job.job_id,
+      };
+
+// Uploads are answered as soon as the files are saved; poll their jobs until every one is done.
+// Entries that were turned away straight off (too big, not a PDF...) come back as they are.
+export const waitForUploads = async (
+  entries: Array<UploadResult | IngestionJob>
+): Promise<UploadResult[]> => {
+  const finished = new Map<string, UploadResult>();
+  const misses = new Map<string, number>();
+  const isJob = (entry: UploadResult | IngestionJob): entry is IngestionJob =>
+    "status" in entry && Boolean(entry.job_id);
+  let pending = entries.filter(isJob).map((job) => job.job_id);
+  while (pending.length > 0) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+    const jobs = await getJobs(pending);
+    const seen = new Set(jobs.map((job) => job.job_id));
+    jobs
+      .filter((job) => job.status === "succeeded" || job.status === "failed")
+      .forEach((job) => finished.set(job.job_id, jobResult(job)));
+    pending.forEach((jobId) => {
+      if (seen.has(jobId)) return;
+      const missed = (misses.get(jobId) || 0) + 1;
+      misses.set(jobId, missed);
+      if (missed >= JOB_POLL_MAX_MISSES) {
+        finished.set(jobId, {
+          filename: entries.find((entry) => entry.job_id === jobId)?.filename || "",
+          error: "Hmm, I lost track of that upload. Check your history in a moment?",
+          job_id: jobId,
+        });
+      }
+    });
+    pending = pending.filter((jobId) => !finished.has(jobId));
+  }
+  return entries.map((entry) =>
+    isJob(entry) ? finished.get(entry.job_id)! : entry
+  );
+};
+
 // Upload one or more PDF files. We'll keep you posted on progress!
 export const uploadFiles = async (
   files: File[],
@@ -87,7 +150,7 @@ export const uploadFiles = async (
   const formData = new FormData();
   files.forEach((file) => formData.append("files", file));
 
-  return new Promise((resolve, reject) => {
+  const accepted = await new Promise<Array<UploadResult | IngestionJob>>((resolve, reject) => {
     const xhr = new XMLHttpRequest();
     xhr.upload.addEventListener("progress", (event) => {
       if (event.lengthComputable && onProgress) {
@@ -112,9 +175,11 @@ export const uploadFiles = async (
     xhr.addEventListener("error", () => {
       reject(new Error("Network error. Are you online?"));
     });
+    // The response comes as soon as the files are saved; processing carries on in the background
     xhr.open("POST", `${API_URL}/upload`);
     xhr.send(formData);
   });
+  return waitForUploads(accepted);
 };
 
 // Ask Jo Jo a question about a PDF. We'll do our best to answer!